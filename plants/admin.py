@@ -1,8 +1,146 @@
-from django.contrib import admin
-from .models import Culture, Planting
+import os
+import threading
+import time
+
+from django import forms
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.shortcuts import render
+from django.urls import path
+from django.utils.functional import cached_property
+
+from . import imports, tenancy
+from .farms import farm_for_user
+from .models import (
+    Culture, DailySales, Farm, FarmMember, ImportRun, NotificationChat, Planting, Sale, WeeklyStats,
+)
+from .statuses import update_statuses
+from .stock import sell_out
+
+# Сколько секунд список в админке показывает посчитанное количество строк
+ADMIN_COUNT_CACHE_TTL = int(os.getenv('ADMIN_COUNT_CACHE_TTL', '60'))
+ADMIN_COUNT_CACHE_SIZE = 256
+
+_count_lock = threading.Lock()
+# (база, SQL без сортировки, параметры) -> (момент устаревания, количество)
+_counts = {}
+
+
+class CachedCountPaginator(Paginator):
+    """Пагинатор, который делает полный COUNT(*) списка не чаще раза в ADMIN_COUNT_CACHE_TTL.
+
+    Ключ кэша — SQL отфильтрованного запроса, поэтому у каждой фермы,
+    фильтра и поиска свое количество, а переход по страницам и смена
+    сортировки повторно не считают. Количество точное на момент подсчета:
+    новые строки попадают в него после срока кэша. Оценка по статистике
+    таблицы не годится: она не учитывает фильтры, и последние страницы
+    выходили пустыми, поэтому первый показ списка по-прежнему делает COUNT(*).
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query = queryset.query.clone()
+        query.clear_ordering(force=True)
+        sql, params = query.sql_with_params()
+        key = (queryset.db, sql, tuple(params))
+        now = time.monotonic()
+        with _count_lock:
+            entry = _counts.get(key)
+        if entry and entry[0] > now:
+            return entry[1]
+
+        count = super().count
+        with _count_lock:
+            if len(_counts) >= ADMIN_COUNT_CACHE_SIZE:
+                for stale in [k for k, (expires, _) in _counts.items() if expires <= now] or list(_counts):
+                    del _counts[stale]
+            _counts[key] = (now + ADMIN_COUNT_CACHE_TTL, count)
+        return count
+
+
+class FarmScopedAdmin(admin.ModelAdmin):
+    """Сотрудник без прав суперпользователя видит и создает только данные своей фермы.
+
+    Общие строки справочников (shared_rows) ему видны, но только для чтения,
+    а создать строку без фермы он не может.
+    """
+    shared_rows = False
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if request.user.is_superuser:
+            return queryset
+        farm_id = farm_for_user(request.user)
+        if self.shared_rows:
+            return queryset.filter(Q(farm__isnull=True) | Q(farm_id=farm_id))
+        return queryset.filter(farm_id=farm_id)
+
+    def is_shared(self, request, obj):
+        """Общая строка (без фермы) для сотрудника фермы: удаление затронуло бы все фермы"""
+        return self.shared_rows and obj is not None and obj.farm_id is None and not request.user.is_superuser
+
+    def has_change_permission(self, request, obj=None):
+        return not self.is_shared(request, obj) and super().has_change_permission(request, obj)
+
+    def has_delete_permission(self, request, obj=None):
+        return not self.is_shared(request, obj) and super().has_delete_permission(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        # Общие строки не удаляются и массовым действием
+        if self.shared_rows and not request.user.is_superuser:
+            queryset = queryset.filter(farm__isnull=False)
+        super().delete_queryset(request, queryset)
+
+    def get_form(self, request, obj=None, **kwargs):
+        form = super().get_form(request, obj, **kwargs)
+        # Пустая ферма у сотрудника создала бы общую строку, видимую всем фермам
+        if not request.user.is_superuser and 'farm' in form.base_fields:
+            form.base_fields['farm'].required = True
+        return form
+
+    def save_model(self, request, obj, form, change):
+        if not request.user.is_superuser and obj.farm_id is None:
+            obj.farm_id = farm_for_user(request.user)
+            if obj.farm_id is None:
+                raise PermissionDenied
+        super().save_model(request, obj, form, change)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'farm' and not request.user.is_superuser:
+            kwargs['queryset'] = Farm.objects.filter(members__user=request.user)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+class ImportForm(forms.Form):
+    kind = forms.ChoiceField(label="Данные", choices=ImportRun.KIND_CHOICES, initial='plantings')
+    file = forms.FileField(label="Файл CSV или JSONL")
+    farm = forms.ModelChoiceField(
+        label="Ферма", queryset=Farm.objects.all(), required=False,
+        help_text="Культуры без фермы попадают в общий справочник",
+    )
+    restart = forms.BooleanField(
+        label="Начать заново", required=False,
+        help_text="Иначе прерванный импорт этого же файла продолжится с места остановки",
+    )
+
+
+class FarmMemberInline(admin.TabularInline):
+    model = FarmMember
+    extra = 0
+
+
+@admin.register(Farm)
+class FarmAdmin(admin.ModelAdmin):
+    list_display = ('name', 'invite_code', 'created_at')
+    search_fields = ('name',)
+    inlines = (FarmMemberInline,)
+
 
 @admin.register(Culture)
-class CultureAdmin(admin.ModelAdmin):
+class CultureAdmin(FarmScopedAdmin):
     list_display = (
         'name',
         'grams_per_tray',
@@ -14,9 +152,10 @@ class CultureAdmin(admin.ModelAdmin):
         'expire_days'
     )
     list_filter = ('soaking_required', 'press_weight')
+    shared_rows = True
 
 @admin.register(Planting)
-class PlantingAdmin(admin.ModelAdmin):
+class PlantingAdmin(FarmScopedAdmin):
     list_display = (
         'culture',
         'plant_date',
@@ -25,6 +164,143 @@ class PlantingAdmin(admin.ModelAdmin):
         'status',
         'quantity'
     )
-    list_filter = ('status', 'culture')
+    list_filter = ('status', 'archived', 'culture')
+    list_select_related = ('culture',)
     readonly_fields = ('harvest_date', 'sale_deadline')
-    search_fields = ('culture__name',)
\ No newline at end of file
+    search_fields = ('culture__name',)
+    date_hierarchy = 'plant_date'
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+    actions = ('mark_sold', 'recompute_statuses', 'archive')
+
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='plants_planting_import'),
+            *super().get_urls(),
+        ]
+
+    def import_view(self, request):
+        """Загрузка культур или посадок из CSV/JSONL; большие файлы лучше грузить командой import_plantings"""
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = ImportForm(request.POST or None, request.FILES or None)
+        if request.user.is_superuser:
+            farm_id = None
+        else:
+            del form.fields['farm']
+            farm_id = farm_for_user(request.user)
+            if farm_id is None:
+                raise PermissionDenied
+
+        run = rows_per_sec = None
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            if request.user.is_superuser and form.cleaned_data['farm']:
+                farm_id = form.cleaned_data['farm'].id
+            started = time.perf_counter()
+            try:
+                with tenancy.scope(farm_id):
+                    run = imports.run_import(
+                        upload.file, form.cleaned_data['kind'], imports.detect_format(upload.name), upload.name,
+                        restart=form.cleaned_data['restart'],
+                    )
+            except imports.ImportFileError as e:
+                form.add_error(None, str(e))
+            else:
+                rows_per_sec = run.rows / max(time.perf_counter() - started, 1e-9)
+                self.message_user(
+                    request,
+                    f"Импортировано строк: {run.rows}, создано {run.created}, обновлено {run.updated}, "
+                    f"пропущено {run.skipped}",
+                    messages.WARNING if run.skipped else messages.SUCCESS,
+                )
+
+        return render(request, 'admin/plants/planting/import.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Импорт культур и посадок",
+            'form': form,
+            'run': run,
+            'rows_per_sec': rows_per_sec,
+        })
+
+    @admin.action(description="Отметить проданными")
+    def mark_sold(self, request, queryset):
+        # Как продажа всего остатка в боте: журнал продаж, сводки и архив; посадки без остатка не считаются
+        sold = sell_out(queryset)
+        self.message_user(request, f"Отмечено проданными: {sold}")
+
+    @admin.action(description="Пересчитать статусы")
+    def recompute_statuses(self, request, queryset):
+        result = update_statuses(queryset=queryset)
+        self.message_user(request, str(result))
+
+    @admin.action(description="Перенести в архив")
+    def archive(self, request, queryset):
+        updated = queryset.update(archived=True)
+        self.message_user(request, f"Перенесено в архив: {updated}")
+
+
+@admin.register(ImportRun)
+class ImportRunAdmin(FarmScopedAdmin):
+    """Журнал импортов; прогресс идущего импорта обновляется после каждой пачки"""
+    list_display = ('source', 'kind', 'farm', 'status', 'rows', 'created', 'updated', 'skipped', 'started_at',
+                    'finished_at')
+    list_filter = ('kind', 'status')
+    ordering = ('-started_at',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(NotificationChat)
+class NotificationChatAdmin(admin.ModelAdmin):
+    list_display = ('chat_id', 'created_at')
+
+
+@admin.register(Sale)
+class SaleAdmin(FarmScopedAdmin):
+    list_display = ('sold_at', 'culture', 'quantity', 'planting_id')
+    list_select_related = ('culture',)
+    list_filter = ('culture',)
+    date_hierarchy = 'sold_at'
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailySales)
+class DailySalesAdmin(FarmScopedAdmin):
+    """Отчет по продажам; читает только дневную сводку"""
+    list_display = ('date', 'culture', 'quantity', 'sales')
+    list_select_related = ('culture',)
+    list_filter = ('culture',)
+    date_hierarchy = 'date'
+    ordering = ('-date', 'culture__name')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(WeeklyStats)
+class WeeklyStatsAdmin(FarmScopedAdmin):
+    """Недельная сводка; пополняется автоматически"""
+    list_display = ('week', 'culture', 'planted', 'harvested', 'sold', 'expired')
+    list_select_related = ('culture',)
+    list_filter = ('culture',)
+    date_hierarchy = 'week'
+    ordering = ('-week', 'culture__name')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -2,4 +2,11 @@ from django.apps import AppConfig
 
 class PlantsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'plants'
\ No newline at end of file
+    name = 'plants'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from . import signals, versions
+
+        post_migrate.connect(signals.ensure_version_rows, sender=self)
+        versions.install()
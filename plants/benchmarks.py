@@ -0,0 +1,106 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import Culture, Farm, Planting, Sale, normalize_name, planting_dates
+
+
+@contextmanager
+def benchmark_database(name=None):
+    """Создает отдельную БД на время бенчмарка и удаляет ее после (без name — в памяти)"""
+    connection.settings_dict['TEST']['NAME'] = name
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield connection.settings_dict['NAME']
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+@contextmanager
+def timer():
+    """Замеряет время выполнения блока в миллисекундах"""
+    result = {}
+    started = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result['ms'] = (time.perf_counter() - started) * 1000
+
+
+def percentile(values, p):
+    """Значение, ниже которого доля p выборки"""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def seed_cultures(count=20):
+    """Создает набор тестовых культур"""
+    return Culture.objects.bulk_create([
+        Culture(
+            name=f"Культура {i}",
+            search_name=normalize_name(f"Культура {i}"),
+            grow_days=random.randint(7, 14),
+            expire_days=random.randint(3, 7),
+            grams_per_tray=random.randint(10, 100),
+            germination_days=random.randint(2, 4),
+            light_days=random.randint(4, 8),
+        )
+        for i in range(count)
+    ])
+
+
+def seed_farm(name="Тестовая ферма"):
+    """Ферма для тестовых посадок"""
+    return Farm.objects.create(name=name)
+
+
+def seed_plantings(rows, cultures, history_days=730, batch_size=5000, farm=None):
+    """Заполняет таблицу посадок фермы историей за history_days дней"""
+    farm = farm or Farm.objects.first() or seed_farm()
+    rng = random.Random(rows)
+    today = timezone.now().date()
+    batch = []
+    for _ in range(rows):
+        culture = rng.choice(cultures)
+        plant_date = today - timedelta(days=rng.randint(0, history_days))
+        quantity = rng.randint(1, 50)
+        harvest_date, sale_deadline, status = planting_dates(culture, plant_date, today)
+        batch.append(Planting(
+            farm=farm,
+            culture=culture,
+            plant_date=plant_date,
+            quantity=quantity,
+            planted_quantity=quantity,
+            harvest_date=harvest_date,
+            sale_deadline=sale_deadline,
+            status=status,
+        ))
+        if len(batch) >= batch_size:
+            Planting.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Planting.objects.bulk_create(batch)
+
+
+def seed_sales(rows, cultures, history_days=365, batch_size=5000, farm=None):
+    """Заполняет журнал продаж фермы записями за history_days дней"""
+    farm = farm or Farm.objects.first() or seed_farm()
+    rng = random.Random(rows)
+    now = timezone.now()
+    batch = []
+    for _ in range(rows):
+        batch.append(Sale(
+            farm=farm,
+            culture=rng.choice(cultures),
+            quantity=rng.randint(1, 20),
+            sold_at=now - timedelta(seconds=rng.randint(0, history_days * 86400)),
+        ))
+        if len(batch) >= batch_size:
+            Sale.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Sale.objects.bulk_create(batch)
@@ -0,0 +1,112 @@
+import csv
+import io
+from datetime import date
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import catalog, stats
+from .models import Planting, planting_dates
+from .tenancy import current_farm_id
+
+MAX_ROWS = 500
+
+
+def parse_rows(lines):
+    """Разбирает строки «культура количество [дата]».
+
+    Культура задается ID или названием, дата посадки — в формате ГГГГ-ММ-ДД.
+    Возвращает (строки, ошибки); строки — кортежи (культура, количество, дата).
+    """
+    rows = []
+    errors = []
+    today = timezone.now().date()
+
+    for number, fields in enumerate(lines, start=1):
+        fields = [f.strip() for f in fields if f.strip()]
+        if not fields:
+            continue
+        if len(rows) + len(errors) >= MAX_ROWS:
+            errors.append(f"Строка {number}: не больше {MAX_ROWS} строк за раз")
+            break
+
+        plant_date = today
+        if len(fields) >= 3:
+            try:
+                plant_date = date.fromisoformat(fields[-1])
+                fields = fields[:-1]
+            except ValueError:
+                pass
+
+        if len(fields) < 2:
+            errors.append(f"Строка {number}: нужны культура и количество")
+            continue
+
+        culture_ref, quantity = " ".join(fields[:-1]), fields[-1]
+        culture = (
+            catalog.get_culture(int(culture_ref)) if culture_ref.isdigit()
+            else catalog.get_culture_by_name(culture_ref)
+        )
+        if culture is None:
+            errors.append(f"Строка {number}: культура «{culture_ref}» не найдена")
+            continue
+        try:
+            quantity = int(quantity)
+        except ValueError:
+            errors.append(f"Строка {number}: количество должно быть числом")
+            continue
+        if quantity <= 0:
+            errors.append(f"Строка {number}: количество должно быть больше 0")
+            continue
+
+        rows.append((culture, quantity, plant_date))
+
+    return rows, errors
+
+
+def parse_text(text):
+    """Строки сообщения, поля разделены пробелами"""
+    return parse_rows(line.split() for line in text.splitlines())
+
+
+def parse_csv(content):
+    """CSV-файл: культура,количество[,дата]; строка заголовка пропускается"""
+    lines = list(csv.reader(io.StringIO(content)))
+    if lines and len(lines[0]) >= 2 and not lines[0][1].strip().isdigit():
+        lines = lines[1:]
+    return parse_rows(lines)
+
+
+def build_plantings(rows, today=None):
+    """Создает объекты посадок текущей фермы с рассчитанными датами без обращения к базе.
+
+    Даты считаются один раз на пару (культура, дата посадки).
+    """
+    today = today or timezone.now().date()
+    farm_id = current_farm_id()
+    dates = {}
+    plantings = []
+    for culture, quantity, plant_date in rows:
+        key = (culture.id, plant_date)
+        if key not in dates:
+            dates[key] = planting_dates(culture, plant_date, today)
+        harvest_date, sale_deadline, status = dates[key]
+        plantings.append(Planting(
+            farm_id=farm_id,
+            culture=culture,
+            quantity=quantity,
+            planted_quantity=quantity,
+            plant_date=plant_date,
+            harvest_date=harvest_date,
+            sale_deadline=sale_deadline,
+            status=status,
+        ))
+    return plantings
+
+
+def create_plantings(rows, today=None):
+    """Вставляет все посадки одним bulk_create и обновляет недельные итоги"""
+    with transaction.atomic():
+        plantings = Planting.objects.bulk_create(build_plantings(rows, today))
+        stats.record_planted(plantings)
+    return plantings
@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+
+from .models import Culture, DataVersion
+from .tenancy import current_farm_id
+
+# Сигналы работают только внутри процесса, а правки из админки приходят
+# из веб-процесса: их кэш замечает по версии таблицы культур (DataVersion),
+# которую проверяет не чаще раза в CULTURE_VERSION_CHECK_INTERVAL секунд.
+# Срок жизни — страховка для записи в базу в обход Django
+CACHE_TTL = int(os.getenv('CULTURE_CACHE_TTL', '300'))
+VERSION_CHECK_INTERVAL = float(os.getenv('CULTURE_VERSION_CHECK_INTERVAL', '1'))
+
+_lock = threading.Lock()
+# (по ID, по названию, момент загрузки, версия таблицы) или None; заменяется целиком одним присваиванием
+_state = None
+# Поколение каталога: растет при каждом сбросе
+_version = 0
+# Когда версия таблицы последний раз сверялась с базой
+_checked_at = 0.0
+
+
+def table_version():
+    """Версия таблицы культур в базе; растет при любой записи в нее из любого процесса"""
+    return (
+        DataVersion.objects
+        .filter(name=Culture._meta.db_table)
+        .values_list('version', flat=True)
+        .first()
+    )
+
+
+def _load():
+    """Загружает каталог культур всех ферм одним запросом.
+
+    Если во время запроса кэш сбросили, результат отдается вызвавшему, но
+    не сохраняется: он мог быть прочитан до изменения, вызвавшего сброс.
+    """
+    global _state, _checked_at
+    with _lock:
+        generation = _version
+    # Версия читается до каталога: запись между ними даст лишнюю загрузку, а не устаревший кэш
+    db_version = table_version()
+    _checked_at = time.monotonic()
+    cultures = list(Culture.all_objects.all().order_by('name'))
+    by_id = {c.id: c for c in cultures}
+    # Одно название может быть и в общем справочнике, и у фермы
+    by_name = {}
+    for c in cultures:
+        by_name.setdefault(c.name.lower(), []).append(c)
+    with _lock:
+        if _version == generation:
+            _state = (by_id, by_name, time.monotonic(), db_version)
+    return by_id, by_name
+
+
+def _snapshot():
+    """Текущее содержимое кэша, при необходимости загруженное заново"""
+    global _checked_at
+    state = _state
+    now = time.monotonic()
+    if state is None or now - state[2] > CACHE_TTL:
+        return _load()
+    if now - _checked_at > VERSION_CHECK_INTERVAL:
+        _checked_at = now
+        if table_version() != state[3]:
+            # Культуры изменил другой процесс: сброс заодно обновит ключи зависимых кэшей
+            invalidate()
+            return _load()
+    return state[0], state[1]
+
+
+def warm():
+    """Прогревает кэш каталога (при старте бота)"""
+    _load()
+
+
+def invalidate(**kwargs):
+    """Сбрасывает кэш каталога; подходит как обработчик сигналов"""
+    global _state, _version
+    with _lock:
+        _state = None
+        _version += 1
+
+
+def version():
+    """Номер версии каталога для ключей зависимых кэшей"""
+    return _version
+
+
+def _visible(culture, farm_id):
+    """Культура из общего справочника или текущей фермы"""
+    return farm_id is None or culture.farm_id is None or culture.farm_id == farm_id
+
+
+def get_cultures():
+    """Культуры текущей фермы и общие, отсортированные по названию"""
+    by_id, _ = _snapshot()
+    farm_id = current_farm_id()
+    return [c for c in by_id.values() if _visible(c, farm_id)]
+
+
+def get_culture(culture_id):
+    """Культура по ID или None, если ее нет или она принадлежит другой ферме"""
+    by_id, _ = _snapshot()
+    culture = by_id.get(culture_id)
+    return culture if culture is not None and _visible(culture, current_farm_id()) else None
+
+
+def get_culture_by_name(name):
+    """Культура по названию (без учета регистра) или None; своя культура фермы важнее общей"""
+    _, by_name = _snapshot()
+    farm_id = current_farm_id()
+    candidates = [c for c in by_name.get(name.strip().lower(), ()) if _visible(c, farm_id)]
+    candidates.sort(key=lambda c: c.farm_id is None)
+    return candidates[0] if candidates else None
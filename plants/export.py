@@ -0,0 +1,286 @@
+"""Выгрузка посадок и журнала продаж в CSV и XLSX.
+
+Строки читаются из базы порциями через .iterator() и сразу превращаются
+в куски файла, поэтому память не зависит от размера выгрузки. XLSX
+собирается вручную: zip пишется в поток без перемоток, лист — строками
+с inline-текстом, так что весь файл тоже не держится в памяти.
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime, time, timedelta
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+from . import catalog
+from .models import Planting, Sale
+
+CHUNK_SIZE = 2000
+FORMATS = ('csv', 'xlsx')
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+STATUS_NAMES = dict(Planting.STATUS_CHOICES)
+
+PLANTING_HEADER = [
+    'ID', 'Культура', 'Дата посадки', 'Количество', 'Дата созревания', 'Продать до', 'Статус', 'В архиве',
+]
+SALE_HEADER = ['Время продажи', 'ID посадки', 'Культура', 'Количество']
+
+# С этих символов Excel начинает формулу; такой текст в CSV получает префикс '
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+# Управляющие символы, недопустимые в XML 1.0 (в названии культуры из импорта)
+XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+class ExportError(ValueError):
+    """Неверные параметры выгрузки; текст показывается пользователю"""
+
+
+def parse_filters(params):
+    """Фильтры из параметров запроса или команды: from, to, culture, status"""
+    filters = {}
+    for key in ('from', 'to'):
+        value = params.get(key)
+        if value:
+            try:
+                filters[key] = date.fromisoformat(value)
+            except ValueError:
+                raise ExportError(f"Неверная дата {key}={value}, нужен формат ГГГГ-ММ-ДД")
+
+    culture_ref = params.get('culture')
+    if culture_ref:
+        culture = (
+            catalog.get_culture(int(culture_ref)) if culture_ref.isdigit()
+            else catalog.get_culture_by_name(culture_ref)
+        )
+        if culture is None:
+            raise ExportError(f"Культура «{culture_ref}» не найдена")
+        filters['culture'] = culture
+
+    status = params.get('status')
+    if status:
+        if status not in STATUS_NAMES:
+            raise ExportError(f"Неизвестный статус {status}, возможны: {', '.join(STATUS_NAMES)}")
+        filters['status'] = status
+    return filters
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def planting_rows(filters):
+    """Заголовок и ленивые строки посадок текущей фермы по дате посадки.
+
+    Запрос строится сразу, пока действует фильтр фермы; читается — при обходе.
+    """
+    plantings = Planting.objects.order_by('plant_date', 'id')
+    if 'from' in filters:
+        plantings = plantings.filter(plant_date__gte=filters['from'])
+    if 'to' in filters:
+        plantings = plantings.filter(plant_date__lte=filters['to'])
+    if 'culture' in filters:
+        plantings = plantings.filter(culture=filters['culture'])
+    if 'status' in filters:
+        plantings = plantings.filter(status=filters['status'])
+    values = plantings.values_list(
+        'id', 'culture__name', 'plant_date', 'quantity', 'harvest_date', 'sale_deadline', 'status', 'archived',
+    ).iterator(chunk_size=CHUNK_SIZE)
+    rows = (
+        (planting_id, culture, plant_date, quantity, harvest_date, sale_deadline, STATUS_NAMES[status],
+         'да' if archived else 'нет')
+        for planting_id, culture, plant_date, quantity, harvest_date, sale_deadline, status, archived in values
+    )
+    return PLANTING_HEADER, rows
+
+
+def sale_rows(filters):
+    """Заголовок и ленивые строки журнала продаж текущей фермы; статус к продажам не относится"""
+    sales = Sale.objects.order_by('sold_at', 'id')
+    if 'from' in filters:
+        sales = sales.filter(sold_at__gte=day_start(filters['from']))
+    if 'to' in filters:
+        sales = sales.filter(sold_at__lt=day_start(filters['to'] + timedelta(days=1)))
+    if 'culture' in filters:
+        sales = sales.filter(culture=filters['culture'])
+    values = sales.values_list('sold_at', 'planting_id', 'culture__name', 'quantity').iterator(chunk_size=CHUNK_SIZE)
+    rows = (
+        (timezone.localtime(sold_at).replace(tzinfo=None, microsecond=0), planting_id, culture, quantity)
+        for sold_at, planting_id, culture, quantity in values
+    )
+    return SALE_HEADER, rows
+
+
+SOURCES = {'plantings': planting_rows, 'sales': sale_rows}
+
+
+def csv_value(value):
+    """Текст, который Excel принял бы за формулу, выводится как текст"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_chunks(header, rows, batch=CHUNK_SIZE):
+    """Куски CSV-файла (str) по batch строк; BOM нужен Excel, чтобы узнать UTF-8"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(header)
+    for i, row in enumerate(rows, 1):
+        writer.writerow([csv_value(value) for value in row])
+        if i % batch == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+# XLSX
+
+CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+ROOT_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+WORKBOOK_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+WORKBOOK_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+# Стили: 0 — обычный, 1 — дата, 2 — дата и время
+STYLES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border/></borders>'
+    '<cellStyleXfs count="1"><xf/></cellStyleXfs>'
+    '<cellXfs count="3"><xf/><xf numFmtId="14" applyNumberFormat="1"/>'
+    '<xf numFmtId="22" applyNumberFormat="1"/></cellXfs>'
+    '</styleSheet>'
+)
+SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+SHEET_END = '</sheetData></worksheet>'
+
+EXCEL_EPOCH = datetime(1899, 12, 30)
+
+
+def xlsx_cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, bool):
+        value = 'да' if value else 'нет'
+    if isinstance(value, datetime):
+        serial = (value - EXCEL_EPOCH).total_seconds() / 86400
+        return f'<c s="2"><v>{serial:.6f}</v></c>'
+    if isinstance(value, date):
+        return f'<c s="1"><v>{(value - EXCEL_EPOCH.date()).days}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c><v>{value}</v></c>'
+    return f'<c t="inlineStr"><is><t>{escape(XML_INVALID.sub("", str(value)))}</t></is></c>'
+
+
+class _Sink:
+    """Приемник zip-потока без перемоток: копит байты до следующего куска"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def xlsx_chunks(header, rows, sheet_name='Выгрузка', batch=CHUNK_SIZE):
+    """Куски XLSX-файла (bytes) по batch строк"""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=5) as archive:
+        archive.writestr('[Content_Types].xml', CONTENT_TYPES_XML)
+        archive.writestr('_rels/.rels', ROOT_RELS_XML)
+        archive.writestr('xl/workbook.xml', WORKBOOK_XML.format(name=escape(sheet_name, {'"': '&quot;'})))
+        archive.writestr('xl/_rels/workbook.xml.rels', WORKBOOK_RELS_XML)
+        archive.writestr('xl/styles.xml', STYLES_XML)
+        yield sink.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            lines = [SHEET_START, '<row>', *(xlsx_cell(value) for value in header), '</row>']
+            for i, row in enumerate(rows, 1):
+                lines.append('<row>')
+                lines.extend(xlsx_cell(value) for value in row)
+                lines.append('</row>')
+                if i % batch == 0:
+                    sheet.write(''.join(lines).encode('utf-8'))
+                    lines.clear()
+                    yield sink.drain()
+            lines.append(SHEET_END)
+            sheet.write(''.join(lines).encode('utf-8'))
+    yield sink.drain()
+
+
+def chunks(kind, fmt, filters):
+    """Куски файла выгрузки kind (plantings/sales) в формате fmt"""
+    header, rows = SOURCES[kind](filters)
+    if fmt == 'xlsx':
+        return xlsx_chunks(header, rows)
+    return csv_chunks(header, rows)
+
+
+def filename(kind, fmt, filters):
+    parts = [kind]
+    if 'from' in filters:
+        parts.append(filters['from'].isoformat())
+    if 'to' in filters:
+        parts.append(filters['to'].isoformat())
+    return f"{'_'.join(parts)}.{fmt}"
@@ -0,0 +1,91 @@
+import os
+import threading
+import time
+
+from django.db import transaction
+
+from .models import Farm, FarmMember
+
+# Участники меняются редко; правки из админки подхватываются по истечении срока
+MEMBER_CACHE_TTL = int(os.getenv('FARM_MEMBER_CACHE_TTL', '60'))
+
+_lock = threading.Lock()
+_members = {}
+
+
+def _cached(chat_id):
+    entry = _members.get(chat_id)
+    if entry is not None and time.monotonic() - entry[1] <= MEMBER_CACHE_TTL:
+        return entry[0]
+    return None
+
+
+def _remember(member):
+    with _lock:
+        _members[member.chat_id] = (member, time.monotonic())
+    return member
+
+
+def invalidate(chat_id=None):
+    """Сбрасывает кэш участников (одного чата или весь)"""
+    with _lock:
+        if chat_id is None:
+            _members.clear()
+        else:
+            _members.pop(chat_id, None)
+
+
+def warm():
+    """Загружает участников всех чатов одним запросом (при старте бота)"""
+    members = list(FarmMember.objects.select_related('farm').filter(chat_id__isnull=False))
+    now = time.monotonic()
+    with _lock:
+        _members.update((member.chat_id, (member, now)) for member in members)
+    return len(members)
+
+
+def membership(chat_id, title=None):
+    """Участник фермы для чата; новый чат получает свою ферму и становится ее админом.
+
+    Если участников еще нет ни у одной фермы (установка обновлена с версии
+    без ферм), первый чат становится админом фермы с перенесенными данными.
+    """
+    member = _cached(chat_id)
+    if member is not None:
+        return member
+
+    member = FarmMember.objects.select_related('farm').filter(chat_id=chat_id).first()
+    if member is None:
+        with transaction.atomic():
+            farm = None
+            if not FarmMember.objects.exists():
+                farm = Farm.objects.order_by('id').first()
+            if farm is None:
+                farm = Farm.objects.create(name=title or f"Ферма {chat_id}")
+            member = FarmMember.objects.create(farm=farm, chat_id=chat_id, role='admin')
+    return _remember(member)
+
+
+def join(chat_id, invite_code):
+    """Переводит чат в ферму по коду приглашения; возвращает участника или None"""
+    farm = Farm.objects.filter(invite_code=invite_code.strip()).first()
+    if farm is None:
+        return None
+    member = FarmMember.objects.filter(chat_id=chat_id).first() or FarmMember(chat_id=chat_id)
+    if member.farm_id != farm.id:
+        member.farm = farm
+        member.role = 'worker'
+        member.save()
+    member.farm = farm
+    return _remember(member)
+
+
+def farm_for_user(user):
+    """ID фермы пользователя сайта или None"""
+    if not user.is_authenticated:
+        return None
+    return FarmMember.objects.filter(user=user).values_list('farm_id', flat=True).first()
+
+
+def members_count(farm_id):
+    return FarmMember.objects.filter(farm_id=farm_id).count()
@@ -0,0 +1,333 @@
+"""Импорт справочника культур и истории посадок из CSV и JSONL.
+
+Файл читается одним потоковым проходом: строка проверяется и попадает
+в пачку, пачка записывается одной транзакцией вместе с отметкой
+прогресса в ImportRun. Прерванный импорт того же файла продолжается
+с этой отметки, а import_key не дает задвоить посадки при повторе.
+Даты посадок считаются один раз на пару (культура, дата посадки), без
+Planting.save(), а пачка пишется одним upsert.
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import time
+from collections import namedtuple
+from datetime import date
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import catalog, stats
+from .models import Culture, ImportRun, Planting, normalize_name, planting_dates
+from .tenancy import current_farm_id
+
+BATCH_SIZE = 2000
+FORMATS = ('csv', 'jsonl')
+# Сколько ошибок сохраняется в отчете импорта
+MAX_ERRORS = 100
+
+# Столбцы посадок; подходят и заголовки выгрузки (plants.export)
+PLANTING_COLUMNS = {
+    'id': ('id', 'ID'),
+    'culture': ('culture', 'Культура'),
+    'quantity': ('quantity', 'Количество'),
+    'plant_date': ('plant_date', 'Дата посадки'),
+    'archived': ('archived', 'В архиве'),
+}
+CULTURE_NUMBERS = ('grow_days', 'expire_days', 'grams_per_tray', 'germination_days', 'light_days')
+CULTURE_REQUIRED = ('grow_days', 'expire_days')
+PRESS_WEIGHTS = {value for value, _ in Culture._meta.get_field('press_weight').choices}
+
+# Порядок важен: первым идет ферма, последним ключ — они не обновляются при конфликте
+UPSERT_COLUMNS = (
+    'farm_id', 'culture_id', 'plant_date', 'quantity', 'harvest_date', 'sale_deadline', 'status', 'archived',
+    'import_key',
+)
+# Новая посадка для недельных итогов (stats.record_planted)
+ImportedPlanting = namedtuple(
+    'ImportedPlanting', 'farm_id culture_id plant_date quantity planted_quantity harvest_date sale_deadline status'
+)
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'да'}
+FALSE_VALUES = {'', '0', 'false', 'no', 'n', 'нет'}
+
+
+class ImportFileError(ValueError):
+    """Ошибка в строке или в файле импорта; текст попадает в отчет"""
+
+
+def detect_format(name):
+    """Формат по расширению файла"""
+    extension = os.path.splitext(name)[1].lower().lstrip('.')
+    if extension == 'json':
+        extension = 'jsonl'
+    if extension not in FORMATS:
+        raise ImportFileError(f"Неизвестный формат файла {name}, нужен CSV или JSONL")
+    return extension
+
+
+def file_digest(file):
+    """SHA-256 двоичного файла; файл возвращается в начало"""
+    digest = hashlib.sha256()
+    for block in iter(lambda: file.read(1024 * 1024), b''):
+        digest.update(block)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def read_records(file, fmt):
+    """(номер строки данных, словарь или None) из двоичного файла, по одной строке"""
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(text)
+            for number, record in enumerate(reader, 1):
+                yield number, {key.strip(): (value or '').strip() for key, value in record.items() if key}
+            return
+        number = 0
+        for line in text:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield number, record if isinstance(record, dict) else None
+    finally:
+        # Файл закрывает тот, кто его открыл
+        text.detach()
+
+
+def field(record, names):
+    for name in names:
+        value = record.get(name)
+        if value is not None and value != '':
+            return value
+    return None
+
+
+def parse_int(value, name, minimum=0):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ImportFileError(f"{name} должно быть целым числом")
+    if number < minimum:
+        raise ImportFileError(f"{name} не может быть меньше {minimum}")
+    return number
+
+
+def parse_bool(value, name):
+    if isinstance(value, bool) or value is None:
+        return bool(value)
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ImportFileError(f"{name}: ожидается да/нет")
+
+
+def parse_planting(record, today):
+    """(внешний ID, культура, количество, дата посадки, в архиве) из строки файла"""
+    culture_ref = field(record, PLANTING_COLUMNS['culture'])
+    if culture_ref is None:
+        raise ImportFileError("не указана культура")
+    culture_ref = str(culture_ref).strip()
+    culture = (
+        catalog.get_culture(int(culture_ref)) if culture_ref.isdigit()
+        else catalog.get_culture_by_name(culture_ref)
+    )
+    if culture is None:
+        raise ImportFileError(f"культура «{culture_ref}» не найдена")
+
+    quantity = parse_int(field(record, PLANTING_COLUMNS['quantity']), "Количество", minimum=1)
+
+    plant_date = field(record, PLANTING_COLUMNS['plant_date'])
+    try:
+        plant_date = date.fromisoformat(str(plant_date)[:10]) if plant_date else today
+    except ValueError:
+        raise ImportFileError(f"неверная дата посадки {plant_date}, нужен формат ГГГГ-ММ-ДД")
+
+    external_id = field(record, PLANTING_COLUMNS['id'])
+    archived = parse_bool(field(record, PLANTING_COLUMNS['archived']), "В архиве")
+    return external_id, culture, quantity, plant_date, archived
+
+
+def parse_culture(record):
+    """Поля культуры из строки файла"""
+    name = field(record, ('name', 'Название'))
+    if name is None:
+        raise ImportFileError("не указано название")
+    values = {'name': str(name).strip()[:100]}
+    for column in CULTURE_NUMBERS:
+        value = field(record, (column,))
+        if value is None:
+            if column in CULTURE_REQUIRED:
+                raise ImportFileError(f"не указано {column}")
+            continue
+        values[column] = parse_int(value, column)
+    if field(record, ('soaking_required',)) is not None:
+        values['soaking_required'] = parse_bool(record['soaking_required'], 'soaking_required')
+    press_weight = field(record, ('press_weight',))
+    if press_weight is not None:
+        if str(press_weight) not in PRESS_WEIGHTS:
+            raise ImportFileError(f"press_weight может быть {', '.join(sorted(PRESS_WEIGHTS))}")
+        values['press_weight'] = str(press_weight)
+    return values
+
+
+def write_plantings(rows, dates, today):
+    """Upsert пачки посадок текущей фермы по import_key одним executemany: (создано, обновлено).
+
+    dates — кэш рассчитанных дат на пару (культура, дата посадки), общий для всего импорта.
+    """
+    farm_id = current_farm_id()
+    # Повтор ключа внутри пачки — последняя строка важнее
+    by_key = {key: row for key, *row in rows}
+    existing = set(Planting.objects.filter(import_key__in=list(by_key)).values_list('import_key', flat=True))
+
+    values, new = [], []
+    for key, (culture, quantity, plant_date, archived) in by_key.items():
+        dates_key = (culture.id, plant_date)
+        if dates_key not in dates:
+            dates[dates_key] = planting_dates(culture, plant_date, today)
+        harvest_date, sale_deadline, status = dates[dates_key]
+        values.append((
+            farm_id, culture.id, plant_date.isoformat(), quantity, harvest_date.isoformat(),
+            sale_deadline.isoformat(), status, archived, key, quantity,
+        ))
+        if key not in existing:
+            new.append(ImportedPlanting(
+                farm_id, culture.id, plant_date, quantity, quantity, harvest_date, sale_deadline, status
+            ))
+
+    table = connection.ops.quote_name(Planting._meta.db_table)
+    columns = ', '.join((*UPSERT_COLUMNS, 'planted_quantity'))
+    # Новое количество из файла — поправка остатка: "посажено" сдвигается на ту же разницу
+    updates = ', '.join([
+        'planted_quantity = planted_quantity + excluded.quantity - quantity',
+        *(f"{column} = excluded.{column}" for column in UPSERT_COLUMNS[1:-1]),
+    ])
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} ({columns}) VALUES ({', '.join(['%s'] * (len(UPSERT_COLUMNS) + 1))}) "
+            f"ON CONFLICT (farm_id, import_key) DO UPDATE SET {updates}",
+            values,
+        )
+    stats.record_planted(new)
+    return len(new), len(values) - len(new)
+
+
+def write_cultures(rows, existing):
+    """Upsert пачки культур текущей фермы по названию: (создано, обновлено).
+
+    existing — {normalize_name(название): культура}, пополняется новыми.
+    """
+    farm_id = current_farm_id()
+    new, changed = [], []
+    for values in rows:
+        search_name = normalize_name(values['name'])
+        culture = existing.get(search_name)
+        if culture is None:
+            culture = existing[search_name] = Culture(farm_id=farm_id)
+            new.append(culture)
+        elif culture.pk is not None and culture not in changed:
+            changed.append(culture)
+        for name, value in values.items():
+            setattr(culture, name, value)
+        culture.search_name = search_name
+
+    Culture.all_objects.bulk_create(new)
+    Culture.all_objects.bulk_update(
+        changed, ['name', 'search_name', *CULTURE_NUMBERS, 'soaking_required', 'press_weight']
+    )
+    return len(new), len(changed)
+
+
+def run_import(file, kind, fmt, source, restart=False, dry_run=False, batch_size=BATCH_SIZE, progress=None):
+    """Импортирует двоичный файл в текущую ферму и возвращает ImportRun.
+
+    Незавершенный импорт того же файла продолжается с последней записанной
+    пачки, если не указан restart. progress(run, строк в секунду)
+    вызывается после каждой пачки. С dry_run строки только проверяются.
+    """
+    farm_id = current_farm_id()
+    if kind == 'plantings' and farm_id is None:
+        raise ImportFileError("Посадки импортируются в ферму, укажите ее")
+    digest = file_digest(file)
+
+    run = None
+    if not restart and not dry_run:
+        run = ImportRun.objects.filter(farm_id=farm_id, kind=kind, digest=digest, status='running').last()
+    if run is None:
+        run = ImportRun(farm_id=farm_id, kind=kind, source=source[-255:], digest=digest)
+        if not dry_run:
+            run.save()
+    resume_from = run.rows
+
+    today = timezone.now().date()
+    dates = {}
+    if kind == 'cultures':
+        existing = {c.search_name: c for c in Culture.all_objects.filter(farm_id=farm_id)}
+        # Одноименная культура фермы заслонила бы общую в боте и в поиске
+        shared = set() if farm_id is None else set(
+            Culture.all_objects.filter(farm__isnull=True).values_list('search_name', flat=True)
+        )
+
+    def flush(batch, number):
+        with transaction.atomic():
+            if not dry_run and batch:
+                if kind == 'plantings':
+                    created, updated = write_plantings(batch, dates, today)
+                else:
+                    created, updated = write_cultures(batch, existing)
+                run.created += created
+                run.updated += updated
+            run.rows = number
+            if not dry_run:
+                run.save()
+
+    started = time.perf_counter()
+    batch = []
+    number = resume_from
+    for number, record in read_records(file, fmt):
+        if number <= resume_from:
+            continue
+        try:
+            if record is None:
+                raise ImportFileError("строка не является JSON-объектом")
+            if kind == 'plantings':
+                external_id, *row = parse_planting(record, today)
+                # Без внешнего ID ключом служит место строки в файле
+                key = f"id:{external_id}" if external_id is not None else f"{digest[:16]}:{number}"
+                batch.append((key[:64], *row))
+            else:
+                values = parse_culture(record)
+                if normalize_name(values['name']) in shared:
+                    raise ImportFileError(f"культура «{values['name']}» уже есть в общем справочнике")
+                batch.append(values)
+        except ImportFileError as e:
+            run.skipped += 1
+            if len(run.errors) < MAX_ERRORS:
+                run.errors.append(f"Строка {number}: {e}")
+
+        if number - run.rows >= batch_size:
+            flush(batch, number)
+            batch = []
+            if progress:
+                progress(run, (number - resume_from) / (time.perf_counter() - started))
+
+    flush(batch, number)
+    run.status = 'done'
+    run.finished_at = timezone.now()
+    if not dry_run:
+        run.save()
+    if kind == 'cultures':
+        # bulk-операции не отправляют сигналов
+        catalog.invalidate()
+    if progress:
+        progress(run, (number - resume_from) / max(time.perf_counter() - started, 1e-9))
+    return run
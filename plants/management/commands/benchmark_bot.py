@@ -0,0 +1,185 @@
+import asyncio
+import contextvars
+import json
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+from telegram import Update
+
+from plants import catalog, repository
+from plants.benchmarks import benchmark_database, percentile, seed_cultures, seed_farm, seed_plantings
+from plants.models import FarmMember, Planting
+from telegram_stub import StubRequest, build_stub_application, callback_update, message_update
+
+# Счетчики обновления, которое сейчас обрабатывается; в пул потоков
+# базы contextvar попадает вместе с контекстом (repository.run_db)
+_current = contextvars.ContextVar('benchmark_update', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    counters = _current.get()
+    if counters is not None:
+        counters['queries'] += 1
+    return execute(sql, params, many, context)
+
+
+def watch_connection(sender, connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+class CountingRequest(StubRequest):
+    """Заглушка Bot API, относящая каждый вызов к текущему обновлению"""
+
+    async def do_request(self, *args, **kwargs):
+        counters = _current.get()
+        if counters is not None:
+            counters['api_calls'] += 1
+        return await super().do_request(*args, **kwargs)
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест обработчиков бота: N параллельных чатов, задержки, запросы к базе и Bot API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chats', type=int, default=50, help='Количество параллельных чатов')
+        parser.add_argument('--rounds', type=int, default=5, help='Сценариев на чат')
+        parser.add_argument('--rows', type=int, default=2_000, help='Количество посадок в базе')
+        parser.add_argument('--api-latency-ms', type=float, default=0, help='Задержка ответа заглушки Bot API')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Файл для результатов в формате JSON')
+        parser.add_argument('--baseline', help='Результаты прошлого запуска (JSON) для сравнения')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Допустимый рост p95 и запросов на обновление относительно --baseline')
+
+    def handle(self, *args, **options):
+        connection_created.connect(watch_connection)
+        try:
+            with tempfile.TemporaryDirectory() as tmp, benchmark_database(os.path.join(tmp, 'bench.sqlite3')):
+                cultures = seed_cultures()
+                farm = seed_farm()
+                seed_plantings(options['rows'], cultures, history_days=30, farm=farm)
+                FarmMember.objects.bulk_create([
+                    FarmMember(farm=farm, chat_id=chat_id, role='manager')
+                    for chat_id in range(1, options['chats'] + 1)
+                ])
+                catalog.invalidate()
+                catalog.warm()
+                results = asyncio.run(self.run(options))
+        finally:
+            connection_created.disconnect(watch_connection)
+            repository.shutdown()
+
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['tolerance'])
+
+    async def run(self, options):
+        rng = random.Random(options['seed'])
+        today = timezone.now().date()
+        planting_ids = await repository.run_db(
+            lambda: list(Planting.objects.filter(harvest_date__gte=today).values_list('id', flat=True))
+        )
+        culture = (await repository.get_cultures())[0]
+        request = CountingRequest(latency=options['api_latency_ms'] / 1000)
+        application = build_stub_application(request)
+        await application.initialize()
+
+        samples = defaultdict(list)
+        update_ids = iter(range(1, 10 ** 9))
+
+        async def process(kind, update):
+            counters = {'queries': 0, 'api_calls': 0}
+            _current.set(counters)
+            started = time.perf_counter()
+            await application.process_update(Update.de_json(update, application.bot))
+            samples[kind].append({'ms': (time.perf_counter() - started) * 1000, **counters})
+
+        async def send(kind, update):
+            # Как в Application: у каждого обновления своя задача и свой контекст
+            await asyncio.create_task(process(kind, update))
+
+        async def chat(chat_id):
+            for _ in range(options['rounds']):
+                planting_id = rng.choice(planting_ids)
+                await send('/current', message_update(next(update_ids), chat_id, '/current'))
+                await send('page', callback_update(next(update_ids), chat_id, 'page_1'))
+                await send('select', callback_update(next(update_ids), chat_id, f"select_{planting_id}_1"))
+                await send('sell_button', callback_update(next(update_ids), chat_id, f"sell_{planting_id}"))
+                await send('/sell', message_update(next(update_ids), chat_id, f"/sell {planting_id} 1"))
+                await send('/new', message_update(next(update_ids), chat_id, '/new'))
+                await send('new:culture', message_update(next(update_ids), chat_id, f"{culture.id}: {culture.name}"))
+                await send('new:quantity', message_update(next(update_ids), chat_id, str(rng.randint(1, 20))))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(chat(chat_id) for chat_id in range(1, options['chats'] + 1)))
+        total = (time.perf_counter() - started) * 1000
+        await application.shutdown()
+
+        everything = [sample for kind_samples in samples.values() for sample in kind_samples]
+        return {
+            'options': {
+                key: options[key] for key in ('chats', 'rounds', 'rows', 'api_latency_ms', 'seed')
+            },
+            'total_ms': total,
+            'updates_per_sec': len(everything) / total * 1000,
+            'all': summarize(everything),
+            'handlers': {kind: summarize(kind_samples) for kind, kind_samples in samples.items()},
+        }
+
+    def report(self, results):
+        overall = results['all']
+        self.stdout.write(
+            f"Обновлений: {overall['updates']} за {results['total_ms']:.0f} мс "
+            f"({results['updates_per_sec']:.0f} в секунду)"
+        )
+        self.stdout.write(f"{'Обработчик':<14}{'p50, мс':>9}{'p95, мс':>9}{'p99, мс':>9}{'запросов':>10}{'API':>6}")
+        for kind, row in [*results['handlers'].items(), ('всего', overall)]:
+            self.stdout.write(
+                f"{kind:<14}{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}"
+                f"{row['queries_per_update']:>10.1f}{row['api_calls_per_update']:>6.1f}"
+            )
+
+    def compare(self, results, path, tolerance):
+        """Сравнивает с прошлым запуском; падает, если p95 или число запросов выросли больше допуска"""
+        with open(path, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline['options'] != results['options']:
+            self.stdout.write(f"⚠️ Параметры запуска отличаются от {path}: {baseline['options']}")
+        regressions = []
+        for kind, row in results['handlers'].items():
+            old = baseline['handlers'].get(kind)
+            if old is None:
+                continue
+            for metric in ('p95_ms', 'queries_per_update', 'api_calls_per_update'):
+                change = (row[metric] - old[metric]) / old[metric] if old[metric] else 0.0
+                if change > tolerance:
+                    regressions.append(f"{kind}: {metric} {old[metric]:.1f} → {row[metric]:.1f} (+{change:.0%})")
+        for line in regressions:
+            self.stdout.write(f"❌ {line}")
+        if regressions:
+            raise CommandError(f"Ухудшений относительно {path}: {len(regressions)}")
+        self.stdout.write(f"✅ Без ухудшений относительно {path}")
+
+
+def summarize(samples):
+    """p50/p95/p99 задержки и средние числа запросов к базе и Bot API"""
+    latencies = [sample['ms'] for sample in samples]
+    return {
+        'updates': len(samples),
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'max_ms': max(latencies),
+        'queries_per_update': sum(sample['queries'] for sample in samples) / len(samples),
+        'api_calls_per_update': sum(sample['api_calls'] for sample in samples) / len(samples),
+    }
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from plants import repository
+from plants.benchmarks import benchmark_database, percentile, seed_cultures, seed_plantings
+from plants.models import Planting
+from plants.stock import sell_stock
+
+
+@sync_to_async
+def legacy_current_plantings():
+    today = timezone.now().date()
+    return list(
+        Planting.objects.filter(harvest_date__gte=today)
+        .order_by("harvest_date")
+        .select_related("culture")
+    )
+
+
+@sync_to_async
+def legacy_sell(planting_id, amount):
+    return sell_stock(planting_id, amount)
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает задержку обработчиков бота при N параллельных чатах: sync_to_async и пул потоков'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chats', type=int, default=50, help='Количество параллельных чатов')
+        parser.add_argument('--rounds', type=int, default=5, help='Запросов на чат')
+        parser.add_argument('--rows', type=int, default=2_000, help='Количество посадок в базе')
+        parser.add_argument(
+            '--writer-lock-ms', type=int, default=30,
+            help='Сколько держит блокировку записи внешний процесс (веб, cron) в каждом цикле'
+        )
+        parser.add_argument('--output', help='Файл для результатов в формате JSON')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp, benchmark_database(os.path.join(tmp, 'bench.sqlite3')) as name:
+            self.database = name
+            cultures = seed_cultures()
+            seed_plantings(options['rows'], cultures)
+            planting_ids = list(
+                Planting.objects.filter(harvest_date__gte=timezone.now().date()).values_list('id', flat=True)[:options['chats']]
+            )
+
+            results = {
+                'sync_to_async': asyncio.run(self.run(options, planting_ids, legacy_current_plantings, legacy_sell)),
+                'repository': asyncio.run(self.run(options, planting_ids, repository.get_current_plantings, repository.sell)),
+            }
+            repository.shutdown()
+
+        for name, result in results.items():
+            self.stdout.write(f"{name}: всего {result['total']:.0f} мс")
+            for kind in ('current', 'sell'):
+                latencies = result[kind]
+                self.stdout.write(
+                    f"  {kind}: p50 {latencies['p50']:.1f} мс, p95 {latencies['p95']:.1f} мс, "
+                    f"max {latencies['max']:.1f} мс"
+                )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+
+    def external_writer(self, lock_ms, stop):
+        """Имитирует другой процесс, периодически держащий блокировку записи"""
+        db = sqlite3.connect(self.database, timeout=30, isolation_level=None)
+        while not stop.is_set():
+            db.execute("BEGIN IMMEDIATE")
+            time.sleep(lock_ms / 1000)
+            db.execute("COMMIT")
+            time.sleep(lock_ms / 1000)
+        db.close()
+
+    async def run(self, options, planting_ids, current_plantings, sell):
+        latencies = {'current': [], 'sell': []}
+
+        # Половина чатов смотрит /current, половина продает
+        async def chat(n):
+            planting_id = planting_ids[n % len(planting_ids)]
+            for _ in range(options['rounds']):
+                started = time.perf_counter()
+                if n % 2:
+                    await sell(planting_id, 1)
+                    kind = 'sell'
+                else:
+                    await current_plantings()
+                    kind = 'current'
+                latencies[kind].append((time.perf_counter() - started) * 1000)
+
+        stop = threading.Event()
+        writer = threading.Thread(target=self.external_writer, args=(options['writer_lock_ms'], stop))
+        writer.start()
+        try:
+            started = time.perf_counter()
+            await asyncio.gather(*(chat(n) for n in range(options['chats'])))
+            total = (time.perf_counter() - started) * 1000
+        finally:
+            stop.set()
+            writer.join()
+
+        result = {'total': total}
+        for kind, values in latencies.items():
+            result[kind] = {
+                'p50': statistics.median(values),
+                'p95': percentile(values, 0.95),
+                'max': max(values),
+            }
+        return result
@@ -0,0 +1,118 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+from django.core.management.base import BaseCommand, CommandError
+
+from plants import export, tenancy
+from plants.benchmarks import benchmark_database, seed_cultures, seed_farm, seed_plantings, seed_sales
+
+SHEET_ROW = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}row'
+
+
+class Command(BaseCommand):
+    help = 'Проверяет, что память выгрузки CSV/XLSX не растет с числом строк, и замеряет скорость'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,20000,200000',
+                            help='Размеры выгрузок через запятую, по возрастанию')
+        parser.add_argument('--max-growth-kb', type=int, default=512,
+                            help='Допустимый рост пика памяти самой большой выгрузки над предыдущей, КБ')
+        parser.add_argument('--output', help='Файл для результатов в формате JSON')
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        if len(sizes) < 2:
+            raise CommandError("Нужно хотя бы два размера выгрузки")
+        results = []
+        with tempfile.TemporaryDirectory() as tmp, benchmark_database(os.path.join(tmp, 'bench.sqlite3')):
+            cultures = seed_cultures()
+            farms = {}
+            for rows in sizes:
+                farm = farms[rows] = seed_farm(f"Ферма {rows}")
+                seed_plantings(rows, cultures, farm=farm)
+                seed_sales(rows, cultures, farm=farm)
+
+            for kind in export.SOURCES:
+                for fmt in export.FORMATS:
+                    for rows, farm in farms.items():
+                        with tenancy.scope(farm.id):
+                            result = self.measure(kind, fmt, tmp)
+                        if result['rows'] != rows:
+                            raise CommandError(f"{kind}.{fmt}: в файле {result['rows']} строк вместо {rows}")
+                        results.append({'kind': kind, 'format': fmt, **result})
+                        self.stdout.write(
+                            f"{kind}.{fmt:<5} {rows:>9} строк: пик памяти {result['peak_kb']:>7.0f} КБ, "
+                            f"{result['rows_per_sec']:>8.0f} строк/с, файл {result['size_kb']:.0f} КБ"
+                        )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+
+        # Выгрузка меньше одного куска (export.CHUNK_SIZE) не показательна,
+        # поэтому самая большая сравнивается с предыдущей по размеру
+        failures = []
+        for small, large in zip(results[len(sizes) - 2::len(sizes)], results[len(sizes) - 1::len(sizes)]):
+            growth = large['peak_kb'] - small['peak_kb']
+            if growth > options['max_growth_kb']:
+                failures.append(
+                    f"{small['kind']}.{small['format']}: пик вырос на {growth:.0f} КБ "
+                    f"({small['peak_kb']:.0f} → {large['peak_kb']:.0f})"
+                )
+        for line in failures:
+            self.stdout.write(f"❌ {line}")
+        if failures:
+            raise CommandError(f"Память растет с размером выгрузки: {len(failures)}")
+        self.stdout.write(
+            f"✅ Пик памяти не зависит от размера выгрузки (рост не больше {options['max_growth_kb']} КБ)"
+        )
+
+    def measure(self, kind, fmt, tmp):
+        """Пик памяти Python при обходе выгрузки, скорость без tracemalloc и проверка файла"""
+        filters = export.parse_filters({})
+        tracemalloc.start()
+        try:
+            for chunk in export.chunks(kind, fmt, filters):
+                del chunk
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        path = os.path.join(tmp, f"export.{fmt}")
+        started = time.perf_counter()
+        with open(path, 'wb') as f:
+            for chunk in export.chunks(kind, fmt, filters):
+                f.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        elapsed = time.perf_counter() - started
+
+        rows = count_rows(path, fmt) - 1
+        return {
+            'rows': rows,
+            'peak_kb': peak / 1024,
+            'rows_per_sec': rows / elapsed,
+            'size_kb': os.path.getsize(path) / 1024,
+        }
+
+
+def count_rows(path, fmt):
+    """Строки файла вместе с заголовком; XLSX читается как zip, лист — потоковым разбором"""
+    if fmt == 'csv':
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            return sum(1 for _ in csv.reader(f))
+    with zipfile.ZipFile(path) as archive:
+        if archive.testzip() is not None:
+            raise CommandError(f"Поврежден архив {path}")
+        with archive.open('xl/worksheets/sheet1.xml') as sheet:
+            count = 0
+            for _, element in iterparse(io.BufferedReader(sheet)):
+                if element.tag == SHEET_ROW:
+                    count += 1
+                    element.clear()
+            return count
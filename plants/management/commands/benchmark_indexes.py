@@ -0,0 +1,103 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from plants.benchmarks import benchmark_database, seed_cultures, seed_farm, seed_plantings, timer
+from plants.models import Planting
+
+
+class Command(BaseCommand):
+    help = 'Проверяет планы горячих запросов к посадкам на синтетических данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000, help='Количество посадок (100k–1M)')
+        parser.add_argument('--output', help='Файл для результатов в формате JSON')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("Бенчмарк рассчитан на SQLite")
+
+        rows = options['rows']
+        results = []
+        failures = []
+
+        with benchmark_database():
+            with timer() as seeding:
+                cultures = seed_cultures()
+                seed_plantings(rows, cultures, farm=seed_farm("Большая ферма"))
+                # Маленькая ферма рядом с большой: ее запросы не должны зависеть от чужих строк
+                small_farm = seed_farm("Маленькая ферма")
+                seed_plantings(max(rows // 100, 1), cultures, farm=small_farm)
+            self.stdout.write(f"Создано {rows} посадок за {seeding['ms']:.0f} мс")
+
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+            today = timezone.now().date()
+            culture = cultures[0]
+            queries = [
+                (
+                    'current_plantings',
+                    Planting.objects.filter(harvest_date__gte=today)
+                    .order_by('harvest_date').select_related('culture'),
+                    ('planting_harvest_status_idx',),
+                ),
+                (
+                    'farm_current_plantings',
+                    Planting.objects.filter(farm=small_farm, harvest_date__gte=today, archived=False)
+                    .order_by('harvest_date', 'id').select_related('culture'),
+                    ('planting_farm_harvest_idx',),
+                ),
+                (
+                    'farm_plan_history',
+                    Planting.objects.filter(farm=small_farm, plant_date__lt=today, status='growing')
+                    .values('culture_id', 'plant_date', 'quantity'),
+                    ('planting_farm_plant_date_idx', 'planting_farm_harvest_idx'),
+                ),
+                (
+                    'sweep_expired',
+                    Planting.objects.filter(sale_deadline__lte=today)
+                    .exclude(status='expired').values('pk'),
+                    ('planting_deadline_status_idx',),
+                ),
+                (
+                    'sweep_ready',
+                    Planting.objects.filter(harvest_date__lte=today, sale_deadline__gt=today)
+                    .exclude(status='ready').values('pk'),
+                    # Планировщик выбирает более узкий из двух диапазонов
+                    ('planting_harvest_status_idx', 'planting_deadline_status_idx'),
+                ),
+                (
+                    'admin_status_culture',
+                    Planting.objects.filter(status='ready', culture=culture).values('pk'),
+                    ('planting_status_culture_idx',),
+                ),
+            ]
+
+            for name, queryset, indexes in queries:
+                plan = queryset.explain()
+                with timer() as elapsed:
+                    count = len(list(queryset))
+                uses_index = any(index in plan for index in indexes)
+                results.append({
+                    'query': name,
+                    'indexes': list(indexes),
+                    'uses_index': uses_index,
+                    'rows': count,
+                    'ms': round(elapsed['ms'], 2),
+                    'plan': plan,
+                })
+                self.stdout.write(
+                    f"{'✅' if uses_index else '❌'} {name}: {count} строк за {elapsed['ms']:.1f} мс\n{plan}"
+                )
+                if not uses_index:
+                    failures.append(name)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump({'rows': rows, 'results': results}, f, ensure_ascii=False, indent=2)
+
+        if failures:
+            raise CommandError(f"Запросы не используют индексы: {', '.join(failures)}")
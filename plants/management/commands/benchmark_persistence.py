@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from telegram import Update
+
+from plants import catalog, repository
+from plants.benchmarks import benchmark_database, seed_cultures, timer
+from plants.models import BotState, FarmMember, Planting
+from telegram_persistence import DjangoPersistence
+from telegram_stub import build_stub_application, message_update
+
+
+def build_bot():
+    """Приложение бота без сети; состояние сбрасывается в базу вручную, по числу обновлений"""
+    return build_stub_application(persistence=DjangoPersistence(update_interval=3600))
+
+
+class Command(BaseCommand):
+    help = 'Замеряет накладные расходы сохранения состояния бота и время восстановления после перезапуска'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Пользователей с незаконченным диалогом')
+        parser.add_argument('--batch', type=int, default=500, help='Обновлений между сбросами в базу')
+        parser.add_argument('--budget-overhead-us', type=float, default=200,
+                            help='Допустимые затраты на сохранение в пересчете на обновление, мкс')
+        parser.add_argument('--budget-recovery-ms', type=float, default=1000,
+                            help='Допустимое время запуска с восстановлением состояния, мс')
+
+    def handle(self, *args, **options):
+        try:
+            with benchmark_database():
+                seed_cultures(5)
+                catalog.invalidate()
+                asyncio.run(self.run(options))
+        finally:
+            repository.shutdown()
+
+    async def run(self, options):
+        users = range(1, options['users'] + 1)
+        culture = (await repository.get_cultures())[0]
+        choice = f"{culture.id}: {culture.name}"
+
+        application = build_bot()
+        await application.initialize()
+        self.update_id = 0
+        self.handled = []
+        self.flushes = []
+
+        # Четные пользователи останавливаются на вводе количества в /new,
+        # нечетные создают посадку и начинают /edit
+        for user in users:
+            await self.send(application, user, '/new', choice, *(['3'] if user % 2 else []), options=options)
+        plantings = await repository.run_db(planting_by_chat, [user for user in users if user % 2])
+        for user, planting_id in plantings.items():
+            await self.send(application, user, f"/edit {planting_id}", options=options)
+        await self.flush(application)
+
+        persistence = application.persistence
+        await application.shutdown()
+        rows = await repository.run_db(BotState.objects.count)
+        handled = sum(self.handled) / len(self.handled) * 10 ** 6
+        saved = sum(seconds for seconds, _ in self.flushes) * 10 ** 6 / sum(count for _, count in self.flushes)
+        self.stdout.write(
+            f"Обновлений: {len(self.handled)}, обработка {handled:.0f} мкс на обновление; "
+            f"сохранение пачками ({persistence.batches} транзакций, {persistence.rows} записей): "
+            f"{saved:.0f} мкс на обновление"
+        )
+        self.stdout.write(f"В базе записей состояния: {rows}")
+
+        # Для сравнения: запись в базу на каждое обновление
+        sample = [(('write_through', str(user)), {'culture_id': culture.id}) for user in users][:200]
+        with timer() as write_through:
+            for key, data in sample:
+                await repository.save_bot_state({key: data})
+        await repository.save_bot_state({key: None for key, _ in sample})
+        write_through_us = write_through['ms'] * 1000 / len(sample)
+        self.stdout.write(f"Запись на каждое обновление: {write_through_us:.0f} мкс на обновление")
+
+        # Перезапуск: новое приложение поднимает user_data и диалоги из базы
+        with timer() as recovery:
+            application = build_bot()
+            await application.initialize()
+        self.stdout.write(
+            f"Перезапуск с восстановлением {len(application.user_data)} user_data: {recovery['ms']:.0f} мс"
+        )
+
+        # Диалоги продолжаются с того же шага
+        for user in users:
+            await self.send(application, user, '7' if user % 2 else '4', options=options)
+        await application.shutdown()
+        created = await repository.run_db(Planting.objects.filter(quantity=4).count)
+        edited = await repository.run_db(Planting.objects.filter(id__in=plantings.values(), quantity=7).count)
+        left = await repository.run_db(BotState.objects.filter(kind__startswith='conversation').count)
+        self.stdout.write(f"После перезапуска: создано посадок {created}, изменено {edited}, незакрытых диалогов {left}")
+
+        expected_created = len(users) - len(plantings)
+        if created != expected_created or edited != len(plantings) or left:
+            raise CommandError(
+                f"Диалоги не восстановились: ожидалось {expected_created} новых и {len(plantings)} измененных посадок"
+            )
+        if saved > options['budget_overhead_us']:
+            raise CommandError(f"Сохранение {saved:.0f} мкс на обновление больше бюджета")
+        if recovery['ms'] > options['budget_recovery_ms']:
+            raise CommandError(f"Восстановление {recovery['ms']:.0f} мс больше бюджета")
+        self.stdout.write("✅ Состояние пережило перезапуск")
+
+    async def send(self, application, user, *texts, options):
+        for text in texts:
+            self.update_id += 1
+            update = Update.de_json(message_update(self.update_id, user, text), application.bot)
+            started = time.perf_counter()
+            # Как в Application: у каждого обновления своя задача и своя текущая ферма
+            await asyncio.create_task(application.process_update(update))
+            self.handled.append(time.perf_counter() - started)
+            if len(self.handled) % options['batch'] == 0:
+                await self.flush(application)
+
+    async def flush(self, application):
+        """То, что Application делает раз в update_interval"""
+        pending = len(self.handled) - sum(count for _, count in self.flushes)
+        if not pending:
+            return
+        started = time.perf_counter()
+        await application.update_persistence()
+        await application.persistence.flush()
+        self.flushes.append((time.perf_counter() - started, pending))
+
+
+def planting_by_chat(chat_ids):
+    """ID посадки в ферме каждого чата"""
+    farms = dict(FarmMember.objects.filter(chat_id__in=chat_ids).values_list('farm_id', 'chat_id'))
+    return {
+        farms[farm_id]: planting_id
+        for farm_id, planting_id in Planting.objects.filter(farm_id__in=farms).values_list('farm_id', 'id')
+    }
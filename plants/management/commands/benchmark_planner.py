@@ -0,0 +1,76 @@
+import random
+from datetime import timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from plants.benchmarks import timer
+from plants.models import Culture
+from plants.planner import build_plan
+
+
+class Command(BaseCommand):
+    help = 'Замеряет расчет плана производства на сотнях культур и сверяет его с построчным расчетом'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cultures', type=int, default=500, help='Количество культур')
+        parser.add_argument('--days', type=int, default=365, help='Горизонт в днях')
+        parser.add_argument('--repeat', type=int, default=10, help='Повторов замера')
+        parser.add_argument('--budget-ms', type=float, default=250, help='Допустимая медиана, мс')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['cultures'])
+        today = timezone.now().date()
+        cultures = [
+            Culture(
+                id=i,
+                name=f"Культура {i}",
+                grow_days=rng.randint(7, 21),
+                expire_days=rng.randint(3, 7),
+                grams_per_tray=rng.randint(10, 100),
+                germination_days=rng.randint(2, 4),
+                light_days=rng.randint(4, 12),
+            )
+            for i in range(options['cultures'])
+        ]
+        demand = [rng.randint(0, 40) for _ in cultures]
+        existing = [
+            (rng.randrange(len(cultures)), today - timedelta(days=rng.randint(0, 10)), rng.randint(1, 10))
+            for _ in range(len(cultures) * 2)
+        ]
+
+        samples = []
+        for _ in range(options['repeat']):
+            with timer() as elapsed:
+                plan = build_plan(cultures, demand, options['days'], today, cadence=2, existing=existing)
+            samples.append(elapsed['ms'])
+        samples.sort()
+        median = samples[len(samples) // 2]
+
+        with timer() as reference_time:
+            reference = reference_occupancy(cultures, plan.sow, existing, today)
+        if not np.array_equal(reference, plan.germination + plan.light):
+            raise CommandError("Загрузка стеллажей расходится с построчным расчетом")
+
+        self.stdout.write(
+            f"Культур: {len(cultures)}, горизонт {options['days']} дн.: "
+            f"медиана {median:.1f} мс, максимум {samples[-1]:.1f} мс "
+            f"(построчный расчет загрузки {reference_time['ms']:.0f} мс)"
+        )
+        if median > options['budget_ms']:
+            raise CommandError(f"Медиана {median:.1f} мс больше бюджета {options['budget_ms']:.0f} мс")
+
+
+def reference_occupancy(cultures, sow, existing, start):
+    """Загрузка стеллажей циклом по каждому посеву — для сверки"""
+    occupied = np.zeros_like(sow)
+    horizon = sow.shape[0]
+    plantings = [(c, day, int(sow[day, c])) for day, c in zip(*np.nonzero(sow))]
+    plantings += [(c, (plant_date - start).days, quantity) for c, plant_date, quantity in existing]
+    for c, day, quantity in plantings:
+        culture = cultures[c]
+        for t in range(day, day + culture.germination_days + culture.light_days):
+            if 0 <= t < horizon:
+                occupied[t, c] += quantity
+    return occupied
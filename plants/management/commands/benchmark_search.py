@@ -0,0 +1,129 @@
+import asyncio
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from telegram import Update
+
+from plants import catalog, repository, search, tenancy
+from plants.benchmarks import benchmark_database, percentile, seed_farm, seed_plantings
+from plants.models import Culture, FarmMember, normalize_name
+from telegram_stub import StubRequest, build_stub_application, inline_query_update
+
+NAMES = [
+    "Амарант", "Базилик", "Базилик зеленый", "Базилик фиолетовый", "Брокколи", "Горох", "Горох усатый",
+    "Горчица", "Дайкон", "Кинза", "Кольраби", "Капуста краснокочанная", "Кресс-салат", "Кукуруза",
+    "Лук", "Люцерна", "Мангольд", "Маш", "Мизуна", "Нут", "Подсолнечник", "Пшеница", "Редис",
+    "Редис санго", "Руккола", "Свекла", "Сельдерей", "Смесь острая", "Укроп", "Чечевица", "Шпинат", "Щавель",
+]
+CHAT_ID = 1
+# Допустимый p95 запроса без кэша и обработки inline-запроса ботом (мс)
+BUDGET_MS = 50
+
+
+def seed_catalog():
+    """Общий справочник культур NAMES с заполненным названием для поиска"""
+    return Culture.objects.bulk_create([
+        Culture(name=name, search_name=normalize_name(name), grow_days=7 + i % 8, expire_days=3 + i % 4)
+        for i, name in enumerate(NAMES)
+    ])
+
+
+def prefix_queries():
+    """Начала названий длиной от 1 до 5 букв — то, что набирают в inline-режиме"""
+    return sorted({normalize_name(name)[:length] for name in NAMES for length in range(1, 6)})
+
+
+def cold(queries):
+    """Время каждого запроса со сброшенным кэшем поиска (мс)"""
+    samples = []
+    for query in queries:
+        search.clear()
+        started = time.perf_counter()
+        search.search(query)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+class Command(BaseCommand):
+    help = 'Замеряет inline-поиск посадок и культур: запросы без кэша, набор по буквам и обработку в боте'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000, help='Количество посадок')
+        parser.add_argument('--budget-ms', type=float, default=BUDGET_MS,
+                            help='Допустимый p95 запроса без кэша и обработки inline-запроса ботом')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp, benchmark_database(os.path.join(tmp, 'bench.sqlite3')):
+            cultures = seed_catalog()
+            farm = seed_farm()
+            seed_plantings(options['rows'], cultures, farm=farm)
+            FarmMember.objects.create(farm=farm, chat_id=CHAT_ID, role='admin')
+            catalog.invalidate()
+
+            queries = prefix_queries()
+            with tenancy.scope(farm.id):
+                self.check_plan()
+                cold_samples = cold(queries)
+                typing, db_hits, keystrokes = self.typing()
+            bot = asyncio.run(self.bot(queries))
+            repository.shutdown()
+
+        self.stdout.write(f"Посадок: {options['rows']}, культур: {len(NAMES)}, запросов: {len(queries)}")
+        rows = [
+            ('без кэша', cold_samples),
+            ('набор по буквам', typing),
+            ('обработка ботом', bot),
+        ]
+        for label, samples in rows:
+            self.stdout.write(
+                f"  {label:<16} p50 {percentile(samples, 0.5):6.2f} мс, p95 {percentile(samples, 0.95):6.2f} мс, "
+                f"max {max(samples):6.2f} мс"
+            )
+        self.stdout.write(f"  при наборе по буквам запросов к базе: {db_hits} из {keystrokes} нажатий")
+
+        for label, samples in (rows[0], rows[2]):
+            p95 = percentile(samples, 0.95)
+            if p95 > options['budget_ms']:
+                raise CommandError(f"{label}: p95 {p95:.1f} мс больше бюджета {options['budget_ms']:.0f} мс")
+        self.stdout.write(f"✅ p95 укладывается в {options['budget_ms']:.0f} мс")
+
+    def check_plan(self):
+        """Поиск культур должен идти по индексу search_name, а не перебором таблицы"""
+        queryset = Culture.objects.filter(search_name__gte='баз', search_name__lt='баз' + search.PREFIX_END)
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        if 'search_name' not in plan:
+            raise CommandError(f"Поиск культур не использует индекс: {plan}")
+
+    def typing(self):
+        """Набор названий по буквам; кэш сбрасывается перед каждым словом"""
+        samples = []
+        db_hits = 0
+        for name in NAMES:
+            search.clear()
+            for length in range(1, len(name) + 1):
+                started = time.perf_counter()
+                _, cached = search.search(name[:length])
+                samples.append((time.perf_counter() - started) * 1000)
+                db_hits += not cached
+        return samples, db_hits, len(samples)
+
+    async def bot(self, queries):
+        """Inline-запросы без кэша через обработчики бота (ферма, поиск, сборка и отправка ответа)"""
+        application = build_stub_application(StubRequest())
+        await application.initialize()
+        samples = []
+        for update_id, query in enumerate(queries, 1):
+            update = Update.de_json(inline_query_update(update_id, CHAT_ID, query), application.bot)
+            search.clear()
+            started = time.perf_counter()
+            # Как в Application: у каждого обновления своя задача и свой контекст
+            await asyncio.create_task(application.process_update(update))
+            samples.append((time.perf_counter() - started) * 1000)
+        await application.shutdown()
+        return samples
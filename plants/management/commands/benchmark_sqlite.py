@@ -0,0 +1,153 @@
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection, connections, transaction
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+
+from plants import sqlite
+from plants.benchmarks import benchmark_database, percentile, seed_cultures, seed_farm, seed_plantings
+from plants.models import Planting
+from plants.statuses import update_statuses
+from plants.stock import sell_stock
+
+# Настройки Django по умолчанию: журнал отката, полный fsync, соединение
+# на запрос и 5 секунд ожидания блокировки модулем sqlite3
+PROFILES = ('default', 'tuned')
+
+
+def worker(profile, role, seconds, seed, planting_ids, farm_id, results):
+    """Процесс бота, сайта или cron: выполняет операции своей роли до конца замера"""
+    if profile == 'default':
+        connection_created.disconnect(dispatch_uid='sqlite_profile')
+        connection.settings_dict['CONN_MAX_AGE'] = 0
+    latencies, errors = [], []
+    try:
+        run_role(role, time.monotonic() + seconds, random.Random(seed), planting_ids, farm_id, latencies, errors)
+    finally:
+        # Родитель ждет ответа от каждого процесса, даже упавшего
+        connections.close_all()
+        results.put((role, latencies, len(errors)))
+
+
+def run_role(role, deadline, rng, planting_ids, farm_id, latencies, errors):
+    cultures = list(Planting.objects.values_list('culture_id', flat=True).distinct()[:20])
+    while time.monotonic() < deadline:
+        # Как repository._call и конец запроса сайта: соединение закрывается по CONN_MAX_AGE
+        close_old_connections()
+        started = time.perf_counter()
+        today = timezone.now().date()
+        try:
+            if role == 'writer':
+                if rng.random() < 0.8:
+                    sell_stock(rng.choice(planting_ids), 1)
+                else:
+                    with transaction.atomic():
+                        Planting.objects.create(
+                            farm_id=farm_id, culture_id=rng.choice(cultures),
+                            quantity=rng.randint(1, 30), plant_date=today,
+                        )
+            elif role == 'reader':
+                list(Planting.objects.filter(harvest_date__gte=today, archived=False).select_related('culture'))
+            else:
+                update_statuses()
+        except OperationalError as e:
+            errors.append(str(e))
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+        if role == 'cron':
+            time.sleep(0.2)
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает запись в SQLite из нескольких процессов (бот, сайт, cron) с профилем и без'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help='Процессов, которые продают и сажают')
+        parser.add_argument('--readers', type=int, default=2, help='Процессов, которые читают посадки')
+        parser.add_argument('--seconds', type=float, default=5, help='Длительность замера для профиля')
+        parser.add_argument('--rows', type=int, default=5_000, help='Количество посадок в базе')
+        parser.add_argument('--output', help='Файл для результатов в формате JSON')
+
+    def handle(self, *args, **options):
+        results = {}
+        for profile in PROFILES:
+            with tempfile.TemporaryDirectory() as tmp, benchmark_database(os.path.join(tmp, 'bench.sqlite3')):
+                cultures = seed_cultures()
+                farm = seed_farm()
+                seed_plantings(options['rows'], cultures, history_days=30, farm=farm)
+                planting_ids = list(
+                    Planting.objects.filter(sale_deadline__gt=timezone.now().date()).values_list('id', flat=True)
+                )
+                with connection.cursor() as cursor:
+                    cursor.execute("PRAGMA journal_mode = " + ('delete' if profile == 'default' else 'wal'))
+                    mode = cursor.fetchone()[0]
+                if profile == 'tuned':
+                    sqlite.optimize()
+                results[profile] = {'journal_mode': mode, **self.run(profile, options, planting_ids, farm.id)}
+                connections.close_all()
+
+        for profile, result in results.items():
+            self.stdout.write(f"{profile} ({result['journal_mode']}):")
+            for role in ('writer', 'reader', 'cron'):
+                stats = result[role]
+                if not stats['ops']:
+                    self.stdout.write(f"  {role:<7} операций нет, ошибок {stats['errors']}")
+                    continue
+                self.stdout.write(
+                    f"  {role:<7} {stats['per_sec']:>7.0f} оп/с, p50 {stats['p50']:6.1f} мс, "
+                    f"p95 {stats['p95']:7.1f} мс, max {stats['max']:7.1f} мс, «database is locked»: {stats['errors']}"
+                )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+
+        tuned = results['tuned']
+        errors = sum(tuned[role]['errors'] for role in ('writer', 'reader', 'cron'))
+        if errors:
+            raise CommandError(f"С профилем {settings.SQLITE_PRAGMAS} блокировок с ошибкой: {errors}")
+        self.stdout.write(
+            f"✅ С профилем ошибок блокировки нет; запись быстрее в "
+            f"{tuned['writer']['per_sec'] / max(results['default']['writer']['per_sec'], 1e-9):.1f} раза"
+        )
+
+    def run(self, profile, options, planting_ids, farm_id):
+        # Каждый процесс откроет свое соединение после fork
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        roles = ['writer'] * options['writers'] + ['reader'] * options['readers'] + ['cron']
+        processes = [
+            context.Process(
+                target=worker,
+                args=(profile, role, options['seconds'], n, planting_ids, farm_id, queue),
+            )
+            for n, role in enumerate(roles)
+        ]
+        for process in processes:
+            process.start()
+        collected = [queue.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        result = {}
+        for role in ('writer', 'reader', 'cron'):
+            latencies = [value for name, values, _ in collected if name == role for value in values]
+            errors = sum(count for name, _, count in collected if name == role)
+            result[role] = {
+                'ops': len(latencies),
+                'errors': errors,
+                'per_sec': len(latencies) / options['seconds'],
+                'p50': statistics.median(latencies) if latencies else 0,
+                'p95': percentile(latencies, 0.95) if latencies else 0,
+                'max': max(latencies) if latencies else 0,
+            }
+        return result
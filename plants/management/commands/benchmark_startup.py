@@ -0,0 +1,122 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from plants.benchmarks import benchmark_database, seed_cultures, seed_farm, seed_plantings
+from plants.models import FarmMember
+
+CHAT_ID = 1
+# Допустимая медиана времени до первого обновления с settings_bot (мс)
+BUDGET_MS = 1500
+
+# Холодный запуск бота в отдельном процессе: импорт, django.setup(),
+# сборка приложения, initialize, прогрев кэшей и первое обновление
+PROBE = '''
+import asyncio, json, sys, time
+started = time.perf_counter()
+from telegram import Update
+from telegram_stub import build_stub_application, message_update
+from django.conf import settings
+settings.DATABASES['default']['NAME'] = sys.argv[1]
+import telegram_bot
+imported = time.perf_counter()
+
+async def main():
+    application = build_stub_application()
+    await application.initialize()
+    initialized = time.perf_counter()
+    await telegram_bot.prewarm(application)
+    warmed = time.perf_counter()
+    update = Update.de_json(message_update(1, int(sys.argv[2]), '/current'), application.bot)
+    await application.process_update(update)
+    handled = time.perf_counter()
+    first_update_at = time.time()
+    await application.shutdown()
+    telegram_bot.repository.shutdown()
+    print(json.dumps({
+        'import_ms': (imported - started) * 1000,
+        'initialize_ms': (initialized - imported) * 1000,
+        'prewarm_ms': (warmed - initialized) * 1000,
+        'first_update_ms': (handled - warmed) * 1000,
+        'first_update_at': first_update_at,
+        'apps': len(settings.INSTALLED_APPS),
+        'numpy_loaded': 'numpy' in sys.modules,
+    }))
+
+asyncio.run(main())
+'''
+
+PROFILES = {
+    'бот (settings_bot)': 'zelen_pro.settings_bot',
+    'сайт (settings)': 'zelen_pro.settings',
+}
+
+
+class Command(BaseCommand):
+    help = 'Замеряет холодный запуск бота до обработки первого обновления'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Запусков на профиль настроек')
+        parser.add_argument('--rows', type=int, default=2000, help='Посадок в базе')
+        parser.add_argument('--budget-ms', type=float, default=BUDGET_MS,
+                            help='Допустимая медиана времени до первого обновления с settings_bot')
+        parser.add_argument('--output', help='Файл для результатов в формате JSON')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp, benchmark_database(os.path.join(tmp, 'bench.sqlite3')) as name:
+            farm = seed_farm()
+            seed_plantings(options['rows'], seed_cultures(), history_days=30, farm=farm)
+            FarmMember.objects.create(farm=farm, chat_id=CHAT_ID, role='admin')
+            results = {
+                label: [probe(module, name) for _ in range(options['runs'])]
+                for label, module in PROFILES.items()
+            }
+
+        summary = {}
+        for label, runs in results.items():
+            row = {key: statistics.median(run[key] for run in runs) for key in (
+                'total_ms', 'import_ms', 'initialize_ms', 'prewarm_ms', 'first_update_ms'
+            )}
+            row['apps'] = runs[0]['apps']
+            row['numpy_loaded'] = any(run['numpy_loaded'] for run in runs)
+            summary[label] = row
+            self.stdout.write(
+                f"{label}: до первого обновления {row['total_ms']:.0f} мс (медиана), "
+                f"импорт и настройка {row['import_ms']:.0f} мс, initialize {row['initialize_ms']:.0f} мс, "
+                f"прогрев {row['prewarm_ms']:.0f} мс, первое обновление {row['first_update_ms']:.0f} мс; "
+                f"приложений Django {row['apps']}, numpy {'загружен' if row['numpy_loaded'] else 'не загружен'}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+
+        bot = summary['бот (settings_bot)']
+        if bot['numpy_loaded']:
+            raise CommandError("numpy загружается при запуске бота")
+        if bot['total_ms'] > options['budget_ms']:
+            raise CommandError(f"Запуск {bot['total_ms']:.0f} мс больше бюджета {options['budget_ms']:.0f} мс")
+        self.stdout.write(f"✅ Запуск укладывается в {options['budget_ms']:.0f} мс (без сети до Telegram)")
+
+
+def probe(settings_module, database):
+    """Один холодный запуск бота с settings_module на базе database; total_ms — до первого обновления"""
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module, 'BOT_MODE': 'polling'}
+    env.setdefault('TELEGRAM_BOT_TOKEN', '1:stub')
+    started = time.time()
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE, database, str(CHAT_ID)],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode:
+        raise CommandError(f"Запуск с {settings_module} завершился ошибкой:\n{result.stderr[-2000:]}")
+    run = json.loads(result.stdout.strip().splitlines()[-1])
+    run['total_ms'] = (run['first_update_at'] - started) * 1000
+    return run
@@ -0,0 +1,91 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+from django.utils import timezone
+
+from plants import stats, tenancy
+from plants.benchmarks import benchmark_database, seed_cultures, seed_plantings, timer
+from plants.bulk import create_plantings
+from plants.models import Farm, Planting, Sale, WeeklyStats
+from plants.statuses import update_statuses
+from plants.stock import sell_stock
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает /stats по недельной сводке с агрегацией посадок и проверяет, что сводка сходится'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000, help='Количество посадок')
+        parser.add_argument('--weeks', type=int, default=13, help='Период отчета в неделях')
+        parser.add_argument('--repeat', type=int, default=20, help='Повторов каждого замера')
+
+    def handle(self, *args, **options):
+        weeks = options['weeks']
+        today = timezone.now().date()
+
+        with benchmark_database():
+            cultures = seed_cultures(20)
+            seed_plantings(options['rows'], cultures)
+            with timer() as elapsed:
+                stats.rebuild()
+            self.stdout.write(f"Начальный пересчет сводки: {elapsed['ms']:.0f} мс")
+
+            # Инкрементальные изменения: новые посадки и смена статусов
+            with tenancy.scope(Farm.objects.get().id):
+                create_plantings([(culture, 10, today) for culture in cultures])
+            update_statuses(today=today + timedelta(days=14))
+
+            incremental = snapshot()
+            stats.rebuild()
+            if incremental != snapshot():
+                raise CommandError("Инкрементальная сводка расходится с пересчетом по посадкам")
+
+            # Продажи, в том числе до нуля и просроченных лотков, не сдвигают "посажено"
+            for planting_id, quantity in Planting.objects.filter(quantity__gt=1).values_list('id', 'quantity')[:200]:
+                sell_stock(planting_id, 1)
+                sell_stock(planting_id, quantity - 1)
+            sold = WeeklyStats.objects.filter(week=stats.week_start(today)).aggregate(total=Sum('sold'))['total']
+            ledger = Sale.objects.aggregate(total=Sum('quantity'))['total']
+            if sold != ledger:
+                raise CommandError(f"Продано по сводке {sold}, по журналу {ledger}")
+            incremental = snapshot()
+            stats.rebuild()
+            if incremental != snapshot():
+                raise CommandError("После продаж сводка расходится с пересчетом по посадкам")
+            self.stdout.write("Сводка совпадает с пересчетом по посадкам и журналом продаж")
+
+            since = stats.week_start(today) - timedelta(weeks=weeks)
+            plantings = Planting.objects.filter(plant_date__gt=since)
+            results = {
+                'агрегация посадок': measure(options['repeat'], lambda: (
+                    stats.record_transition(plantings, 'planted', 'plant_date'),
+                    stats.record_transition(plantings.filter(status__in=('ready', 'expired')),
+                                            'harvested', 'harvest_date'),
+                    stats.record_transition(plantings.filter(status='expired'), 'expired', 'sale_deadline'),
+                )),
+                'недельная сводка': measure(options['repeat'], lambda: stats.weekly_report(weeks)),
+                'сводка с кэшем': measure(options['repeat'], lambda: stats.cached_report(weeks)),
+            }
+
+        self.stdout.write(f"Посадок: {options['rows']}, период {weeks} нед.")
+        for name, ms in results.items():
+            self.stdout.write(f"  {name:<20} {ms:8.2f} мс")
+
+
+def snapshot():
+    return {
+        (row.week, row.culture_id): (row.planted, row.harvested, row.sold, row.expired)
+        for row in WeeklyStats.objects.all()
+    }
+
+
+def measure(repeat, func):
+    """Медиана времени выполнения в миллисекундах"""
+    samples = []
+    for _ in range(repeat):
+        with timer() as elapsed:
+            func()
+        samples.append(elapsed['ms'])
+    samples.sort()
+    return samples[len(samples) // 2]
@@ -0,0 +1,76 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from plants.benchmarks import benchmark_database, seed_cultures, seed_plantings, timer
+from plants.models import Planting
+
+# Допустимое число запросов на страницу админки
+QUERY_BUDGET = 12
+
+
+class Command(BaseCommand):
+    help = 'Проверяет число SQL-запросов на страницах админки посадок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20_000, help='Количество посадок')
+        parser.add_argument('--budget', type=int, default=QUERY_BUDGET, help='Максимум запросов на страницу')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        failures = []
+        try:
+            with benchmark_database():
+                cultures = seed_cultures()
+                seed_plantings(options['rows'], cultures)
+                get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+                client = Client()
+                client.login(username='admin', password='admin')
+                changelist = reverse('admin:plants_planting_changelist')
+                planting = Planting.objects.first()
+                pages = [
+                    ('список', changelist),
+                    ('фильтр по статусу', f"{changelist}?status__exact=ready"),
+                    ('фильтр по культуре', f"{changelist}?culture__id__exact={cultures[0].id}"),
+                    ('иерархия дат', f"{changelist}?plant_date__year={planting.plant_date.year}"),
+                    ('поиск', f"{changelist}?q={cultures[0].name}"),
+                    ('середина списка', f"{changelist}?p={options['rows'] // 200}"),
+                    ('карточка', reverse('admin:plants_planting_change', args=[planting.id])),
+                ]
+
+                for name, url in pages:
+                    with CaptureQueriesContext(connection) as queries, timer() as elapsed:
+                        response = client.get(url)
+                    count = len(queries.captured_queries)
+                    ok = response.status_code == 200 and count <= options['budget']
+                    self.stdout.write(
+                        f"{'✅' if ok else '❌'} {name}: {count} запросов, "
+                        f"{elapsed['ms']:.0f} мс, HTTP {response.status_code}"
+                    )
+                    if not ok:
+                        failures.append(name)
+                        for query in queries.captured_queries:
+                            self.stdout.write(f"    {query['sql'][:200]}")
+
+                # Количество строк берется из кэша, и последняя страница не пустая
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(changelist)
+                counts = [q for q in queries.captured_queries if 'COUNT(' in q['sql'].upper()]
+                cl = response.context['cl']
+                last = client.get(f"{changelist}?p={cl.paginator.num_pages}").context['cl']
+                ok = not counts and cl.result_count == options['rows'] and len(last.result_list) > 0
+                self.stdout.write(
+                    f"{'✅' if ok else '❌'} повторный список: COUNT-запросов {len(counts)}, "
+                    f"строк {cl.result_count}, на последней странице {len(last.result_list)}"
+                )
+                if not ok:
+                    failures.append('количество строк')
+        finally:
+            teardown_test_environment()
+
+        if failures:
+            raise CommandError(f"Превышен бюджет запросов: {', '.join(failures)}")
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import re
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from plants import catalog, farms, repository, tenancy
+from plants.benchmarks import benchmark_database, seed_cultures, seed_farm, seed_plantings
+from plants.models import Culture, DailySales, FarmMember, NotificationChat, Planting, Sale, WeeklyStats
+from plants.statuses import update_statuses
+from plants.stock import sell_stock
+
+TENANT_TABLES = [model._meta.db_table for model in (Planting, Sale, DailySales, WeeklyStats)]
+
+
+class Command(BaseCommand):
+    help = 'Проверяет, что бот, сайт и админка не читают и не меняют данные чужой фермы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000, help='Посадок на ферму')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        self.failures = []
+        try:
+            with benchmark_database():
+                self.run_checks(options['rows'])
+        finally:
+            teardown_test_environment()
+            repository.shutdown()
+
+        if self.failures:
+            raise CommandError(f"Найдены чтения чужих данных: {len(self.failures)}")
+        self.stdout.write("✅ Чужих данных не видно ни в одной проверке")
+
+    def expect(self, name, ok):
+        self.stdout.write(f"{'✅' if ok else '❌'} {name}")
+        if not ok:
+            self.failures.append(name)
+
+    def run_checks(self, rows):
+        shared = seed_cultures(2)
+        farm_a, farm_b = seed_farm("Ферма А"), seed_farm("Ферма Б")
+        own = {
+            farm_a.id: Culture.all_objects.create(name="Своя культура А", grow_days=7, expire_days=3, farm=farm_a),
+            farm_b.id: Culture.all_objects.create(name="Своя культура Б", grow_days=7, expire_days=3, farm=farm_b),
+        }
+        catalog.invalidate()
+        for farm in (farm_a, farm_b):
+            seed_plantings(rows, shared + [own[farm.id]], history_days=30, farm=farm)
+            with tenancy.scope(farm.id):
+                for planting_id in Planting.objects.filter(quantity__gt=2).values_list('id', flat=True)[:20]:
+                    sell_stock(planting_id, 1)
+        update_statuses()
+        FarmMember.objects.create(farm=farm_a, chat_id=101, role='admin')
+        FarmMember.objects.create(farm=farm_b, chat_id=202, role='admin')
+        NotificationChat.objects.bulk_create([NotificationChat(chat_id=101), NotificationChat(chat_id=202)])
+
+        for farm, other in ((farm_a, farm_b), (farm_b, farm_a)):
+            self.stdout.write(f"— {farm.name}")
+            foreign = Planting.objects.filter(farm=other).first()
+            foreign_quantity = foreign.quantity
+            with tenancy.scope(farm.id):
+                self.check_data_layer(farm, other, foreign, own)
+                asyncio.run(self.check_async(farm, foreign))
+            foreign.refresh_from_db()
+            self.expect("чужая посадка не изменилась", foreign.quantity == foreign_quantity)
+
+        chats = asyncio.run(repository.get_notification_chats())
+        self.expect("уведомления: чаты разделены по фермам", chats == {farm_a.id: [101], farm_b.id: [202]})
+        self.check_web(farm_a, farm_b, own)
+
+    def check_data_layer(self, farm, other, foreign, own):
+        """Синхронные функции слоя данных с проверкой каждого SQL-запроса"""
+        with CaptureQueriesContext(connection) as queries:
+            plantings = repository.get_current_plantings.__wrapped__()
+            missing = repository.get_planting.__wrapped__(foreign.id)
+            sold = repository.sell.__wrapped__(foreign.id, 1)
+            updated = repository.set_quantity.__wrapped__(foreign.id, 1)
+            deleted = repository.delete_planting.__wrapped__(foreign.id)
+            by_culture, by_day = repository.sales_summary.__wrapped__(30)
+            stats_by_culture, _, _ = repository.weekly_report.__wrapped__(13)
+            plan = repository.production_plan.__wrapped__()
+            created = repository.create_planting.__wrapped__(own[farm.id], 3)
+
+        self.expect("текущие посадки только своей фермы", plantings and all(p.farm_id == farm.id for p in plantings))
+        self.expect("чужая посадка не находится по ID", missing is None)
+        self.expect("чужую посадку нельзя продать, изменить и удалить",
+                   sold == (None, None) and not updated and deleted is None)
+        # Базовый менеджер не фильтрует по ферме — им считаем ожидаемый итог
+        expected_sold = sum(DailySales._base_manager.filter(farm=farm).values_list('quantity', flat=True))
+        self.expect("итоги продаж только своей фермы",
+                   expected_sold > 0 and sum(row['quantity'] for row in by_culture) == expected_sold)
+        names = {row['culture__name'] for row in stats_by_culture}
+        self.expect("недельная статистика без чужих культур", own[other.id].name not in names)
+        self.expect("план производства без чужих культур", own[other.id] not in plan.cultures)
+        self.expect("новая посадка попадает в свою ферму", created.farm_id == farm.id)
+
+        visible = {c.id for c in catalog.get_cultures()}
+        self.expect("каталог: своя и общие культуры без чужих",
+                   own[farm.id].id in visible and own[other.id].id not in visible
+                   and catalog.get_culture(own[other.id].id) is None
+                   and catalog.get_culture_by_name(own[other.id].name) is None)
+
+        # executemany в журнале запросов выглядит как «N times: SQL»
+        statements = [re.sub(r'^\d+ times: ', '', q['sql']) for q in queries.captured_queries]
+        unfiltered = [
+            sql for sql in statements
+            if any(f'"{table}"' in sql for table in TENANT_TABLES)
+            and not sql.lstrip().upper().startswith('INSERT')
+            and not re.search(r'"?farm_id"?\s*(=|IN)', sql)
+        ]
+        self.expect(f"все {len(queries.captured_queries)} SQL-запросов фильтруются по ферме", not unfiltered)
+        for sql in unfiltered:
+            self.stdout.write(f"    {sql[:200]}")
+
+    async def check_async(self, farm, foreign):
+        """Те же вызовы через пул потоков: ферма должна передаваться в поток"""
+        plantings = await repository.get_current_plantings()
+        self.expect("пул потоков: текущие посадки только своей фермы", all(p.farm_id == farm.id for p in plantings))
+        self.expect("пул потоков: чужая посадка не находится", await repository.get_planting(foreign.id) is None)
+
+    def check_web(self, farm_a, farm_b, own):
+        users = get_user_model().objects
+        user_a = users.create_user('farmer_a', password='farmer', is_staff=True)
+        users.create_user('stranger', password='stranger')
+        users.create_superuser('admin', 'admin@example.com', 'admin')
+        FarmMember.objects.create(farm=farm_a, user=user_a, role='admin')
+        farms.invalidate()
+
+        client = Client()
+        current = reverse('plants:current_plantings')
+        stats_page = reverse('plants:stats_report')
+        self.expect("сайт: без входа страница недоступна", client.get(current).status_code == 302)
+        client.login(username='stranger', password='stranger')
+        # Отказ в доступе здесь ожидаем, его предупреждение в журнале не нужно
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            self.expect("сайт: пользователь без фермы получает 403", client.get(current).status_code == 403)
+        finally:
+            request_logger.setLevel(level)
+
+        client.login(username='farmer_a', password='farmer')
+        for name, url in (('посадки', f"{current}?all=1"), ('статистика', f"{stats_page}?weeks=52")):
+            content = client.get(url).content.decode()
+            self.expect(f"сайт: {name} без чужой культуры",
+                       own[farm_a.id].name in content and own[farm_b.id].name not in content)
+        etag_a = client.get(current)['ETag']
+        client.login(username='admin', password='admin')
+        self.expect("сайт: ETag зависит от фермы", client.get(current)['ETag'] != etag_a)
+
+        request = RequestFactory().get('/')
+        request.user = user_a
+        for model in (Planting, Sale, DailySales, WeeklyStats):
+            queryset = admin.site._registry[model].get_queryset(request)
+            self.expect(f"админка: {model._meta.verbose_name_plural} только своей фермы",
+                       not queryset.exclude(farm=farm_a).exists())
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from plants import imports, tenancy
+from plants.models import Farm
+
+
+class Command(BaseCommand):
+    help = 'Импортирует справочник культур или историю посадок фермы из CSV/JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV или JSONL-файл')
+        parser.add_argument('--kind', choices=('cultures', 'plantings'), default='plantings',
+                            help='Что в файле: культуры или посадки')
+        parser.add_argument('--format', choices=imports.FORMATS, help='Формат; по умолчанию по расширению')
+        parser.add_argument('--farm', type=int,
+                            help='ID фермы; культуры без фермы попадают в общий справочник')
+        parser.add_argument('--batch-size', type=int, default=imports.BATCH_SIZE, help='Строк в транзакции')
+        parser.add_argument('--restart', action='store_true',
+                            help='Начать заново, а не продолжать прерванный импорт этого файла')
+        parser.add_argument('--dry-run', action='store_true', help='Только проверить строки')
+
+    def handle(self, *args, **options):
+        if options['farm'] is not None and not Farm.objects.filter(pk=options['farm']).exists():
+            raise CommandError(f"Ферма {options['farm']} не найдена")
+        try:
+            fmt = options['format'] or imports.detect_format(options['path'])
+            with open(options['path'], 'rb') as f, tenancy.scope(options['farm']):
+                run = imports.run_import(
+                    f, options['kind'], fmt, options['path'],
+                    restart=options['restart'], dry_run=options['dry_run'],
+                    batch_size=options['batch_size'], progress=self.progress,
+                )
+        except (OSError, imports.ImportFileError) as e:
+            raise CommandError(str(e))
+
+        for error in run.errors:
+            self.stdout.write(f"⚠️ {error}")
+        if run.skipped > len(run.errors):
+            self.stdout.write(f"… и еще ошибок: {run.skipped - len(run.errors)}")
+        verb = "Проверено" if options['dry_run'] else "Импортировано"
+        self.stdout.write(
+            f"{verb}: строк {run.rows}, создано {run.created}, обновлено {run.updated}, пропущено {run.skipped}"
+        )
+
+    def progress(self, run, rows_per_sec):
+        self.stdout.write(f"  {run.rows} строк, {rows_per_sec:.0f} строк/с")
@@ -0,0 +1,73 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from plants import catalog, planner, tenancy
+
+
+class Command(BaseCommand):
+    help = 'Строит план посевов, загрузки стеллажей и расхода семян по недельному спросу'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=planner.DEFAULT_HORIZON, help='Горизонт планирования')
+        parser.add_argument('--cadence', type=int, default=planner.DEFAULT_CADENCE, help='Сбор раз в N дней')
+        parser.add_argument('--demand', action='append', default=[], metavar='КУЛЬТУРА=ЛОТКОВ',
+                            help='Спрос в лотках в неделю; без него берутся средние продажи')
+        parser.add_argument('--sales-days', type=int, default=28, help='За сколько дней усреднять продажи')
+        parser.add_argument('--output', help='CSV-файл с планом по дням и культурам')
+        parser.add_argument('--farm', type=int, help='ID фермы; без него план строится по всем фермам')
+
+    def handle(self, *args, **options):
+        with tenancy.scope(options['farm']):
+            self.plan(options)
+
+    def plan(self, options):
+        if options['days'] <= 0 or options['cadence'] <= 0:
+            raise CommandError("Горизонт и период сбора должны быть больше 0")
+
+        demand = {}
+        for item in options['demand']:
+            ref, _, weekly = item.rpartition('=')
+            culture = catalog.get_culture(int(ref)) if ref.isdigit() else catalog.get_culture_by_name(ref)
+            if culture is None:
+                raise CommandError(f"Культура «{ref}» не найдена")
+            try:
+                demand[culture] = float(weekly)
+            except ValueError:
+                raise CommandError(f"Неверный спрос: {item}")
+        if not demand:
+            demand = {
+                catalog.get_culture(culture_id): weekly
+                for culture_id, weekly in planner.demand_from_sales(options['sales_days']).items()
+            }
+            demand.pop(None, None)
+        if not demand:
+            raise CommandError("Нет продаж за период, задайте спрос через --demand")
+
+        plan = planner.plan_for(demand, options['days'], options['cadence'])
+
+        self.stdout.write(f"{'Дата':<12}{'Посев':>8}{'Семян, г':>10}{'Прорастание':>13}{'Свет':>7}{'Сбор':>7}")
+        sow = plan.sow.sum(axis=1)
+        grams = plan.seed_grams.sum(axis=1)
+        germination = plan.germination.sum(axis=1)
+        light = plan.light.sum(axis=1)
+        harvest = plan.harvest.sum(axis=1)
+        for i in range(plan.horizon):
+            self.stdout.write(
+                f"{plan.day(i).isoformat():<12}{sow[i]:>8}{grams[i]:>10}"
+                f"{germination[i]:>13}{light[i]:>7}{harvest[i]:>7}"
+            )
+        peak_day, peak_trays = plan.peak()
+        self.stdout.write(f"Пик загрузки: {peak_trays} лотков {peak_day}, семян всего {int(grams.sum())} г")
+
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['date', 'culture', 'sow', 'seed_grams', 'germination', 'light', 'harvest'])
+                for i in range(plan.horizon):
+                    for c, culture in enumerate(plan.cultures):
+                        writer.writerow([
+                            plan.day(i).isoformat(), culture.name, plan.sow[i, c], plan.seed_grams[i, c],
+                            plan.germination[i, c], plan.light[i, c], plan.harvest[i, c],
+                        ])
+            self.stdout.write(f"План записан в {options['output']}")
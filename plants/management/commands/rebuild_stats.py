@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from plants import stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает недельную статистику с нуля (один раз после обновления)'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rows = stats.rebuild()
+        self.stdout.write(f"Недельная статистика пересчитана: {rows} строк")
@@ -0,0 +1,48 @@
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Отправляет записанные обновления Telegram (JSON или JSONL) на локальный webhook'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с обновлением (JSON) или обновлениями (JSONL)')
+        parser.add_argument('--url', default='http://127.0.0.1:8000/telegram/webhook/', help='Адрес webhook')
+        parser.add_argument('--secret', default=os.getenv('WEBHOOK_SECRET'), help='Секретный токен webhook')
+
+    def handle(self, *args, **options):
+        if not options['secret']:
+            raise CommandError("Укажите --secret или WEBHOOK_SECRET")
+
+        with open(options['path'], encoding='utf-8') as f:
+            content = f.read().strip()
+        if content.startswith('['):
+            updates = json.loads(content)
+        elif '\n' in content:
+            updates = [json.loads(line) for line in content.splitlines() if line.strip()]
+        else:
+            updates = [json.loads(content)]
+
+        for update in updates:
+            request = urllib.request.Request(
+                options['url'],
+                data=json.dumps(update).encode('utf-8'),
+                headers={
+                    'Content-Type': 'application/json',
+                    'X-Telegram-Bot-Api-Secret-Token': options['secret'],
+                },
+                method='POST',
+            )
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request) as response:
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stdout.write(f"update_id={update.get('update_id')}: HTTP {status} за {elapsed:.1f} мс")
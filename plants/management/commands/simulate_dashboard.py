@@ -0,0 +1,117 @@
+import asyncio
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from telegram import Update
+
+from plants import catalog, repository
+from plants.benchmarks import benchmark_database, seed_cultures, seed_farm, seed_plantings
+from plants.models import FarmMember, Planting
+from telegram_dashboard import render
+from telegram_stub import StubRequest, build_stub_application, message_update
+
+# Чат фермы, где идут продажи, и чат другой фермы со своей сводкой
+CHAT_ID = 1
+OTHER_CHAT_ID = 2
+
+
+class Command(BaseCommand):
+    help = 'Проверяет закрепленную сводку: серия продаж дает одну правку, без изменений правок нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sales', type=int, default=10, help='Продаж в серии')
+        parser.add_argument('--delay', type=float, default=0.3, help='Пауза перед правкой сводки, с')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp, benchmark_database(os.path.join(tmp, 'bench.sqlite3')):
+            cultures = seed_cultures()
+            farm, other = seed_farm(), seed_farm("Другая ферма")
+            seed_plantings(500, cultures, history_days=30, farm=farm)
+            seed_plantings(100, cultures, history_days=30, farm=other)
+            FarmMember.objects.create(farm=farm, chat_id=CHAT_ID, role='admin')
+            FarmMember.objects.create(farm=other, chat_id=OTHER_CHAT_ID, role='admin')
+            today = timezone.now().date()
+            planting_id = (
+                Planting.objects.filter(farm=farm, sale_deadline__gt=today, quantity__gte=options['sales'])
+                .values_list('id', flat=True).first()
+            )
+            if planting_id is None:
+                raise CommandError("Нет посадки для серии продаж")
+            catalog.invalidate()
+            try:
+                asyncio.run(self.simulate(options, farm.id, planting_id))
+            finally:
+                repository.shutdown()
+
+    async def simulate(self, options, farm_id, planting_id):
+        request = StubRequest()
+        application = build_stub_application(request)
+        import telegram_bot
+        dashboard = telegram_bot.dashboard
+        dashboard.delay = options['delay']
+        await application.initialize()
+        await application.start()
+        update_ids = iter(range(1, 10 ** 9))
+
+        async def send(chat_id, text):
+            # Как в Application: у каждого обновления своя задача и свой контекст
+            update = Update.de_json(message_update(next(update_ids), chat_id, text), application.bot)
+            await asyncio.create_task(application.process_update(update))
+
+        def calls(endpoint, chat_id=None):
+            return [
+                params for name, params in request.calls
+                if name == endpoint and chat_id in (None, params.get('chat_id'))
+            ]
+
+        async def settle():
+            await asyncio.sleep(options['delay'] * 2 + 0.2)
+
+        try:
+            await send(CHAT_ID, '/dashboard')
+            await send(OTHER_CHAT_ID, '/dashboard')
+            if len(calls('pinChatMessage')) != 2:
+                raise CommandError("Сводки не закреплены")
+
+            # Серия продаж: правка одна, и в ней итог после всех продаж
+            started = time.perf_counter()
+            await asyncio.gather(*(send(CHAT_ID, f"/sell {planting_id} 1") for _ in range(options['sales'])))
+            sold = time.perf_counter()
+            while not calls('editMessageText') and time.perf_counter() - sold < options['delay'] * 5 + 1:
+                await asyncio.sleep(0.01)
+            edited = time.perf_counter()
+            await settle()
+            edits = calls('editMessageText', CHAT_ID)
+            if len(edits) != 1:
+                raise CommandError(f"За {options['sales']} продаж правок сводки: {len(edits)}, ожидалась одна")
+            if calls('editMessageText', OTHER_CHAT_ID):
+                raise CommandError("Правка ушла в сводку другой фермы")
+            expected = render(await repository.dashboard_summary(farm_id), timezone.localdate())
+            if edits[0]['text'] != expected:
+                raise CommandError("В сводке не итог после всех продаж")
+            self.stdout.write(
+                f"Продаж: {options['sales']} за {(sold - started) * 1000:.0f} мс, правок: {len(edits)}, "
+                f"правка через {(edited - sold) * 1000:.0f} мс после последней продажи"
+            )
+
+            # Проверка без изменений (смена часа, пересчет статусов) правок не дает
+            dashboard.refresh_all()
+            await settle()
+            if len(calls('editMessageText')) != 1:
+                raise CommandError("Сводка с тем же текстом была изменена")
+            self.stdout.write(f"Проверок без изменений: {dashboard.skipped}, правок: 0")
+
+            # Выключенная сводка открепляется и больше не правится
+            await send(CHAT_ID, '/dashboard')
+            await send(CHAT_ID, f"/sell {planting_id} 1")
+            await settle()
+            if len(calls('editMessageText')) != 1 or not calls('unpinChatMessage', CHAT_ID):
+                raise CommandError("Выключенная сводка продолжает обновляться")
+        finally:
+            await application.stop()
+            await application.shutdown()
+
+        self.stdout.write("✅ Серия продаж дает одну правку, неизменная сводка не правится")
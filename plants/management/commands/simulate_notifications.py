@@ -0,0 +1,163 @@
+import asyncio
+import random
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from telegram_notifications import EVENT_TITLES, HarvestNotifier
+
+
+FARMS = 3
+
+
+class FakeJob:
+    def __init__(self, queue, callback, when):
+        self.queue = queue
+        self.callback = callback
+        self.when = when
+        self.removed = False
+
+    def schedule_removal(self):
+        self.removed = True
+
+
+class FakeJobQueue:
+    """Заглушка JobQueue с ручным продвижением виртуального времени"""
+
+    def __init__(self, now):
+        self.now = now
+        self.jobs = []
+        self.scheduled = 0
+
+    def __call__(self):
+        return self.now
+
+    def run_once(self, callback, when):
+        job = FakeJob(self, callback, when)
+        self.jobs.append(job)
+        self.scheduled += 1
+        return job
+
+    def active(self):
+        self.jobs = [job for job in self.jobs if not job.removed]
+        return self.jobs
+
+    async def advance(self, until):
+        """Продвигает время, выполняя задания по порядку"""
+        while True:
+            jobs = sorted((job for job in self.active() if job.when <= until), key=lambda job: job.when)
+            if not jobs:
+                break
+            job = jobs[0]
+            job.removed = True
+            self.now = job.when
+            await job.callback(None)
+        self.now = until
+
+
+def fake_planting(planting_id, today, rng):
+    grow_days = rng.randint(7, 14)
+    plant_date = today - timedelta(days=rng.randint(0, 10))
+    harvest_date = plant_date + timedelta(days=grow_days)
+    return SimpleNamespace(
+        id=planting_id,
+        farm_id=planting_id % FARMS,
+        quantity=rng.randint(1, 30),
+        harvest_date=harvest_date,
+        sale_deadline=harvest_date + timedelta(days=rng.randint(3, 7)),
+        culture=SimpleNamespace(name=f"Культура {planting_id % 7}"),
+    )
+
+
+class Command(BaseCommand):
+    help = 'Проверяет очередь уведомлений о сроках на виртуальных часах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plantings', type=int, default=1000)
+        parser.add_argument('--days', type=int, default=30)
+        parser.add_argument('--chats', type=int, default=3)
+
+    def handle(self, *args, **options):
+        asyncio.run(self.simulate(options))
+
+    async def simulate(self, options):
+        rng = random.Random(7)
+        start = timezone.now()
+        queue = FakeJobQueue(start)
+        sent = []
+
+        async def send(chat_id, text):
+            sent.append((queue.now, chat_id, text))
+
+        # У каждой фермы свои чаты; сводка не должна уходить в чужую ферму
+        farm_chats = {
+            farm_id: [farm_id * 1000 + i for i in range(options['chats'])]
+            for farm_id in range(FARMS)
+        }
+
+        async def get_chats():
+            return farm_chats
+
+        notifier = HarvestNotifier(queue, send, get_chats, clock=queue)
+        expected = set()
+
+        def add(planting):
+            for kind, day in (('harvest', planting.harvest_date), ('deadline', planting.sale_deadline)):
+                if notifier.event_time(day) > queue.now:
+                    expected.add((planting.id, kind))
+
+        plantings = [fake_planting(i, timezone.localdate(start), rng) for i in range(1, options['plantings'] + 1)]
+        notifier.load(plantings)
+        for planting in plantings:
+            add(planting)
+
+        # Удаленные посадки не должны давать уведомлений
+        for planting in rng.sample(plantings, len(plantings) // 10):
+            notifier.forget(planting.id)
+            expected -= {(planting.id, 'harvest'), (planting.id, 'deadline')}
+
+        next_id = len(plantings) + 1
+        for day in range(1, options['days'] + 1):
+            await queue.advance(start + timedelta(days=day, hours=1))
+            # Новые посадки добавляются по ходу симуляции
+            for _ in range(5):
+                planting = fake_planting(next_id, timezone.localdate(queue.now), rng)
+                next_id += 1
+                notifier.track(planting)
+                add(planting)
+            if len(queue.active()) > 1:
+                raise CommandError("В очереди больше одного задания")
+        await queue.advance(start + timedelta(days=options['days'] + 30))
+
+        wake_ups = {at for at, _, _ in sent}
+        self.stdout.write(
+            f"Пробуждений: {len(wake_ups)}, сообщений: {len(sent)}, "
+            f"заданий поставлено: {queue.scheduled}, ожидалось событий: {len(expected)}"
+        )
+        if len(sent) != len({(at, chat_id) for at, chat_id, _ in sent}):
+            raise CommandError("Ожидалась одна сводка на чат за пробуждение")
+
+        titles = {title: kind for kind, title in EVENT_TITLES.items()}
+        delivered = set()
+        foreign = 0
+        for _, chat_id, text in sent:
+            farm_id, index = divmod(chat_id, 1000)
+            kind = None
+            for line in text.splitlines():
+                if line in titles:
+                    kind = titles[line]
+                elif line.startswith("▫️ ID "):
+                    planting_id = int(line.split()[2].rstrip(':'))
+                    foreign += planting_id % FARMS != farm_id
+                    if index == 0:
+                        delivered.add((planting_id, kind))
+
+        if foreign:
+            raise CommandError(f"В чаты чужих ферм ушло событий: {foreign}")
+        if delivered != expected:
+            raise CommandError(
+                f"Расхождение событий: лишних {len(delivered - expected)}, пропущено {len(expected - delivered)}"
+            )
+        self.stdout.write(f"✅ Доставлены все {len(delivered)} событий только своим фермам, по удаленным посадкам уведомлений нет")
@@ -0,0 +1,124 @@
+import asyncio
+import heapq
+import itertools
+import random
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from telegram.error import RetryAfter
+
+from telegram_outbox import OutboundScheduler
+
+
+class FakeBot:
+    """Заглушка Bot API: записывает вызовы и иногда отвечает 429"""
+
+    def __init__(self, clock, flood_probability, retry_after):
+        self.clock = clock
+        self.flood_probability = flood_probability
+        self.retry_after = retry_after
+        self.rng = random.Random(42)
+        self.calls = []
+        self.floods = 0
+
+    def endpoint(self, name, data):
+        async def callback():
+            if self.rng.random() < self.flood_probability:
+                self.floods += 1
+                raise RetryAfter(self.retry_after)
+            self.calls.append((self.clock(), name, data))
+            return {'ok': True, 'text': data.get('text')}
+        return callback
+
+
+class FakeClock:
+    """Виртуальное время: ожидания срабатывают мгновенно в порядке времени пробуждения"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.waiters = []
+        self.counter = itertools.count()
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (self.now + seconds, next(self.counter), future))
+        await future
+
+    async def run(self, done):
+        """Продвигает время, пока не завершатся все задачи"""
+        while not done.done():
+            for _ in range(10):
+                await asyncio.sleep(0)
+            if self.waiters:
+                self.now, _, future = heapq.heappop(self.waiters)
+                future.set_result(None)
+
+
+class Command(BaseCommand):
+    help = 'Прогоняет планировщик исходящих сообщений против заглушки Bot API с ответами 429'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chats', type=int, default=50)
+        parser.add_argument('--messages', type=int, default=10, help='Сообщений на чат')
+        parser.add_argument('--edits', type=int, default=20, help='Подряд идущих правок одного сообщения')
+        parser.add_argument('--flood-probability', type=float, default=0.05)
+        parser.add_argument('--retry-after', type=int, default=2)
+
+    def handle(self, *args, **options):
+        asyncio.run(self.simulate(options))
+
+    async def simulate(self, options):
+        clock = FakeClock()
+        bot = FakeBot(clock, options['flood_probability'], options['retry_after'])
+        scheduler = OutboundScheduler(clock=clock, sleep=clock.sleep)
+
+        async def send(name, data):
+            return await scheduler.process_request(bot.endpoint(name, data), (), {}, name, data, None)
+
+        requests = [
+            send('sendMessage', {'chat_id': chat_id, 'text': f"{chat_id}:{n}"})
+            for chat_id in range(1, options['chats'] + 1)
+            for n in range(options['messages'])
+        ]
+        requests += [
+            send('editMessageText', {'chat_id': 1, 'message_id': 1, 'text': f"правка {n}"})
+            for n in range(options['edits'])
+        ]
+        done = asyncio.ensure_future(asyncio.gather(*requests, return_exceptions=True))
+        await clock.run(done)
+        results = done.result()
+        failed = sum(1 for r in results if isinstance(r, Exception))
+
+        stats = scheduler.stats()
+        self.stdout.write(
+            f"Отправлено {stats['sent']}, склеено правок {stats['coalesced']}, 429: {bot.floods}, "
+            f"повторов {stats['retries']}, не доставлено {failed}, макс. очередь {stats['max_depth']}, "
+            f"p50 {stats['latency_p50']:.2f} с, p95 {stats['latency_p95']:.2f} с (виртуальное время)"
+        )
+
+        # Проверка лимитов по записанным вызовам: в любом окне не больше burst + rate * длина окна
+        per_chat = defaultdict(list)
+        for at, name, data in bot.calls:
+            per_chat[data['chat_id']].append(at)
+        self.check_rate('глобальный', [at for at, _, _ in bot.calls], scheduler.global_bucket.rate, scheduler.burst)
+        for chat_id, times in per_chat.items():
+            self.check_rate(f"чат {chat_id}", times, scheduler.private_rate, scheduler.burst)
+
+        last_edit = f"правка {options['edits'] - 1}"
+        edits = [data['text'] for _, name, data in bot.calls if name == 'editMessageText']
+        if isinstance(results[-1], Exception):
+            self.stdout.write("Последняя правка не доставлена после всех повторов")
+        elif not edits or edits[-1] != last_edit or results[-1]['text'] != last_edit:
+            raise CommandError("Последняя правка сообщения потеряна")
+        self.stdout.write(f"✅ Лимиты соблюдены, правок отправлено {len(edits)} из {options['edits']}")
+
+    @staticmethod
+    def check_rate(name, times, rate, burst):
+        times = sorted(times)
+        for i in range(len(times)):
+            for j in range(i + 1, len(times)):
+                if j - i + 1 > burst + rate * (times[j] - times[i]) + 1e-6:
+                    raise CommandError(f"Превышен лимит ({name}) в момент {times[j]:.2f} с")
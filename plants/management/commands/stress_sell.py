@@ -0,0 +1,69 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+
+from plants.benchmarks import benchmark_database, seed_cultures, seed_farm, timer
+from plants.models import DailySales, Planting, Sale
+from plants.stock import sell_stock
+
+
+class Command(BaseCommand):
+    help = 'Проверяет, что параллельные продажи из одного лотка не уводят остаток в минус'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=16, help='Количество параллельных потоков')
+        parser.add_argument('--sells', type=int, default=500, help='Количество попыток продажи')
+        parser.add_argument('--stock', type=int, default=1000, help='Начальный остаток в лотке')
+        parser.add_argument('--amount', type=int, default=7, help='Количество в одной продаже')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("Стресс-тест рассчитан на SQLite")
+
+        amount = options['amount']
+        stock = options['stock']
+
+        # Потокам нужна общая файловая БД: in-memory база у каждого соединения своя
+        with tempfile.TemporaryDirectory() as tmp, benchmark_database(os.path.join(tmp, 'stress.sqlite3')):
+            culture = seed_cultures(1)[0]
+            planting = Planting.objects.create(
+                farm=seed_farm(),
+                culture=culture,
+                quantity=stock,
+                plant_date=timezone.now().date(),
+            )
+
+            def sell(_):
+                try:
+                    return sell_stock(planting.id, amount)
+                finally:
+                    connection.close()
+
+            with timer() as elapsed:
+                with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                    results = list(pool.map(sell, range(options['sells'])))
+
+            sold = sum(1 for r in results if r is not None) * amount
+            remaining = Planting.objects.filter(pk=planting.id).values_list('quantity', flat=True).first()
+            remaining = remaining if remaining is not None else 0
+            negatives = [r for r in results if r is not None and r < 0]
+            ledger = Sale.objects.aggregate(total=Sum('quantity'))['total'] or 0
+            rollup = DailySales.objects.aggregate(total=Sum('quantity'))['total'] or 0
+
+        self.stdout.write(
+            f"Продаж: {sold // amount} из {options['sells']}, продано {sold} шт., "
+            f"остаток {remaining}, за {elapsed['ms']:.0f} мс"
+        )
+
+        if negatives or remaining < 0:
+            raise CommandError("Остаток ушел в минус")
+        if sold + remaining != stock:
+            raise CommandError(f"Расхождение остатков: продано {sold}, осталось {remaining}, было {stock}")
+        if ledger != sold or rollup != sold:
+            raise CommandError(f"Журнал продаж ({ledger}) или дневная сводка ({rollup}) не сходятся с проданным ({sold})")
+        self.stdout.write("✅ Остаток, журнал продаж и дневная сводка согласованы")
@@ -0,0 +1,254 @@
+"""Метрики бота в текстовом формате Prometheus.
+
+Счетчики и гистограммы живут в памяти процесса. Обработка обновления
+оборачивается в track_update(): запросы ORM из любого потока пула
+(контекст передается через repository.run_db) засчитываются этому
+обновлению, а медленные обновления при BOT_SLOW_UPDATE_MS > 0
+печатаются с разбивкой по обработчикам и запросам.
+"""
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# Порог журнала медленных обновлений (мс); 0 — журнал выключен
+SLOW_UPDATE_MS = float(os.getenv('BOT_SLOW_UPDATE_MS', '0'))
+
+# Бот в режиме polling работает отдельным процессом и выгружает метрики в этот файл,
+# а страница /metrics сайта отдает их вместе со своими
+METRICS_FILE = os.getenv('METRICS_FILE')
+
+# Границы корзин гистограмм задержек, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_lock = threading.Lock()
+_metrics = []
+_collectors = []
+
+_update = contextvars.ContextVar('metrics_update', default=None)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+
+class Counter:
+    """Растущий счетчик с метками"""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.values = {}
+        _metrics.append(self)
+
+    def key(self, labels):
+        return tuple((name, labels[name]) for name in self.label_names)
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in self.values.items():
+            yield self.name, key, value
+
+
+class Histogram(Counter):
+    """Гистограмма с накопительными корзинами, суммой и количеством"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with _lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        for key, (counts, total, count) in self.values.items():
+            for bound, bucket_count in zip(self.buckets, counts):
+                yield f'{self.name}_bucket', key + (('le', repr(float(bound))),), bucket_count
+            yield f'{self.name}_bucket', key + (('le', '+Inf'),), count
+            yield f'{self.name}_sum', key, total
+            yield f'{self.name}_count', key, count
+
+
+HANDLER_SECONDS = Histogram('bot_handler_duration_seconds', 'Время работы обработчика бота', ['handler'])
+HANDLER_ERRORS = Counter('bot_handler_errors_total', 'Исключения в обработчиках бота', ['handler', 'error'])
+UPDATE_SECONDS = Histogram('bot_update_duration_seconds', 'Полное время обработки обновления')
+UPDATE_QUERIES = Histogram('bot_update_db_queries', 'Запросов к базе на одно обновление', buckets=QUERY_BUCKETS)
+UPDATE_DB_SECONDS = Histogram('bot_update_db_seconds', 'Время запросов к базе на одно обновление')
+DB_CALL_SECONDS = Histogram('bot_db_call_duration_seconds', 'Вызовы слоя данных вместе с ожиданием пула', ['call'])
+DB_CALL_ERRORS = Counter('bot_db_call_errors_total', 'Исключения в вызовах слоя данных', ['call', 'error'])
+TELEGRAM_SECONDS = Histogram('bot_telegram_request_duration_seconds', 'Запросы к Bot API', ['endpoint'])
+TELEGRAM_ERRORS = Counter('bot_telegram_request_errors_total', 'Ошибки запросов к Bot API', ['endpoint', 'error'])
+OUTBOX_WAIT_SECONDS = Histogram('bot_outbox_wait_seconds', 'Ожидание запроса в очереди исходящих до отправки')
+OUTBOX_RETRY_AFTER = Counter('bot_outbox_retry_after_total', 'Ответы 429 с паузой отправки')
+OUTBOX_PAUSE_SECONDS = Counter('bot_outbox_retry_after_seconds_total', 'Суммарная пауза по retry_after, секунды')
+OUTBOX_COALESCED = Counter('bot_outbox_coalesced_total', 'Правки сообщений, вытесненные более новой правкой')
+
+
+def register_collector(collect):
+    """Добавляет функцию, которая при выдаче метрик возвращает
+    (имя, описание, тип, [(метки, значение), ...]) — для значений, считаемых на лету"""
+    _collectors.append(collect)
+
+
+def render():
+    """Все метрики процесса в текстовом формате Prometheus"""
+    lines = []
+    with _lock:
+        families = [
+            (metric.name, metric.documentation, metric.kind, list(metric.samples()))
+            for metric in _metrics if metric.values
+        ]
+    for collect in _collectors:
+        name, documentation, kind, values = collect()
+        families.append((name, documentation, kind, [(name, tuple(labels.items()), value) for labels, value in values]))
+
+    for name, documentation, kind, samples in families:
+        lines.append(f'# HELP {name} {documentation}')
+        lines.append(f'# TYPE {name} {kind}')
+        for sample_name, labels, value in samples:
+            lines.append(f'{sample_name}{format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def export(path=METRICS_FILE):
+    """Записывает метрики процесса в файл целиком, без промежуточного состояния"""
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(render())
+    os.replace(tmp, path)
+
+
+def exported(path=METRICS_FILE):
+    """Метрики, выгруженные другим процессом, или пустая строка"""
+    if not path:
+        return ''
+    try:
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return ''
+
+
+def reset():
+    """Обнуляет накопленные значения (для замеров)"""
+    with _lock:
+        for metric in _metrics:
+            metric.values.clear()
+
+
+# Обновления бота
+
+def count_query(execute, sql, params, many, context):
+    current = _update.get()
+    if current is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        current['queries'] += 1
+        current['db_seconds'] += time.perf_counter() - started
+
+
+def watch_connection(sender, connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+def install_query_counter():
+    """Считает запросы ORM текущего обновления на всех соединениях, в том числе будущих"""
+    connection_created.connect(watch_connection, dispatch_uid='metrics_query_counter')
+    for connection in connections.all(initialized_only=True):
+        watch_connection(None, connection)
+
+
+@contextmanager
+def track_update(update_id=None):
+    """Блок обработки одного обновления"""
+    current = {'queries': 0, 'db_seconds': 0.0, 'handlers': []}
+    token = _update.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    finally:
+        _update.reset(token)
+        elapsed = time.perf_counter() - started
+        UPDATE_SECONDS.observe(elapsed)
+        UPDATE_QUERIES.observe(current['queries'])
+        UPDATE_DB_SECONDS.observe(current['db_seconds'])
+        if SLOW_UPDATE_MS and elapsed * 1000 >= SLOW_UPDATE_MS:
+            handlers = ', '.join(f"{name} {seconds * 1000:.0f} мс" for name, seconds in current['handlers'])
+            print(
+                f"Slow update {update_id}: {elapsed * 1000:.0f} мс; обработчики: {handlers or '-'}; "
+                f"запросов к базе {current['queries']} за {current['db_seconds'] * 1000:.0f} мс"
+            )
+
+
+@contextmanager
+def track_handler(name):
+    """Время и исключения одного обработчика"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        HANDLER_ERRORS.inc(handler=name, error=type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        HANDLER_SECONDS.observe(elapsed, handler=name)
+        current = _update.get()
+        if current is not None:
+            current['handlers'].append((name, elapsed))
+
+
+@contextmanager
+def track_db_call(name):
+    """Время вызова слоя данных, включая ожидание свободного потока"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        DB_CALL_ERRORS.inc(call=name, error=type(e).__name__)
+        raise
+    finally:
+        DB_CALL_SECONDS.observe(time.perf_counter() - started, call=name)
+
+
+@contextmanager
+def track_telegram(endpoint):
+    """Время и ошибки одного запроса к Bot API"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        TELEGRAM_ERRORS.inc(endpoint=endpoint, error=type(e).__name__)
+        raise
+    finally:
+        TELEGRAM_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
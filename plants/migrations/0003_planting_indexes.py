@@ -0,0 +1,25 @@
+# Generated by Django 4.2.10 on 2026-10-18 11:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plants', '0002_remove_planting_expire_date_planting_sale_deadline'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='planting',
+            index=models.Index(fields=['harvest_date', 'status'], name='planting_harvest_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='planting',
+            index=models.Index(fields=['sale_deadline', 'status'], name='planting_deadline_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='planting',
+            index=models.Index(fields=['status', 'culture'], name='planting_status_culture_idx'),
+        ),
+    ]
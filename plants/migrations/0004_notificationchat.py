@@ -0,0 +1,25 @@
+# Generated by Django 4.2.10 on 2026-10-18 11:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plants', '0003_planting_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationChat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chat_id', models.BigIntegerField(unique=True, verbose_name='ID чата')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Подписан')),
+            ],
+            options={
+                'verbose_name': 'Чат для уведомлений',
+                'verbose_name_plural': 'Чаты для уведомлений',
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.10 on 2026-10-18 11:23
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+TRACKED_TABLES = ['plants_planting', 'plants_culture']
+
+
+def create_triggers(apps, schema_editor):
+    """Триггеры увеличивают версию таблицы при любой записи, в том числе из других процессов"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    DataVersion = apps.get_model('plants', 'DataVersion')
+    for table in TRACKED_TABLES:
+        DataVersion.objects.get_or_create(name=table)
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            schema_editor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()} "
+                f"AFTER {event} ON {table} FOR EACH ROW BEGIN "
+                f"UPDATE plants_dataversion SET version = version + 1, "
+                f"changed_at = strftime('%Y-%m-%d %H:%M:%f', 'now') "
+                f"WHERE name = '{table}'; END"
+            )
+
+
+def drop_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in TRACKED_TABLES:
+        for event in ('insert', 'update', 'delete'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_version_{event}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plants', '0004_notificationchat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Таблица')),
+                ('version', models.BigIntegerField(default=0, verbose_name='Версия')),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Изменено')),
+            ],
+        ),
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.10 on 2026-10-18 11:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plants', '0005_dataversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planting',
+            name='archived',
+            field=models.BooleanField(default=False, verbose_name='В архиве'),
+        ),
+        migrations.AddIndex(
+            model_name='planting',
+            index=models.Index(fields=['plant_date'], name='planting_plant_date_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.10 on 2026-10-18 11:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plants', '0006_planting_archived'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sale',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(verbose_name='Количество')),
+                ('sold_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время продажи')),
+                ('culture', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='plants.culture', verbose_name='Культура')),
+                ('planting', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='plants.planting', verbose_name='Посадка')),
+            ],
+            options={
+                'verbose_name': 'Продажа',
+                'verbose_name_plural': 'Продажи',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('quantity', models.IntegerField(default=0, verbose_name='Продано')),
+                ('sales', models.IntegerField(default=0, verbose_name='Продаж')),
+                ('culture', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='plants.culture', verbose_name='Культура')),
+            ],
+            options={
+                'verbose_name': 'Продажи за день',
+                'verbose_name_plural': 'Продажи по дням',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailysales',
+            constraint=models.UniqueConstraint(fields=('date', 'culture'), name='dailysales_date_culture_uniq'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.10 on 2026-10-18 11:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plants', '0007_sale_dailysales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeeklyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week', models.DateField(verbose_name='Неделя (понедельник)')),
+                ('planted', models.IntegerField(default=0, verbose_name='Посажено')),
+                ('harvested', models.IntegerField(default=0, verbose_name='Созрело')),
+                ('sold', models.IntegerField(default=0, verbose_name='Продано')),
+                ('expired', models.IntegerField(default=0, verbose_name='Просрочено')),
+                ('culture', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='plants.culture', verbose_name='Культура')),
+            ],
+            options={
+                'verbose_name': 'Итоги недели',
+                'verbose_name_plural': 'Итоги по неделям',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='weeklystats',
+            constraint=models.UniqueConstraint(fields=('week', 'culture'), name='weeklystats_week_culture_uniq'),
+        ),
+    ]
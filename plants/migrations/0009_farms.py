@@ -0,0 +1,154 @@
+# Generated by Django 4.2.10 on 2026-10-18 11:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import plants.models
+
+
+def assign_default_farm(apps, schema_editor):
+    """Переносит существующие данные в одну ферму.
+
+    Ее админами становятся подписанные на уведомления чаты и чаты из
+    settings.DEFAULT_FARM_CHAT_IDS; если таких нет, ферму займет первый
+    написавший боту чат (farms.membership).
+    """
+    Farm = apps.get_model('plants', 'Farm')
+    FarmMember = apps.get_model('plants', 'FarmMember')
+    NotificationChat = apps.get_model('plants', 'NotificationChat')
+    models_with_farm = [apps.get_model('plants', name) for name in ('Planting', 'Sale', 'DailySales', 'WeeklyStats')]
+
+    chat_ids = list(NotificationChat.objects.values_list('chat_id', flat=True))
+    chat_ids += [chat_id for chat_id in getattr(settings, 'DEFAULT_FARM_CHAT_IDS', []) if chat_id not in chat_ids]
+    if not chat_ids and not any(model.objects.exists() for model in models_with_farm):
+        return
+
+    farm = Farm.objects.create(name="Основная ферма", invite_code=plants.models.new_invite_code())
+    for model in models_with_farm:
+        model.objects.update(farm=farm)
+    FarmMember.objects.bulk_create([FarmMember(farm=farm, chat_id=chat_id, role='admin') for chat_id in chat_ids])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('plants', '0008_weeklystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Farm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Название')),
+                ('invite_code', models.CharField(default=plants.models.new_invite_code, max_length=20, unique=True, verbose_name='Код приглашения')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+            ],
+            options={
+                'verbose_name': 'Ферма',
+                'verbose_name_plural': 'Фермы',
+            },
+        ),
+        migrations.CreateModel(
+            name='FarmMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chat_id', models.BigIntegerField(blank=True, null=True, unique=True, verbose_name='ID чата')),
+                ('role', models.CharField(choices=[('admin', 'Админ'), ('manager', 'Менеджер'), ('worker', 'Работник')], default='worker', max_length=10, verbose_name='Роль')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Добавлен')),
+            ],
+            options={
+                'verbose_name': 'Участник фермы',
+                'verbose_name_plural': 'Участники ферм',
+            },
+        ),
+        migrations.AddField(
+            model_name='farmmember',
+            name='farm',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='members', to='plants.farm', verbose_name='Ферма'),
+        ),
+        migrations.AddField(
+            model_name='farmmember',
+            name='user',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AddConstraint(
+            model_name='farmmember',
+            constraint=models.CheckConstraint(check=models.Q(('chat_id__isnull', False), ('user__isnull', False), _connector='OR'), name='farmmember_chat_or_user'),
+        ),
+        migrations.AddField(
+            model_name='culture',
+            name='farm',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='plants.farm', verbose_name='Ферма'),
+        ),
+        migrations.AddField(
+            model_name='planting',
+            name='farm',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='plants.farm', verbose_name='Ферма'),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='farm',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='plants.farm', verbose_name='Ферма'),
+        ),
+        migrations.AddField(
+            model_name='dailysales',
+            name='farm',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='plants.farm', verbose_name='Ферма'),
+        ),
+        migrations.AddField(
+            model_name='weeklystats',
+            name='farm',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='plants.farm', verbose_name='Ферма'),
+        ),
+        migrations.RunPython(assign_default_farm, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='planting',
+            name='farm',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='plants.farm', verbose_name='Ферма'),
+        ),
+        migrations.AlterField(
+            model_name='sale',
+            name='farm',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='plants.farm', verbose_name='Ферма'),
+        ),
+        migrations.AlterField(
+            model_name='dailysales',
+            name='farm',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='plants.farm', verbose_name='Ферма'),
+        ),
+        migrations.AlterField(
+            model_name='weeklystats',
+            name='farm',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='plants.farm', verbose_name='Ферма'),
+        ),
+        migrations.RemoveConstraint(
+            model_name='dailysales',
+            name='dailysales_date_culture_uniq',
+        ),
+        migrations.RemoveConstraint(
+            model_name='weeklystats',
+            name='weeklystats_week_culture_uniq',
+        ),
+        migrations.AddIndex(
+            model_name='planting',
+            index=models.Index(fields=['farm', 'harvest_date'], name='planting_farm_harvest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='planting',
+            index=models.Index(fields=['farm', 'plant_date'], name='planting_farm_plant_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['farm', 'sold_at'], name='sale_farm_sold_at_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysales',
+            constraint=models.UniqueConstraint(fields=('farm', 'date', 'culture'), name='dailysales_farm_date_culture_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='weeklystats',
+            constraint=models.UniqueConstraint(fields=('farm', 'week', 'culture'), name='weeklystats_farm_week_culture_uniq'),
+        ),
+    ]
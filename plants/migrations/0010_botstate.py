@@ -0,0 +1,31 @@
+# Generated by Django 4.2.10 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plants', '0009_farms'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BotState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=100, verbose_name='Тип')),
+                ('key', models.CharField(max_length=100, verbose_name='Ключ')),
+                ('data', models.JSONField(verbose_name='Данные')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Состояние бота',
+                'verbose_name_plural': 'Состояния бота',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='botstate',
+            constraint=models.UniqueConstraint(fields=('kind', 'key'), name='botstate_kind_key_uniq'),
+        ),
+    ]
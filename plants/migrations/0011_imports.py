@@ -0,0 +1,53 @@
+# Generated by Django 4.2.10 on 2026-10-18 11:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plants', '0010_botstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('cultures', 'Культуры'), ('plantings', 'Посадки')], max_length=10, verbose_name='Данные')),
+                ('source', models.CharField(max_length=255, verbose_name='Файл')),
+                ('digest', models.CharField(max_length=64, verbose_name='SHA-256 файла')),
+                ('rows', models.IntegerField(default=0, verbose_name='Обработано строк')),
+                ('created', models.IntegerField(default=0, verbose_name='Создано')),
+                ('updated', models.IntegerField(default=0, verbose_name='Обновлено')),
+                ('skipped', models.IntegerField(default=0, verbose_name='Пропущено')),
+                ('errors', models.JSONField(blank=True, default=list, verbose_name='Ошибки')),
+                ('status', models.CharField(choices=[('running', 'Идет'), ('done', 'Завершен')], default='running', max_length=10, verbose_name='Статус')),
+                ('started_at', models.DateTimeField(auto_now_add=True, verbose_name='Начат')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершен')),
+            ],
+            options={
+                'verbose_name': 'Импорт',
+                'verbose_name_plural': 'Импорты',
+            },
+        ),
+        migrations.AddField(
+            model_name='planting',
+            name='import_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, verbose_name='Ключ импорта'),
+        ),
+        migrations.AddConstraint(
+            model_name='planting',
+            constraint=models.UniqueConstraint(fields=('farm', 'import_key'), name='planting_farm_import_key_uniq'),
+        ),
+        migrations.AddField(
+            model_name='importrun',
+            name='farm',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='plants.farm', verbose_name='Ферма'),
+        ),
+        migrations.AddIndex(
+            model_name='importrun',
+            index=models.Index(fields=['farm', 'kind', 'digest'], name='importrun_farm_kind_digest_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.10 on 2026-10-18 12:14
+
+from django.db import migrations, models
+
+
+def fill_search_name(apps, schema_editor):
+    """Заполняет название для поиска у существующих культур"""
+    from plants.models import normalize_name
+
+    Culture = apps.get_model('plants', 'Culture')
+    cultures = list(Culture.objects.all())
+    for culture in cultures:
+        culture.search_name = normalize_name(culture.name)
+    Culture.objects.bulk_update(cultures, ['search_name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plants', '0011_imports'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='culture',
+            name='search_name',
+            field=models.CharField(default='', editable=False, max_length=100, verbose_name='Название для поиска'),
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='culture',
+            index=models.Index(fields=['farm', 'search_name'], name='culture_farm_search_name_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+def set_journal_mode(mode):
+    def apply(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA journal_mode = {mode}")
+    return apply
+
+
+class Migration(migrations.Migration):
+    """Включает WAL в файле базы один раз; режим сохраняется в заголовке файла (plants.sqlite)"""
+
+    # PRAGMA journal_mode не меняется внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('plants', '0012_culture_search_name'),
+    ]
+
+    operations = [
+        migrations.RunPython(set_journal_mode('wal'), set_journal_mode('delete')),
+    ]
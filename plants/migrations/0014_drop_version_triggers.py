@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# Таблицы, для которых 0005 и post_migrate создавали триггеры FOR EACH ROW
+TRIGGER_TABLES = ['plants_planting', 'plants_culture', 'plants_weeklystats']
+EVENTS = ('insert', 'update', 'delete')
+
+
+def drop_triggers(apps, schema_editor):
+    """Версии теперь увеличивает plants.versions один раз на выражение"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in TRIGGER_TABLES:
+        for event in EVENTS:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_version_{event}")
+
+
+def create_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in TRIGGER_TABLES:
+        for event in EVENTS:
+            schema_editor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_version_{event} "
+                f"AFTER {event.upper()} ON {table} FOR EACH ROW BEGIN "
+                f"UPDATE plants_dataversion SET version = version + 1, "
+                f"changed_at = strftime('%Y-%m-%d %H:%M:%f', 'now') "
+                f"WHERE name = '{table}'; END"
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plants', '0013_sqlite_wal'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_triggers, create_triggers),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+def fill_planted_quantity(apps, schema_editor):
+    """Посажено у существующих посадок: остаток плюс продажи из журнала"""
+    schema_editor.execute(
+        "UPDATE plants_planting SET planted_quantity = quantity + COALESCE("
+        "(SELECT SUM(quantity) FROM plants_sale WHERE plants_sale.planting_id = plants_planting.id), 0)"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plants', '0014_drop_version_triggers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planting',
+            name='planted_quantity',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Посажено'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_planted_quantity, migrations.RunPython.noop),
+    ]
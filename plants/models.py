@@ -1,7 +1,64 @@
+import secrets
+
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 from datetime import timedelta
 
+from .tenancy import SharedTenantManager, TenantManager, current_farm_id
+
+
+def new_invite_code():
+    return secrets.token_urlsafe(6)
+
+
+def normalize_name(name):
+    """Название для поиска: нижний регистр, ё как е, одиночные пробелы"""
+    return ' '.join(name.lower().replace('ё', 'е').split())
+
+
+class Farm(models.Model):
+    name = models.CharField("Название", max_length=100)
+    invite_code = models.CharField("Код приглашения", max_length=20, unique=True, default=new_invite_code)
+    created_at = models.DateTimeField("Создана", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Ферма"
+        verbose_name_plural = "Фермы"
+
+    def __str__(self):
+        return self.name
+
+
+class FarmMember(models.Model):
+    """Участник фермы: чат Telegram или пользователь сайта"""
+    ROLE_CHOICES = [
+        ('admin', 'Админ'),
+        ('manager', 'Менеджер'),
+        ('worker', 'Работник'),
+    ]
+
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='members', verbose_name="Ферма")
+    chat_id = models.BigIntegerField("ID чата", unique=True, null=True, blank=True)
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Пользователь"
+    )
+    role = models.CharField("Роль", max_length=10, choices=ROLE_CHOICES, default='worker')
+    created_at = models.DateTimeField("Добавлен", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Участник фермы"
+        verbose_name_plural = "Участники ферм"
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(chat_id__isnull=False) | models.Q(user__isnull=False),
+                name='farmmember_chat_or_user',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.farm}: {self.user or self.chat_id} ({self.get_role_display()})"
+
 
 class Culture(models.Model):
     name = models.CharField("Название", max_length=100)
@@ -17,11 +74,42 @@ class Culture(models.Model):
     )
     germination_days = models.IntegerField("Дней на прорастание (20°C)", default=3)
     light_days = models.IntegerField("Дней на свету", default=5)
+    # Без фермы культура входит в общий справочник
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Ферма")
+    # normalize_name(name) для поиска по началу названия; bulk-операции заполняют поле сами
+    search_name = models.CharField("Название для поиска", max_length=100, default="", editable=False)
+
+    objects = SharedTenantManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            # Поиск по началу названия среди общих культур и культур фермы (inline-режим бота)
+            models.Index(fields=['farm', 'search_name'], name='culture_farm_search_name_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.search_name = normalize_name(self.name)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
 
 
+def planting_dates(culture, plant_date, today):
+    """Дата созревания, крайний срок продажи и статус посадки"""
+    harvest_date = plant_date + timedelta(days=culture.grow_days)
+    sale_deadline = harvest_date + timedelta(days=culture.expire_days)
+
+    if today >= sale_deadline:
+        status = 'expired'
+    elif today >= harvest_date:
+        status = 'ready'
+    else:
+        status = 'growing'
+    return harvest_date, sale_deadline, status
+
+
 class Planting(models.Model):
     STATUS_CHOICES = [
         ('growing', 'Растет'),
@@ -29,26 +117,200 @@ class Planting(models.Model):
         ('expired', 'Просрочено')
     ]
 
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, verbose_name="Ферма")
     culture = models.ForeignKey(Culture, on_delete=models.CASCADE, verbose_name="Культура")
     plant_date = models.DateField("Дата посадки", default=timezone.now)
     quantity = models.IntegerField("Количество")
+    # Остаток плюс проданное: продажи его не меняют, правка количества сдвигает на ту же разницу
+    planted_quantity = models.IntegerField("Посажено", editable=False)
     harvest_date = models.DateField("Дата созревания", blank=True, null=True)
     sale_deadline = models.DateField("Крайний срок продажи", blank=True, null=True)
     status = models.CharField("Статус", max_length=10, choices=STATUS_CHOICES, default='growing')
+    archived = models.BooleanField("В архиве", default=False)
+    # Строка файла импорта; повторный импорт обновляет посадку, а не создает вторую
+    import_key = models.CharField("Ключ импорта", max_length=64, null=True, blank=True, editable=False)
+
+    objects = TenantManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['farm', 'import_key'], name='planting_farm_import_key_uniq'),
+        ]
+        indexes = [
+            # Запросы одной фермы: текущие посадки и keyset-пагинация по дате созревания
+            models.Index(fields=['farm', 'harvest_date'], name='planting_farm_harvest_idx'),
+            # Посадки фермы по дате посадки (план производства, иерархия дат в админке)
+            models.Index(fields=['farm', 'plant_date'], name='planting_farm_plant_date_idx'),
+            # Иерархия дат в админке
+            models.Index(fields=['plant_date'], name='planting_plant_date_idx'),
+            # Текущие посадки (фильтр и сортировка по дате созревания) и пересчет ready/growing
+            models.Index(fields=['harvest_date', 'status'], name='planting_harvest_status_idx'),
+            # Пересчет просроченных посадок
+            models.Index(fields=['sale_deadline', 'status'], name='planting_deadline_status_idx'),
+            # Фильтры админки по статусу и культуре
+            models.Index(fields=['status', 'culture'], name='planting_status_culture_idx'),
+        ]
 
     def save(self, *args, **kwargs):
-        self.harvest_date = self.plant_date + timedelta(days=self.culture.grow_days)
-        self.sale_deadline = self.harvest_date + timedelta(days=self.culture.expire_days)
+        from .catalog import get_culture
+
+        if self.farm_id is None:
+            self.farm_id = current_farm_id()
+        if self.planted_quantity is None:
+            self.planted_quantity = self.quantity
 
-        today = timezone.now().date()
-        if today >= self.sale_deadline:
-            self.status = 'expired'
-        elif today >= self.harvest_date:
-            self.status = 'ready'
-        else:
-            self.status = 'growing'
+        # Параметры культуры берем из кэша каталога, чтобы не делать лишний запрос
+        culture = self.culture if Planting.culture.is_cached(self) else get_culture(self.culture_id)
+        if culture is None:
+            culture = self.culture
 
+        self.harvest_date, self.sale_deadline, self.status = planting_dates(
+            culture, self.plant_date, timezone.now().date()
+        )
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"{self.culture} - {self.plant_date.strftime('%Y-%m-%d')}"
\ No newline at end of file
+        return f"{self.culture} - {self.plant_date.strftime('%Y-%m-%d')}"
+
+class NotificationChat(models.Model):
+    chat_id = models.BigIntegerField("ID чата", unique=True)
+    created_at = models.DateTimeField("Подписан", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Чат для уведомлений"
+        verbose_name_plural = "Чаты для уведомлений"
+
+    def __str__(self):
+        return str(self.chat_id)
+
+
+class DataVersion(models.Model):
+    """Счетчик изменений таблицы; растет на каждое выражение записи в нее (см. versions.py)"""
+    name = models.CharField("Таблица", max_length=100, primary_key=True)
+    version = models.BigIntegerField("Версия", default=0)
+    changed_at = models.DateTimeField("Изменено", default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+class Sale(models.Model):
+    """Запись журнала продаж; не изменяется после создания"""
+    # Посадка удаляется при нулевом остатке, а журнал сохраняет ее ID
+    planting = models.ForeignKey(
+        Planting, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True,
+        verbose_name="Посадка"
+    )
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, verbose_name="Ферма")
+    culture = models.ForeignKey(Culture, on_delete=models.CASCADE, verbose_name="Культура")
+    quantity = models.IntegerField("Количество")
+    sold_at = models.DateTimeField("Время продажи", default=timezone.now)
+
+    objects = TenantManager()
+
+    class Meta:
+        verbose_name = "Продажа"
+        verbose_name_plural = "Продажи"
+        indexes = [
+            models.Index(fields=['farm', 'sold_at'], name='sale_farm_sold_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.culture} - {self.quantity} шт."
+
+
+class DailySales(models.Model):
+    """Продажи за день по культуре; обновляется при каждой продаже"""
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, verbose_name="Ферма")
+    date = models.DateField("Дата")
+    culture = models.ForeignKey(Culture, on_delete=models.CASCADE, verbose_name="Культура")
+    quantity = models.IntegerField("Продано", default=0)
+    sales = models.IntegerField("Продаж", default=0)
+
+    objects = TenantManager()
+
+    class Meta:
+        verbose_name = "Продажи за день"
+        verbose_name_plural = "Продажи по дням"
+        constraints = [
+            models.UniqueConstraint(fields=['farm', 'date', 'culture'], name='dailysales_farm_date_culture_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.date}: {self.culture} - {self.quantity} шт."
+
+
+class WeeklyStats(models.Model):
+    """Итоги недели по культуре; увеличиваются при посадке, созревании, продаже и списании"""
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, verbose_name="Ферма")
+    week = models.DateField("Неделя (понедельник)")
+    culture = models.ForeignKey(Culture, on_delete=models.CASCADE, verbose_name="Культура")
+    planted = models.IntegerField("Посажено", default=0)
+    harvested = models.IntegerField("Созрело", default=0)
+    sold = models.IntegerField("Продано", default=0)
+    expired = models.IntegerField("Просрочено", default=0)
+
+    objects = TenantManager()
+
+    class Meta:
+        verbose_name = "Итоги недели"
+        verbose_name_plural = "Итоги по неделям"
+        constraints = [
+            models.UniqueConstraint(fields=['farm', 'week', 'culture'], name='weeklystats_farm_week_culture_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.week}: {self.culture}"
+
+
+class BotState(models.Model):
+    """Сохраненное состояние бота: user_data и шаги диалогов, переживающие перезапуск"""
+    kind = models.CharField("Тип", max_length=100)
+    key = models.CharField("Ключ", max_length=100)
+    data = models.JSONField("Данные")
+    updated_at = models.DateTimeField("Обновлено", auto_now=True)
+
+    class Meta:
+        verbose_name = "Состояние бота"
+        verbose_name_plural = "Состояния бота"
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'key'], name='botstate_kind_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}: {self.key}"
+
+
+class ImportRun(models.Model):
+    """Импорт файла культур или посадок; rows — строки, уже записанные в базу"""
+    KIND_CHOICES = [
+        ('cultures', 'Культуры'),
+        ('plantings', 'Посадки'),
+    ]
+    STATUS_CHOICES = [
+        ('running', 'Идет'),
+        ('done', 'Завершен'),
+    ]
+
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Ферма")
+    kind = models.CharField("Данные", max_length=10, choices=KIND_CHOICES)
+    source = models.CharField("Файл", max_length=255)
+    digest = models.CharField("SHA-256 файла", max_length=64)
+    rows = models.IntegerField("Обработано строк", default=0)
+    created = models.IntegerField("Создано", default=0)
+    updated = models.IntegerField("Обновлено", default=0)
+    skipped = models.IntegerField("Пропущено", default=0)
+    errors = models.JSONField("Ошибки", default=list, blank=True)
+    status = models.CharField("Статус", max_length=10, choices=STATUS_CHOICES, default='running')
+    started_at = models.DateTimeField("Начат", auto_now_add=True)
+    finished_at = models.DateTimeField("Завершен", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Импорт"
+        verbose_name_plural = "Импорты"
+        indexes = [
+            models.Index(fields=['farm', 'kind', 'digest'], name='importrun_farm_kind_digest_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.source} ({self.get_status_display()})"
@@ -0,0 +1,164 @@
+"""План производства по недельному спросу.
+
+Все расчеты идут над массивами «день × культура»: для каждой культуры
+график сбора сдвигается на срок созревания, а занятые лотки считаются
+разностью накопленных сумм посевов, без циклов по дням.
+"""
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import numpy as np
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import DailySales, Planting
+
+DEFAULT_HORIZON = 28
+DEFAULT_CADENCE = 1
+
+
+@dataclass
+class ProductionPlan:
+    """План на horizon дней начиная со start; массивы имеют форму (дни, культуры)"""
+    start: date
+    cultures: list
+    sow: np.ndarray
+    harvest: np.ndarray
+    germination: np.ndarray
+    light: np.ndarray
+    seed_grams: np.ndarray
+
+    @property
+    def horizon(self):
+        return self.sow.shape[0]
+
+    def day(self, index):
+        return self.start + timedelta(days=int(index))
+
+    @property
+    def occupied(self):
+        """Всего занято лотков по дням (прорастание + свет)"""
+        return (self.germination + self.light).sum(axis=1)
+
+    def peak(self):
+        """(день, лотков) максимальной загрузки стеллажей"""
+        occupied = self.occupied
+        index = int(occupied.argmax()) if occupied.size else 0
+        return self.day(index), int(occupied[index]) if occupied.size else 0
+
+    def schedule(self, days):
+        """Посевы на ближайшие days дней: [(дата, [(культура, лотков, грамм)])]"""
+        result = []
+        for index in range(min(days, self.horizon)):
+            row = np.nonzero(self.sow[index])[0]
+            if row.size:
+                result.append((self.day(index), [
+                    (self.cultures[c], int(self.sow[index, c]), int(self.seed_grams[index, c]))
+                    for c in row
+                ]))
+        return result
+
+
+def harvest_targets(weekly, horizon, cadence=DEFAULT_CADENCE):
+    """Сбор по дням, покрывающий недельный спрос целыми лотками.
+
+    Сбор идет раз в cadence дней и закрывает спрос до следующего сбора;
+    накопленный спрос округляется вверх, поэтому к любому дню собрано
+    не меньше запрошенного.
+    """
+    days = np.arange(horizon)
+    until = np.minimum(days + cadence, horizon)
+    harvest = np.ceil(np.outer(until, weekly) / 7 - 1e-9) - np.ceil(np.outer(days, weekly) / 7 - 1e-9)
+    harvest[days % cadence != 0] = 0
+    return harvest
+
+
+def lagged_window(cumulative, lag_from, lag_to):
+    """Сумма посевов в окне (t - lag_to, t - lag_from] для каждого дня t и культуры.
+
+    cumulative — накопленные посевы со строкой нулей в начале; лаги у
+    каждой культуры свои, поэтому выборка идет индексами, а не срезом.
+    """
+    days = np.arange(cumulative.shape[0] - 1)[:, None] + 1
+    columns = np.arange(cumulative.shape[1])[None, :]
+    upper = np.clip(days - lag_from[None, :], 0, None)
+    lower = np.clip(days - lag_to[None, :], 0, None)
+    return cumulative[upper, columns] - cumulative[lower, columns]
+
+
+def build_plan(cultures, weekly_demand, horizon=DEFAULT_HORIZON, start=None, cadence=DEFAULT_CADENCE,
+               existing=()):
+    """Строит план посевов.
+
+    cultures — объекты Culture, weekly_demand — лотков в неделю по каждой
+    из них. existing — уже посаженные лотки (индекс культуры, дата посадки,
+    количество): они занимают стеллажи и закрывают сбор до первых новых
+    посевов; посаженные в день start добавляются к посеву этого дня.
+    Новый посев возможен не раньше start.
+    """
+    start = start or timezone.now().date()
+    weekly = np.asarray(weekly_demand, dtype=np.float64)
+    grow = np.array([c.grow_days for c in cultures], dtype=np.int64)
+    germination_days = np.array([c.germination_days for c in cultures], dtype=np.int64)
+    light_days = np.array([c.light_days for c in cultures], dtype=np.int64)
+    grams = np.array([c.grams_per_tray for c in cultures], dtype=np.int64)
+    count = len(cultures)
+
+    # Сбор считается с запасом на самый долгий срок созревания, посев — сдвигом назад
+    lead = int(grow.max()) if count else 0
+    harvest_all = harvest_targets(weekly, horizon + lead, cadence)
+    sow_days = np.arange(horizon)[:, None] + grow[None, :]
+    sow = harvest_all[sow_days, np.arange(count)[None, :]].astype(np.int64)
+
+    # Посевы до start и в сам start (уже стоящие лотки) идут в общую ленту
+    history = int((germination_days + light_days).max(initial=0)) + lead
+    timeline = np.zeros((history + horizon, count), dtype=np.int64)
+    timeline[history:] = sow
+    for index, plant_date, quantity in existing:
+        offset = history + (plant_date - start).days
+        if 0 <= offset <= history:
+            timeline[offset, index] += quantity
+
+    cumulative = np.vstack([np.zeros((1, count), dtype=np.int64), np.cumsum(timeline, axis=0)])
+    zero = np.zeros(count, dtype=np.int64)
+    germination = lagged_window(cumulative, zero, germination_days)[history:]
+    light = lagged_window(cumulative, germination_days, germination_days + light_days)[history:]
+    harvest = lagged_window(cumulative, grow, grow + 1)[history:]
+
+    return ProductionPlan(
+        start=start,
+        cultures=list(cultures),
+        sow=sow,
+        harvest=harvest,
+        germination=germination,
+        light=light,
+        seed_grams=sow * grams[None, :],
+    )
+
+
+def demand_from_sales(days=28, today=None):
+    """Средний недельный спрос по культурам из дневной сводки продаж: {id культуры: лотков}"""
+    today = today or timezone.now().date()
+    rows = (
+        DailySales.objects
+        .filter(date__gt=today - timedelta(days=days))
+        .values_list('culture_id')
+        .annotate(total=Sum('quantity'))
+    )
+    return {culture_id: total * 7 / days for culture_id, total in rows if total}
+
+
+def plan_for(demand, horizon=DEFAULT_HORIZON, cadence=DEFAULT_CADENCE, today=None):
+    """План по спросу {культура: лотков в неделю} с учетом уже стоящих посадок"""
+    today = today or timezone.now().date()
+    cultures = list(demand)
+    positions = {culture.id: index for index, culture in enumerate(cultures)}
+    existing = [
+        (positions[culture_id], plant_date, quantity)
+        for culture_id, plant_date, quantity in (
+            Planting.objects
+            .filter(culture_id__in=positions, plant_date__lte=today, status='growing', archived=False)
+            .values_list('culture_id', 'plant_date', 'quantity')
+        )
+    ]
+    return build_plan(cultures, [demand[c] for c in cultures], horizon, today, cadence, existing)
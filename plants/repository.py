@@ -0,0 +1,330 @@
+"""Асинхронный слой доступа к данным для бота.
+
+В Django 4.2 методы aget/acreate/aupdate — обертки над sync_to_async
+с thread_sensitive=True, то есть вся работа ORM из всех чатов идет через
+один поток. Поэтому запросы здесь выполняются в отдельном ограниченном
+пуле потоков (размер задается DB_THREAD_POOL_SIZE), и медленный запрос
+одного чата не блокирует остальных.
+
+Текущая ферма (plants.tenancy) передается в поток вместе с контекстом,
+поэтому все запросы здесь ограничены фермой чата. Время каждого
+вызова, включая ожидание потока, попадает в plants.metrics.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import close_old_connections, connections, transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from . import bulk, catalog, export, farms, metrics, sales, search, sqlite, stats
+from .models import BotState, FarmMember, NotificationChat, Planting
+from .statuses import update_statuses as _update_statuses
+from .stock import set_quantity as _set_quantity, sell_stock
+from .tenancy import scope, unscoped
+
+POOL_SIZE = int(os.getenv('DB_THREAD_POOL_SIZE', '8'))
+
+# Выгрузка для бота держится в памяти до этого размера, дальше — во временном файле
+EXPORT_SPOOL_SIZE = 4 * 1024 * 1024
+
+_executor = None
+# Сколько потоков запустил пул: у каждого свое соединение с базой
+_threads = 0
+_threads_lock = threading.Lock()
+
+
+def _thread_started():
+    global _threads
+    with _threads_lock:
+        _threads += 1
+
+
+def get_executor():
+    """Пул потоков для работы с базой"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix='db', initializer=_thread_started)
+    return _executor
+
+
+def _close_connection(barrier):
+    """Закрывает соединение потока; барьер не дает одному потоку взять две такие задачи"""
+    try:
+        barrier.wait(timeout=5)
+    except threading.BrokenBarrierError:
+        pass
+    connections.close_all()
+
+
+def shutdown():
+    """Закрывает соединения потоков пула и останавливает его.
+
+    Иначе файлы -wal и -shm остаются открытыми до сборки мусора и
+    переживают удаление тестовой базы.
+    """
+    global _executor, _threads
+    if _executor is not None:
+        if _threads:
+            barrier = threading.Barrier(_threads)
+            for _ in range(_threads):
+                _executor.submit(_close_connection, barrier)
+        _executor.shutdown(wait=True)
+        _executor = None
+        _threads = 0
+
+
+def _call(func, args, kwargs):
+    close_old_connections()
+    return func(*args, **kwargs)
+
+
+async def run_db(func, *args, **kwargs):
+    """Выполняет синхронную функцию с ORM в пуле потоков"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    with metrics.track_db_call(getattr(func, '__name__', 'run_db')):
+        return await loop.run_in_executor(get_executor(), context.run, _call, func, args, kwargs)
+
+
+def in_db_pool(func):
+    """Декоратор: превращает синхронную функцию с ORM в корутину, исполняемую в пуле"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_db(func, *args, **kwargs)
+    return wrapper
+
+
+# Фермы
+
+warm_members = in_db_pool(farms.warm)
+get_membership = in_db_pool(farms.membership)
+join_farm = in_db_pool(farms.join)
+count_members = in_db_pool(farms.members_count)
+
+
+# Культуры
+
+warm_catalog = in_db_pool(catalog.warm)
+get_cultures = in_db_pool(catalog.get_cultures)
+get_culture = in_db_pool(catalog.get_culture)
+
+
+# Посадки
+
+@in_db_pool
+def get_current_plantings(today=None):
+    """Активные посадки, отсортированные по дате созревания"""
+    today = today or timezone.now().date()
+    return list(
+        Planting.objects.filter(harvest_date__gte=today, archived=False)
+        .order_by("harvest_date")
+        .select_related("culture")
+    )
+
+
+@in_db_pool
+def get_planting(planting_id):
+    """Посадка вместе с культурой или None"""
+    return Planting.objects.select_related('culture').filter(id=planting_id).first()
+
+
+@in_db_pool
+def create_planting(culture, quantity, plant_date=None):
+    """Создает посадку; culture — объект из каталога"""
+    # Посадка и недельные итоги (сигнал post_save) записываются вместе
+    with transaction.atomic():
+        return Planting.objects.create(
+            culture=culture,
+            quantity=quantity,
+            plant_date=plant_date or timezone.now().date(),
+        )
+
+
+parse_bulk_text = in_db_pool(bulk.parse_text)
+parse_bulk_csv = in_db_pool(bulk.parse_csv)
+create_plantings = in_db_pool(bulk.create_plantings)
+
+
+@in_db_pool
+def delete_planting(planting_id):
+    """Удаляет посадку; возвращает название культуры или None, если посадки нет"""
+    culture_name = Planting.objects.filter(id=planting_id).values_list('culture__name', flat=True).first()
+    if culture_name is None:
+        return None
+    Planting.objects.filter(id=planting_id).delete()
+    return culture_name
+
+
+set_quantity = in_db_pool(_set_quantity)
+
+
+@in_db_pool
+@unscoped
+def get_upcoming_plantings(today=None):
+    """Посадки всех ферм, по которым еще будут уведомления (срок продажи не прошел)"""
+    today = today or timezone.now().date()
+    return list(Planting.objects.filter(sale_deadline__gte=today, archived=False).select_related("culture"))
+
+
+@in_db_pool
+def dashboard_summary(farm_id, days=7, today=None):
+    """Сводка для закрепленного сообщения фермы.
+
+    Растет и созрело — (посадок, шт.), сборы на days дней вперед — [(дата, культура, шт.)].
+    """
+    today = today or timezone.now().date()
+    with scope(farm_id):
+        active = Planting.objects.filter(sale_deadline__gt=today, archived=False)
+        totals = active.aggregate(
+            growing=Count('id', filter=Q(harvest_date__gt=today)),
+            growing_quantity=Sum('quantity', filter=Q(harvest_date__gt=today)),
+            ready=Count('id', filter=Q(harvest_date__lte=today)),
+            ready_quantity=Sum('quantity', filter=Q(harvest_date__lte=today)),
+        )
+        upcoming = (
+            active.filter(harvest_date__gte=today, harvest_date__lt=today + timedelta(days=days))
+            .values_list('harvest_date', 'culture__name')
+            .annotate(quantity=Sum('quantity'))
+            .order_by('harvest_date', 'culture__name')
+        )
+        return {
+            'growing': (totals['growing'], totals['growing_quantity'] or 0),
+            'ready': (totals['ready'], totals['ready_quantity'] or 0),
+            'upcoming': list(upcoming),
+        }
+
+
+@in_db_pool
+def inline_search(query):
+    """Культуры и активные посадки для inline-запроса: (SearchResult, из кэша)"""
+    return search.search(query)
+
+
+# Продажи
+
+@in_db_pool
+def sell(planting_id, amount):
+    """Продает растения из посадки.
+
+    Возвращает (остаток, None) при успехе или (None, доступно) при отказе;
+    доступно равно None, если посадка не найдена.
+    """
+    remaining = sell_stock(planting_id, amount)
+    if remaining is not None:
+        return remaining, None
+    available = Planting.objects.filter(id=planting_id).values_list('quantity', flat=True).first()
+    return None, available
+
+
+sales_summary = in_db_pool(sales.sales_summary)
+weekly_report = in_db_pool(stats.cached_report)
+
+
+@in_db_pool
+def production_plan(demand=None, horizon=None, sales_days=28):
+    """План посевов; без явного спроса {культура: лотков в неделю} берет средние продажи"""
+    # numpy нужен только для /plan — не задерживаем им запуск бота
+    from . import planner
+
+    horizon = horizon or planner.DEFAULT_HORIZON
+    if demand is None:
+        demand = {
+            culture: weekly
+            for culture_id, weekly in planner.demand_from_sales(sales_days).items()
+            if (culture := catalog.get_culture(culture_id)) is not None
+        }
+    return planner.plan_for(demand, horizon)
+
+
+# Выгрузка
+
+@in_db_pool
+def export_file(kind, fmt, params, max_size=None):
+    """Файл выгрузки для отправки документом: (файл, имя, размер).
+
+    ExportError при неверных параметрах или как только файл превысит max_size
+    байт: остаток выгрузки тогда не читается из базы.
+    """
+    filters = export.parse_filters(params)
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+    size = 0
+    for chunk in export.chunks(kind, fmt, filters):
+        data = chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+        size += len(data)
+        if max_size is not None and size > max_size:
+            spool.close()
+            raise export.ExportError(
+                f"Файл больше {max_size // (1024 * 1024)} МБ, сузьте выгрузку фильтрами или скачайте ее на сайте"
+            )
+        spool.write(data)
+    spool.seek(0)
+    return spool, export.filename(kind, fmt, filters), size
+
+
+# Уведомления
+
+@in_db_pool
+def get_notification_chats():
+    """Подписанные на уведомления чаты по фермам: {id фермы: [id чатов]}"""
+    subscribed = NotificationChat.objects.values_list('chat_id', flat=True)
+    chats = {}
+    for chat_id, farm_id in FarmMember.objects.filter(chat_id__in=subscribed).values_list('chat_id', 'farm_id'):
+        chats.setdefault(farm_id, []).append(chat_id)
+    return chats
+
+
+@in_db_pool
+def toggle_notifications(chat_id):
+    """Включает или выключает уведомления для чата; возвращает новое состояние"""
+    deleted, _ = NotificationChat.objects.filter(chat_id=chat_id).delete()
+    if deleted:
+        return False
+    NotificationChat.objects.create(chat_id=chat_id)
+    return True
+
+
+# Статусы
+
+update_statuses = in_db_pool(unscoped(_update_statuses))
+
+
+# Обслуживание базы
+
+optimize_database = in_db_pool(sqlite.optimize)
+
+
+# Состояние бота
+
+@in_db_pool
+def load_bot_state(kind):
+    """Сохраненные записи одного типа: {ключ: данные}"""
+    return dict(BotState.objects.filter(kind=kind).values_list('key', 'data'))
+
+
+@in_db_pool
+def save_bot_state(changes):
+    """Записывает пачку изменений {(тип, ключ): данные} одной транзакцией; None удаляет запись"""
+    now = timezone.now()
+    rows = [
+        BotState(kind=kind, key=key, data=data, updated_at=now)
+        for (kind, key), data in changes.items() if data is not None
+    ]
+    removed = {}
+    for (kind, key), data in changes.items():
+        if data is None:
+            removed.setdefault(kind, []).append(key)
+
+    with transaction.atomic():
+        if rows:
+            BotState.objects.bulk_create(
+                rows, update_conflicts=True, unique_fields=['kind', 'key'], update_fields=['data', 'updated_at'],
+            )
+        for kind, keys in removed.items():
+            BotState.objects.filter(kind=kind, key__in=keys).delete()
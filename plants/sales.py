@@ -0,0 +1,61 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import stats
+from .models import DailySales, Sale
+
+
+def record_sales(entries, sold_at=None):
+    """Пишет продажи в журнал и увеличивает дневные итоги.
+
+    entries — список (id посадки, id фермы, id культуры, количество).
+    Вызывается внутри транзакции, которая списывает остаток.
+    """
+    sold_at = sold_at or timezone.now()
+    entries = [e for e in entries if e[3] > 0]
+    if not entries:
+        return
+
+    Sale.objects.bulk_create([
+        Sale(planting_id=planting_id, farm_id=farm_id, culture_id=culture_id, quantity=quantity, sold_at=sold_at)
+        for planting_id, farm_id, culture_id, quantity in entries
+    ])
+
+    totals = defaultdict(lambda: [0, 0])
+    for _, farm_id, culture_id, quantity in entries:
+        totals[(farm_id, culture_id)][0] += quantity
+        totals[(farm_id, culture_id)][1] += 1
+
+    table = connection.ops.quote_name(DailySales._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} (farm_id, date, culture_id, quantity, sales) VALUES (%s, %s, %s, %s, %s) "
+            f"ON CONFLICT (farm_id, date, culture_id) DO UPDATE SET "
+            f"quantity = quantity + excluded.quantity, sales = sales + excluded.sales",
+            [
+                (farm_id, sold_at.date(), culture_id, quantity, count)
+                for (farm_id, culture_id), (quantity, count) in totals.items()
+            ],
+        )
+    stats.record_sold(entries, sold_at)
+
+
+def sales_summary(days, today=None):
+    """Итоги продаж за последние days дней по дневной сводке: (по культурам, по дням)"""
+    today = today or timezone.now().date()
+    rows = DailySales.objects.filter(date__gt=today - timedelta(days=days))
+    by_culture = list(
+        rows.values('culture__name')
+        .annotate(quantity=Sum('quantity'), sales=Sum('sales'))
+        .order_by('-quantity')
+    )
+    by_day = list(
+        rows.values('date')
+        .annotate(quantity=Sum('quantity'), sales=Sum('sales'))
+        .order_by('date')
+    )
+    return by_culture, by_day
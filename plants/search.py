@@ -0,0 +1,109 @@
+"""Поиск посадок и культур для inline-режима бота.
+
+Культуры ищутся по началу нормализованного названия (индекс на
+Culture.search_name, запрос-диапазон вместо LIKE), посадки — по
+найденным культурам среди активных, как в /current. Результаты
+кэшируются на несколько секунд: пока пользователь набирает «бази»,
+«базил», «базилик», следующий запрос сужает уже найденное в памяти,
+если прошлый результат не был обрезан лимитом.
+"""
+import os
+import threading
+import time
+
+from django.utils import timezone
+
+from . import catalog
+from .models import Culture, Planting, normalize_name
+from .tenancy import current_farm_id
+
+# Срок жизни результата; Telegram кэширует ответ на столько же
+CACHE_TTL = float(os.getenv('INLINE_CACHE_TTL', '10'))
+CACHE_SIZE = 512
+# Больше 50 результатов Telegram в одном ответе не принимает
+MAX_RESULTS = 50
+MAX_CULTURES = 10
+
+# Верхняя граница диапазона строк с заданным началом
+PREFIX_END = '\U0010ffff'
+
+_lock = threading.Lock()
+# (ферма, запрос, сегодня, версия каталога) -> (момент устаревания, результат)
+_cache = {}
+
+
+class SearchResult:
+    """Найденные культуры и посадки; complete — ничего не отброшено лимитами"""
+
+    def __init__(self, cultures, plantings, complete):
+        self.cultures = cultures
+        self.plantings = plantings
+        self.complete = complete
+
+    def narrow(self, query):
+        """Результат для более длинного запроса без обращения к базе"""
+        cultures = [c for c in self.cultures if c.search_name.startswith(query)]
+        culture_ids = {c.id for c in cultures}
+        plantings = [p for p in self.plantings if p.culture_id in culture_ids]
+        return SearchResult(cultures, plantings, True)
+
+
+def find(query, today):
+    """Поиск в базе: посадка по ID («12», «#12») или культуры по началу названия и их посадки"""
+    active = Planting.objects.filter(harvest_date__gte=today, archived=False).select_related('culture')
+    if query.lstrip('#').isdigit():
+        plantings = list(active.filter(pk=int(query.lstrip('#'))))
+        return SearchResult([], plantings, False)
+
+    cultures = list(
+        Culture.objects.filter(search_name__gte=query, search_name__lt=query + PREFIX_END)
+        .order_by('search_name')[:MAX_CULTURES + 1]
+    )
+    complete = len(cultures) <= MAX_CULTURES
+    cultures = cultures[:MAX_CULTURES]
+    if not query:
+        plantings = active
+    elif cultures:
+        plantings = active.filter(culture__in=cultures)
+    else:
+        return SearchResult([], [], complete)
+
+    plantings = list(plantings.order_by('harvest_date', 'id')[:MAX_RESULTS + 1])
+    complete = complete and len(plantings) <= MAX_RESULTS
+    return SearchResult(cultures, plantings[:MAX_RESULTS], complete)
+
+
+def search(query, today=None):
+    """Результат поиска для текущей фермы и признак, взят ли он из кэша"""
+    query = normalize_name(query)
+    today = today or timezone.now().date()
+    base_key = (current_farm_id(), today, catalog.version())
+    now = time.monotonic()
+
+    with _lock:
+        entry = _cache.get((*base_key, query))
+        if entry and entry[0] > now:
+            return entry[1], True
+        # Более короткий запрос, найденный целиком, сужается в памяти
+        narrowed = None
+        if not query.lstrip('#').isdigit():
+            for length in range(len(query) - 1, -1, -1):
+                entry = _cache.get((*base_key, query[:length]))
+                if entry and entry[0] > now and entry[1].complete:
+                    narrowed = entry[1].narrow(query)
+                    break
+
+    result = narrowed or find(query, today)
+    with _lock:
+        if len(_cache) >= CACHE_SIZE:
+            # Устаревшие записи уходят первыми, иначе — все
+            for key in [key for key, (expires, _) in _cache.items() if expires <= now] or list(_cache):
+                del _cache[key]
+        _cache[(*base_key, query)] = (now + CACHE_TTL, result)
+    return result, narrowed is not None
+
+
+def clear():
+    """Сбрасывает кэш поиска (для замеров)"""
+    with _lock:
+        _cache.clear()
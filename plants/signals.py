@@ -0,0 +1,49 @@
+from django.db import connections
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import catalog, stats
+from .models import Culture, Planting
+from .versions import ensure_versions
+
+
+@receiver(post_save, sender=Culture)
+@receiver(post_delete, sender=Culture)
+def invalidate_catalog(sender, **kwargs):
+    """Сбрасывает кэш каталога при изменении культур"""
+    catalog.invalidate()
+
+
+@receiver(pre_save, sender=Planting)
+def remember_planting(sender, instance, raw=False, **kwargs):
+    """Запоминает посадку до правки, чтобы поправить недельные итоги на разницу.
+
+    Правка количества меняет и "посажено": продажи в количество уже не входят.
+    """
+    instance._stats_before = None
+    if not raw and not instance._state.adding:
+        before = instance._stats_before = sender._base_manager.filter(pk=instance.pk).first()
+        if before is not None:
+            instance.planted_quantity = before.planted_quantity + instance.quantity - before.quantity
+
+
+@receiver(post_save, sender=Planting)
+def count_planting(sender, instance, created, raw=False, **kwargs):
+    """Учитывает посадку в недельных итогах (bulk_create учитывается в bulk.py)"""
+    if raw:
+        return
+    if created:
+        stats.record_planted([instance])
+    else:
+        stats.record_change(getattr(instance, '_stats_before', None), instance)
+
+
+@receiver(post_delete, sender=Planting)
+def uncount_planting(sender, instance, **kwargs):
+    """Убирает удаленную посадку из недельных итогов вместе с уже проданными лотками"""
+    stats.record_change(instance, None)
+
+
+def ensure_version_rows(sender, using, **kwargs):
+    """Создает строки версий для таблиц после миграций"""
+    ensure_versions(connections[using])
@@ -0,0 +1,35 @@
+"""Профиль SQLite для бота, сайта и cron, работающих с одной базой.
+
+С настройками по умолчанию SQLite пишет через журнал отката: пока
+один процесс пишет, остальные не могут читать, каждая транзакция
+ждет fsync, а занятая база сразу дает «database is locked». В режиме
+WAL читатели не мешают писателю, synchronous=NORMAL синхронизирует
+диск только при checkpoint (после сбоя питания теряются последние
+транзакции, но база остается целой), busy_timeout ждет блокировку
+вместо ошибки. Режим WAL хранится в самом файле базы и включается
+один раз миграцией 0013_sqlite_wal, а не при каждом подключении:
+иначе любая management-команда переписывала бы заголовок файла.
+Остальные прагмы (settings.SQLITE_PRAGMAS) действуют на соединение
+и выставляются каждому новому; соединения живут CONN_MAX_AGE секунд,
+поэтому это происходит редко.
+
+Транзакции (transaction.atomic) начинаются с BEGIN IMMEDIATE, как
+с transaction_mode в Django 5.1: блокировка записи берется сразу и
+ждет busy_timeout. С обычным BEGIN транзакция, которая сначала
+читает, а потом пишет (пересчет статусов), падает без ожидания, если
+другой процесс успел записать между ее чтением и записью.
+
+Прагмы и режим транзакций задает бэкенд plants.sqlite (ENGINE в
+settings.DATABASES, см. base.py), поэтому они действуют с первого
+соединения, в том числе до загрузки приложений.
+"""
+from django.db import connections
+
+
+def optimize(using='default'):
+    """PRAGMA optimize: обновляет статистику планировщика там, где она устарела"""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA optimize")
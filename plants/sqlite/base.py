@@ -0,0 +1,40 @@
+"""Бэкенд SQLite с профилем проекта: ENGINE 'plants.sqlite' (см. plants/sqlite/__init__.py).
+
+В OPTIONS настроек базы, кроме параметров sqlite3.connect, понимает:
+pragmas — {прагма: значение}, выставляются каждому новому соединению;
+transaction_mode — DEFERRED, IMMEDIATE или EXCLUSIVE для BEGIN в
+transaction.atomic, как одноименная настройка Django 5.1.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+PROFILE_OPTIONS = ('pragmas', 'transaction_mode')
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        for name in PROFILE_OPTIONS:
+            params.pop(name, None)
+        mode = self.transaction_mode
+        if mode is not None and mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(f"transaction_mode может быть {', '.join(TRANSACTION_MODES)}, а не {mode}")
+        return params
+
+    @property
+    def transaction_mode(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        return mode.upper() if mode else None
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        # Напрямую через sqlite3: настройка соединения не попадает в счетчики запросов
+        for name, value in self.settings_dict['OPTIONS'].get('pragmas', {}).items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.transaction_mode
+        self.cursor().execute(f"BEGIN {mode}" if mode else "BEGIN")
@@ -0,0 +1,188 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import DataVersion, Planting, Sale, WeeklyStats
+from .tenancy import current_farm_id
+
+FIELDS = ('planted', 'harvested', 'sold', 'expired')
+# Какое количество посадки идет в счетчик: посажено и собрано не меняются от продаж,
+# просрочено — то, что осталось непроданным
+QUANTITY_COLUMNS = {'planted': 'planted_quantity', 'harvested': 'planted_quantity', 'expired': 'quantity'}
+REPORT_CACHE_SIZE = 32
+
+# (ферма, недель, сегодня) -> (версия сводки, отчет)
+_report_cache = {}
+
+
+def week_start(day):
+    """Понедельник недели, в которую попадает day"""
+    return day - timedelta(days=day.weekday())
+
+
+def increment(counts):
+    """Прибавляет счетчики к недельным итогам одним upsert на тройку (ферма, неделя, культура).
+
+    counts — {(id фермы, понедельник, id культуры): {поле: прирост}}.
+    """
+    rows = [
+        (farm_id, week, culture_id, *(values.get(field, 0) for field in FIELDS))
+        for (farm_id, week, culture_id), values in counts.items()
+        if any(values.values())
+    ]
+    if not rows:
+        return
+
+    table = connection.ops.quote_name(WeeklyStats._meta.db_table)
+    columns = ', '.join(FIELDS)
+    updates = ', '.join(f"{field} = {field} + excluded.{field}" for field in FIELDS)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} (farm_id, week, culture_id, {columns}) VALUES (%s, %s, %s, %s, %s, %s, %s) "
+            f"ON CONFLICT (farm_id, week, culture_id) DO UPDATE SET {updates}",
+            rows,
+        )
+
+
+def new_counts():
+    return defaultdict(lambda: defaultdict(int))
+
+
+def add_planting(counts, p, sign=1):
+    """Вклад посадки в итоги: посажено, а по статусу еще собрано и просрочено"""
+    counts[(p.farm_id, week_start(p.plant_date), p.culture_id)]['planted'] += sign * p.planted_quantity
+    if p.status in ('ready', 'expired'):
+        counts[(p.farm_id, week_start(p.harvest_date), p.culture_id)]['harvested'] += sign * p.planted_quantity
+    if p.status == 'expired':
+        counts[(p.farm_id, week_start(p.sale_deadline), p.culture_id)]['expired'] += sign * p.quantity
+
+
+def record_planted(plantings):
+    """Учитывает новые посадки; посадки задним числом сразу считаются созревшими или просроченными"""
+    counts = new_counts()
+    for p in plantings:
+        add_planting(counts, p)
+    increment(counts)
+
+
+def record_change(before, after):
+    """Поправляет итоги на разницу между посадкой до и после правки (None — ее нет).
+
+    Правка количества, дат или статуса из админки и удаление посадки
+    переносят ее вклад целиком, включая уже проданные лотки; сами продажи
+    сюда не попадают, они учтены в record_sold.
+    """
+    counts = new_counts()
+    if before is not None:
+        add_planting(counts, before, -1)
+    if after is not None:
+        add_planting(counts, after)
+    increment(counts)
+
+
+def record_sold(entries, sold_at):
+    """Учитывает продажи: entries — список (id посадки, id фермы, id культуры, количество)"""
+    counts = new_counts()
+    week = week_start(sold_at.date())
+    for _, farm_id, culture_id, quantity in entries:
+        counts[(farm_id, week, culture_id)]['sold'] += quantity
+    increment(counts)
+
+
+def record_expired_sold(entries):
+    """Продажа просроченных лотков уменьшает просроченное.
+
+    entries — список (id фермы, id культуры, срок продажи, количество).
+    """
+    counts = new_counts()
+    for farm_id, culture_id, sale_deadline, quantity in entries:
+        counts[(farm_id, week_start(sale_deadline), culture_id)]['expired'] -= quantity
+    increment(counts)
+
+
+def record_transition(plantings, field, date_field, counts=None):
+    """Добавляет в counts итоги посадок, которые сейчас сменят статус.
+
+    Вызывается до UPDATE статуса в той же транзакции; агрегирует только
+    переходящие строки, а не всю таблицу.
+    """
+    counts = counts if counts is not None else new_counts()
+    rows = (
+        plantings.order_by()
+        .values_list('farm_id', 'culture_id', date_field)
+        .annotate(total=Sum(QUANTITY_COLUMNS[field]))
+    )
+    for farm_id, culture_id, day, total in rows:
+        counts[(farm_id, week_start(day), culture_id)][field] += total or 0
+    return counts
+
+
+def weekly_report(weeks, today=None):
+    """Итоги за последние weeks недель: (по культурам, по неделям)"""
+    today = today or timezone.now().date()
+    rows = WeeklyStats.objects.filter(week__gt=week_start(today) - timedelta(weeks=weeks))
+    totals = {field: Sum(field) for field in FIELDS}
+    by_culture = list(
+        rows.values('culture__name')
+        .annotate(**totals)
+        .order_by('-planted', 'culture__name')
+    )
+    by_week = list(
+        rows.values('week')
+        .annotate(**totals)
+        .order_by('week')
+    )
+    return by_culture, by_week
+
+
+def stats_version():
+    """Версия таблицы итогов; растет при каждой записи в нее"""
+    return (
+        DataVersion.objects
+        .filter(name=WeeklyStats._meta.db_table)
+        .values_list('version', flat=True)
+        .first()
+    )
+
+
+def cached_report(weeks, today=None):
+    """weekly_report с кэшем на ферму и период; сбрасывается, когда меняется версия сводки.
+
+    Возвращает (по культурам, по неделям, взят ли ответ из кэша).
+    """
+    today = today or timezone.now().date()
+    key = (current_farm_id(), weeks, today)
+    version = stats_version()
+    cached = _report_cache.get(key)
+    if version is not None and cached is not None and cached[0] == version:
+        return (*cached[1], True)
+
+    report = weekly_report(weeks, today)
+    if len(_report_cache) >= REPORT_CACHE_SIZE:
+        _report_cache.clear()
+    _report_cache[key] = (version, report)
+    return (*report, False)
+
+
+def rebuild():
+    """Пересчитывает недельные итоги с нуля по посадкам и журналу продаж.
+
+    Нужен один раз для данных, созданных до появления сводки; дальше
+    итоги обновляются по мере изменения посадок и совпадают с пересчетом:
+    проданные целиком посадки остаются в архиве, а удаленные убираются
+    из итогов и здесь, и при удалении. Изменения в обход Django (правка
+    базы вручную) итоги не видят — после них тоже нужен пересчет.
+    """
+    counts = new_counts()
+    record_transition(Planting.objects.all(), 'planted', 'plant_date', counts)
+    record_transition(Planting.objects.filter(status__in=('ready', 'expired')), 'harvested', 'harvest_date', counts)
+    record_transition(Planting.objects.filter(status='expired'), 'expired', 'sale_deadline', counts)
+    sales = Sale.objects.values_list('farm_id', 'culture_id', 'sold_at__date').annotate(total=Sum('quantity'))
+    for farm_id, culture_id, day, total in sales:
+        counts[(farm_id, week_start(day), culture_id)]['sold'] += total
+    WeeklyStats.objects.all().delete()
+    increment(counts)
+    return len(counts)
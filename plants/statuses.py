@@ -0,0 +1,71 @@
+import time
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import stats
+from .models import Planting
+
+
+@dataclass
+class StatusUpdateResult:
+    """Итог пересчета статусов посадок"""
+    ready: int = 0
+    expired: int = 0
+    growing: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def total(self):
+        return self.ready + self.expired + self.growing
+
+    def __str__(self):
+        return (
+            f"Переведено посадок: {self.total} "
+            f"(созрело: {self.ready}, просрочено: {self.expired}, растет: {self.growing}) "
+            f"за {self.elapsed * 1000:.1f} мс"
+        )
+
+
+def update_statuses(today=None, queryset=None):
+    """Переводит посадки growing→ready→expired несколькими UPDATE-запросами.
+
+    Затрагиваются только строки, у которых статус действительно меняется,
+    даты не пересчитываются и связанные культуры не загружаются.
+    queryset ограничивает пересчет (например, выбранными в админке посадками).
+    """
+    today = today or timezone.now().date()
+    plantings = queryset if queryset is not None else Planting.objects.all()
+    started = time.perf_counter()
+
+    with transaction.atomic():
+        to_expire = plantings.filter(sale_deadline__lte=today).exclude(status='expired')
+        to_ripen = plantings.filter(harvest_date__lte=today, sale_deadline__gt=today, status='growing')
+        # Недельные итоги считаются по переходящим строкам до смены статуса
+        counts = stats.record_transition(to_expire, 'expired', 'sale_deadline')
+        stats.record_transition(to_expire.filter(status='growing'), 'harvested', 'harvest_date', counts)
+        stats.record_transition(to_ripen, 'harvested', 'harvest_date', counts)
+        stats.increment(counts)
+
+        expired = to_expire.update(status='expired')
+        ready = (
+            plantings
+            .filter(harvest_date__lte=today, sale_deadline__gt=today)
+            .exclude(status='ready')
+            .update(status='ready')
+        )
+        # Откат статуса, если даты посадки были исправлены задним числом
+        growing = (
+            plantings
+            .filter(harvest_date__gt=today)
+            .exclude(status='growing')
+            .update(status='growing')
+        )
+
+    return StatusUpdateResult(
+        ready=ready,
+        expired=expired,
+        growing=growing,
+        elapsed=time.perf_counter() - started,
+    )
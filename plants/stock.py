@@ -0,0 +1,85 @@
+import copy
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from . import stats
+from .models import Planting
+from .sales import record_sales
+from .tenancy import current_farm_id
+
+SALE_DEADLINE = Planting._meta.get_field('sale_deadline')
+
+
+def sell_stock(planting_id, amount):
+    """Списывает amount растений одним условным UPDATE.
+
+    Возвращает остаток после продажи или None, если посадка не найдена
+    либо растений недостаточно. Продажа пишется в журнал, а посадка
+    с нулевым остатком в той же транзакции переносится в архив: она
+    пропадает из текущих посадок, но остается в недельных итогах.
+    """
+    table = connection.ops.quote_name(Planting._meta.db_table)
+    # Сырой SQL минует менеджер модели, поэтому ферма проверяется явно
+    farm_id = current_farm_id()
+    farm_filter, params = ("", []) if farm_id is None else (" AND farm_id = %s", [farm_id])
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET quantity = quantity - %s, archived = archived OR quantity = %s "
+                f"WHERE id = %s AND quantity >= %s{farm_filter} "
+                f"RETURNING quantity, farm_id, culture_id, status, sale_deadline",
+                [amount, amount, planting_id, amount, *params],
+            )
+            row = cursor.fetchone()
+
+        if row is None:
+            return None
+
+        remaining, farm_id, culture_id, status, sale_deadline = row
+        record_sales([(planting_id, farm_id, culture_id, amount)])
+        if status == 'expired':
+            stats.record_expired_sold([(farm_id, culture_id, SALE_DEADLINE.to_python(sale_deadline), amount)])
+        return remaining
+
+
+def sell_out(plantings):
+    """Продает весь остаток посадок из queryset и переносит их в архив, как sell_stock при нуле.
+
+    Посадки без остатка пропускаются. Возвращает число проданных посадок.
+    """
+    with transaction.atomic():
+        rows = list(
+            plantings.filter(quantity__gt=0)
+            .values_list('id', 'farm_id', 'culture_id', 'quantity', 'status', 'sale_deadline')
+        )
+        if not rows:
+            return 0
+        record_sales([row[:4] for row in rows])
+        stats.record_expired_sold([
+            (farm_id, culture_id, sale_deadline, quantity)
+            for _, farm_id, culture_id, quantity, status, sale_deadline in rows
+            if status == 'expired'
+        ])
+        Planting.objects.filter(id__in=[row[0] for row in rows], quantity__gt=0).update(quantity=0, archived=True)
+    return len(rows)
+
+
+def set_quantity(planting_id, quantity):
+    """Устанавливает количество растений без пересчета дат. Возвращает True, если посадка найдена.
+
+    Это поправка числа лотков, а не продажа, поэтому "посажено" сдвигается на ту же разницу.
+    """
+    with transaction.atomic():
+        before = Planting.objects.filter(pk=planting_id).first()
+        if before is None:
+            return False
+        delta = quantity - before.quantity
+        Planting.objects.filter(pk=planting_id).update(
+            quantity=quantity, planted_quantity=F('planted_quantity') + delta,
+        )
+        after = copy.copy(before)
+        after.quantity = quantity
+        after.planted_quantity = before.planted_quantity + delta
+        stats.record_change(before, after)
+    return True
@@ -0,0 +1,66 @@
+"""Разделение данных по фермам.
+
+Текущая ферма хранится в contextvar: бот выставляет ее на каждое
+обновление, веб-страницы — на запрос. Менеджеры моделей с полем farm
+внутри scope() сами добавляют фильтр по ферме, поэтому слой данных
+не может случайно прочитать чужие строки. Вне scope() (фоновые
+задания, админка суперпользователя, management-команды) фильтра нет.
+"""
+import contextvars
+import functools
+from contextlib import contextmanager
+
+from django.db import models
+from django.db.models import Q
+
+# Ферма для чатов без фермы: ни одна строка ей не принадлежит
+NO_FARM = 0
+
+_current_farm = contextvars.ContextVar('current_farm', default=None)
+
+
+def current_farm_id():
+    """ID текущей фермы или None, если фильтр по ферме не действует"""
+    return _current_farm.get()
+
+
+def activate(farm_id):
+    """Выставляет текущую ферму до конца задачи; возвращает токен для reset"""
+    return _current_farm.set(farm_id)
+
+
+@contextmanager
+def scope(farm_id):
+    """Блок, в котором запросы видят только данные фермы farm_id (None — все фермы)"""
+    token = _current_farm.set(farm_id)
+    try:
+        yield
+    finally:
+        _current_farm.reset(token)
+
+
+def unscoped(func):
+    """Декоратор для общих фоновых операций по всем фермам"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with scope(None):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+class TenantManager(models.Manager):
+    """Менеджер по умолчанию: внутри scope() отдает только строки текущей фермы"""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        farm_id = current_farm_id()
+        return queryset if farm_id is None else queryset.filter(farm_id=farm_id)
+
+
+class SharedTenantManager(models.Manager):
+    """То же для справочников: строки без фермы общие и видны всем"""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        farm_id = current_farm_id()
+        return queryset if farm_id is None else queryset.filter(Q(farm__isnull=True) | Q(farm_id=farm_id))
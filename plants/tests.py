@@ -0,0 +1,742 @@
+import asyncio
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from telegram_notifications import HarvestNotifier
+from telegram_persistence import DjangoPersistence
+from telegram_stub import STUB_TOKEN, build_stub_application, message_update
+from zelen_pro.telegram_webhook import TelegramWebhook
+
+from . import admin as plants_admin, catalog, farms, repository, search, stats, tenancy
+from .benchmarks import percentile, seed_cultures, seed_farm, seed_plantings
+from .management.commands import benchmark_search, benchmark_startup
+from .management.commands.simulate_notifications import FakeJobQueue
+from .models import BotState, Culture, DailySales, FarmMember, Planting, Sale, WeeklyStats, normalize_name
+from .stock import sell_stock, set_quantity
+
+
+WEBHOOK_SECRET = 'test-secret-0123456789'
+
+
+async def post_webhook(app, path, body, secret=None):
+    """Один POST в ASGI-приложение; возвращает код ответа"""
+    headers = [(b'content-type', b'application/json')]
+    if secret is not None:
+        headers.append((b'x-telegram-bot-api-secret-token', secret.encode()))
+    scope = {'type': 'http', 'method': 'POST', 'path': path, 'headers': headers}
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent[0]['status']
+
+
+class WebhookTests(SimpleTestCase):
+    """Webhook принимает записанное обновление только с верным секретом и не запускается без своего секрета"""
+
+    def setUp(self):
+        self.passed = []
+
+        async def django_app(scope, receive, send):
+            self.passed.append(scope['path'])
+            await send({'type': 'http.response.start', 'status': 404, 'headers': []})
+
+        self.webhook = TelegramWebhook(django_app, path='/telegram/webhook/', secret=WEBHOOK_SECRET)
+        # Приложение бота без сети: обновления только складываются в очередь
+        self.webhook.bot_app = build_stub_application()
+        self.update = json.dumps(message_update(1, 100, '/current')).encode()
+
+    def post(self, secret, path='/telegram/webhook/', body=None):
+        return asyncio.run(post_webhook(self.webhook, path, self.update if body is None else body, secret))
+
+    def test_secret_header_is_checked(self):
+        self.assertEqual(self.post(None), 403)
+        self.assertEqual(self.post('wrong-secret-0123456789'), 403)
+        self.assertTrue(self.webhook.bot_app.update_queue.empty())
+
+        self.assertEqual(self.post(WEBHOOK_SECRET), 200)
+        update = self.webhook.bot_app.update_queue.get_nowait()
+        self.assertEqual((update.update_id, update.effective_chat.id, update.message.text), (1, 100, '/current'))
+        self.assertEqual(self.post(WEBHOOK_SECRET, body=b'{'), 400)
+
+    def test_other_paths_go_to_django(self):
+        self.assertEqual(self.post(None, path='/admin/'), 404)
+        self.assertEqual(self.passed, ['/admin/'])
+
+    def test_refuses_to_start_without_own_secret(self):
+        for secret in (None, '', 'change_me', 'short'):
+            with self.assertRaises(ValueError):
+                TelegramWebhook(None, secret=secret)
+
+
+class SqliteProfileTests(TransactionTestCase):
+    """Соединения бэкенда plants.sqlite получают прагмы профиля, а atomic сразу берет блокировку записи"""
+
+    def test_pragmas_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+
+    def test_atomic_takes_write_lock_up_front(self):
+        other = sqlite3.connect(connection.settings_dict['NAME'], timeout=0, isolation_level=None)
+        try:
+            with CaptureQueriesContext(connection) as queries, transaction.atomic():
+                # Ни одного запроса внутри блока, но писать другое соединение уже не может
+                with self.assertRaisesRegex(sqlite3.OperationalError, 'locked'):
+                    other.execute("BEGIN IMMEDIATE")
+                # Читать WAL не мешает
+                self.assertEqual(other.execute("SELECT COUNT(*) FROM plants_planting").fetchone()[0], 0)
+            self.assertEqual(queries.captured_queries[0]['sql'], 'BEGIN IMMEDIATE')
+            other.execute("BEGIN IMMEDIATE")
+            other.execute("COMMIT")
+        finally:
+            other.close()
+
+
+class PlantingIndexTests(TestCase):
+    """План SQLite для текущих посадок, пересчета статусов и фильтров админки называет нужный индекс"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cultures = seed_cultures()
+        seed_plantings(3000, cultures, farm=seed_farm("Большая ферма"))
+        cls.small_farm = seed_farm("Маленькая ферма")
+        seed_plantings(30, cultures, farm=cls.small_farm)
+        cls.culture = cultures[0]
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def assertUsesIndex(self, queryset, *indexes):
+        plan = queryset.explain()
+        self.assertTrue(any(index in plan for index in indexes), plan)
+
+    def test_current_plantings(self):
+        today = timezone.now().date()
+        self.assertUsesIndex(
+            Planting.objects.filter(harvest_date__gte=today).order_by('harvest_date'),
+            'planting_harvest_status_idx',
+        )
+
+    def test_farm_current_plantings(self):
+        today = timezone.now().date()
+        self.assertUsesIndex(
+            Planting.objects.filter(farm=self.small_farm, harvest_date__gte=today, archived=False)
+            .order_by('harvest_date', 'id'),
+            'planting_farm_harvest_idx',
+        )
+
+    def test_status_sweeps(self):
+        today = timezone.now().date()
+        self.assertUsesIndex(
+            Planting.objects.filter(sale_deadline__lte=today).exclude(status='expired').values('pk'),
+            'planting_deadline_status_idx',
+        )
+        self.assertUsesIndex(
+            Planting.objects.filter(harvest_date__lte=today, sale_deadline__gt=today)
+            .exclude(status='ready').values('pk'),
+            'planting_harvest_status_idx', 'planting_deadline_status_idx',
+        )
+
+    def test_admin_status_culture(self):
+        self.assertUsesIndex(
+            Planting.objects.filter(status='ready', culture=self.culture).values('pk'),
+            'planting_status_culture_idx',
+        )
+
+
+class CatalogTests(TestCase):
+    """Кэш каталога культур замечает правки другого процесса по версии таблицы"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.culture = seed_cultures(1)[0]
+
+    def setUp(self):
+        catalog.invalidate()
+
+    def test_foreign_edit_reloads_after_version_check(self):
+        self.assertEqual(catalog.get_culture(self.culture.id).grow_days, self.culture.grow_days)
+        # update() не шлет сигналов — так выглядит правка из админки в веб-процессе
+        Culture.all_objects.filter(pk=self.culture.pk).update(grow_days=self.culture.grow_days + 5)
+        search_version = catalog.version()
+
+        with mock.patch.object(catalog, 'VERSION_CHECK_INTERVAL', 3600):
+            self.assertEqual(catalog.get_culture(self.culture.id).grow_days, self.culture.grow_days)
+        with mock.patch.object(catalog, 'VERSION_CHECK_INTERVAL', 0):
+            self.assertEqual(catalog.get_culture(self.culture.id).grow_days, self.culture.grow_days + 5)
+        self.assertNotEqual(catalog.version(), search_version)
+
+    def test_reads_between_checks_skip_the_database(self):
+        catalog.warm()
+        with mock.patch.object(catalog, 'VERSION_CHECK_INTERVAL', 3600), \
+                CaptureQueriesContext(connection) as queries:
+            catalog.get_cultures()
+            catalog.get_culture(self.culture.id)
+        self.assertEqual(queries.captured_queries, [])
+
+        # Без изменений проверка стоит один запрос версии, каталог не перечитывается
+        with mock.patch.object(catalog, 'VERSION_CHECK_INTERVAL', 0), \
+                CaptureQueriesContext(connection) as queries:
+            catalog.get_culture(self.culture.id)
+        self.assertEqual(len(queries.captured_queries), 1)
+
+
+class SellRaceTests(TransactionTestCase):
+    """Одновременные продажи не уводят остаток в минус, а журнал и дневная сводка сходятся с проданным"""
+
+    def test_concurrent_sells_never_oversell(self):
+        planting = Planting.objects.create(
+            farm=seed_farm(), culture=seed_cultures(1)[0], quantity=100, plant_date=timezone.now().date(),
+        )
+
+        def sell(_):
+            try:
+                return sell_stock(planting.id, 7)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(sell, range(30)))
+
+        sold = sum(7 for result in results if result is not None)
+        remaining = Planting.objects.filter(pk=planting.id).values_list('quantity', flat=True).first()
+        self.assertEqual(sold, 98)
+        self.assertEqual(remaining, 2)
+        self.assertEqual(Sale.objects.aggregate(total=Sum('quantity'))['total'], sold)
+        self.assertEqual(DailySales.objects.aggregate(total=Sum('quantity'))['total'], sold)
+
+    def test_sell_more_than_stock_changes_nothing(self):
+        planting = Planting.objects.create(
+            farm=seed_farm(), culture=seed_cultures(1)[0], quantity=5, plant_date=timezone.now().date(),
+        )
+        self.assertIsNone(sell_stock(planting.id, 6))
+        self.assertEqual(sell_stock(planting.id, 5), 0)
+        # Проданная целиком посадка уходит в архив, журнал продаж остается
+        planting.refresh_from_db()
+        self.assertEqual((planting.quantity, planting.planted_quantity, planting.archived), (0, 5, True))
+        self.assertEqual(Sale.objects.get().quantity, 5)
+
+
+def weekly_stats():
+    return {
+        (row.week, row.culture_id): (row.planted, row.harvested, row.sold, row.expired)
+        for row in WeeklyStats.objects.all() if row.planted or row.harvested or row.sold or row.expired
+    }
+
+
+class WeeklyStatsTests(TestCase):
+    """Недельные итоги после продаж, правок и удалений совпадают с пересчетом stats.rebuild()"""
+
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.farm = seed_farm()
+        self.culture = seed_cultures(1)[0]
+
+    def assertMatchesRebuild(self):
+        incremental = weekly_stats()
+        stats.rebuild()
+        self.assertEqual(incremental, weekly_stats())
+        return incremental
+
+    def planted(self):
+        return sum(row[0] for row in weekly_stats().values())
+
+    def test_partial_sale_then_edit_then_delete(self):
+        planting = Planting.objects.create(
+            farm=self.farm, culture=self.culture, quantity=100, plant_date=self.today - timedelta(days=20),
+        )
+        sell_stock(planting.id, 40)
+        self.assertEqual(self.planted(), 100)
+
+        # Перенос даты посадки уносит в другую неделю все 100 лотков, а не остаток
+        planting.refresh_from_db()
+        planting.plant_date = self.today - timedelta(days=60)
+        planting.save()
+        totals = self.assertMatchesRebuild()
+        old_week = stats.week_start(self.today - timedelta(days=20))
+        self.assertEqual(totals.get((old_week, self.culture.id), (0,))[0], 0)
+        self.assertEqual(self.planted(), 100)
+
+        # Поправка количества сдвигает и "посажено"
+        set_quantity(planting.id, 50)
+        self.assertMatchesRebuild()
+        self.assertEqual(self.planted(), 90)
+
+        Planting.objects.get(pk=planting.id).delete()
+        totals = self.assertMatchesRebuild()
+        self.assertEqual(self.planted(), 0)
+        self.assertEqual(sum(row[2] for row in totals.values()), 40)
+
+    def test_sold_out_and_expired_sales(self):
+        fresh = Planting.objects.create(farm=self.farm, culture=self.culture, quantity=10, plant_date=self.today)
+        stale = Planting.objects.create(
+            farm=self.farm, culture=self.culture, quantity=10, plant_date=self.today - timedelta(days=90),
+        )
+        self.assertEqual(stale.status, 'expired')
+        sell_stock(fresh.id, 10)
+        sell_stock(stale.id, 4)
+        totals = self.assertMatchesRebuild()
+        self.assertEqual(self.planted(), 20)
+        self.assertEqual(sum(row[3] for row in totals.values()), 6)
+
+
+def notifier_planting(planting_id, farm_id, harvest_date, sale_deadline, quantity=10):
+    return SimpleNamespace(
+        id=planting_id, farm_id=farm_id, quantity=quantity, harvest_date=harvest_date,
+        sale_deadline=sale_deadline, culture=SimpleNamespace(name=f"Культура {planting_id}"),
+    )
+
+
+class HarvestNotifierTests(SimpleTestCase):
+    """Одно задание в очереди на ближайшее событие, сводки по фермам и забытые или перенесенные посадки"""
+
+    def setUp(self):
+        self.start = timezone.now()
+        self.today = timezone.localdate(self.start)
+        self.queue = FakeJobQueue(self.start)
+        self.sent = []
+
+        async def send(chat_id, text):
+            self.sent.append((self.queue.now, chat_id, text))
+
+        async def get_chats():
+            return {1: [100], 2: [200]}
+
+        self.notifier = HarvestNotifier(self.queue, send, get_chats, clock=self.queue)
+
+    def days(self, count):
+        return self.today + timedelta(days=count)
+
+    def test_single_job_and_summaries_per_farm(self):
+        self.notifier.load([
+            notifier_planting(1, 1, self.days(2), self.days(5)),
+            notifier_planting(2, 2, self.days(2), self.days(6)),
+            notifier_planting(3, 1, self.days(3), self.days(7)),
+        ])
+        self.assertEqual(len(self.queue.active()), 1)
+        self.assertEqual(self.queue.active()[0].when, self.notifier.event_time(self.days(2)))
+
+        asyncio.run(self.queue.advance(self.start + timedelta(days=2, hours=12)))
+        # Одна сводка на чат, и только о посадках своей фермы
+        self.assertEqual([chat_id for _, chat_id, _ in self.sent], [100, 200])
+        first, second = self.sent[0][2], self.sent[1][2]
+        self.assertIn("ID 1:", first)
+        self.assertNotIn("ID 2:", first)
+        self.assertIn("ID 2:", second)
+        self.assertEqual(len(self.queue.active()), 1)
+
+    def test_forgotten_and_moved_plantings(self):
+        self.notifier.load([
+            notifier_planting(1, 1, self.days(2), self.days(5)),
+            notifier_planting(2, 1, self.days(2), self.days(5)),
+        ])
+        self.notifier.forget(1)
+        # Новые даты: событие по старым датам устарело
+        self.notifier.track(notifier_planting(2, 1, self.days(4), self.days(8)))
+
+        asyncio.run(self.queue.advance(self.start + timedelta(days=3, hours=12)))
+        self.assertEqual(self.sent, [])
+        asyncio.run(self.queue.advance(self.start + timedelta(days=30)))
+        texts = [text for _, _, text in self.sent]
+        self.assertEqual(len(texts), 2)
+        self.assertTrue(all("ID 1:" not in text for text in texts))
+        # После срока продажи посадка больше не отслеживается
+        self.assertEqual(self.notifier.versions, {})
+        self.assertEqual(self.notifier.plantings, {})
+
+
+class PlantingAdminTests(TestCase):
+    """Точное и закэшированное количество строк списка посадок, последняя страница и действие «продано»"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.farm = seed_farm()
+        seed_plantings(450, seed_cultures(), history_days=30, farm=cls.farm)
+        # Дыры в ID после удаленных посадок
+        Planting.objects.filter(id__in=Planting.objects.values_list('id', flat=True)[50:200]).delete()
+        users = get_user_model().objects
+        cls.admin = users.create_superuser('admin', 'admin@example.com', 'admin')
+        cls.staff = users.create_user('farmer', password='farmer', is_staff=True)
+        cls.staff.user_permissions.add(*Permission.objects.filter(codename__in=('view_planting', 'change_planting')))
+        FarmMember.objects.create(farm=cls.farm, user=cls.staff, role='admin')
+
+    def setUp(self):
+        plants_admin._counts.clear()
+        self.changelist = reverse('admin:plants_planting_changelist')
+
+    def test_count_is_exact_and_last_page_has_rows(self):
+        self.client.force_login(self.admin)
+        cl = self.client.get(self.changelist).context['cl']
+        self.assertEqual(cl.result_count, 300)
+        last = self.client.get(f"{self.changelist}?p={cl.paginator.num_pages}").context['cl']
+        self.assertEqual(len(last.result_list), 300 - (cl.paginator.num_pages - 1) * cl.list_per_page)
+
+    def test_count_is_cached_for_farm_staff(self):
+        self.client.force_login(self.staff)
+        self.client.get(self.changelist)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"{self.changelist}?p=2&o=1")
+        self.assertEqual(response.context['cl'].result_count, 300)
+        self.assertFalse([q for q in queries.captured_queries if 'COUNT(' in q['sql'].upper()])
+
+    def test_mark_sold_matches_bot_sale(self):
+        self.client.force_login(self.admin)
+        plantings = list(Planting.objects.filter(quantity__gt=0).order_by('id')[:3])
+        sold_out = plantings.pop()
+        sell_stock(sold_out.id, sold_out.quantity)
+        response = self.client.post(self.changelist, {
+            'action': 'mark_sold', '_selected_action': [p.id for p in plantings + [sold_out]],
+        }, follow=True)
+        # Уже проданная в боте посадка не считается второй раз
+        self.assertEqual([str(m) for m in response.context['messages']], ["Отмечено проданными: 2"])
+        self.assertEqual(Sale.objects.aggregate(total=Sum('quantity'))['total'],
+                         sum(p.quantity for p in plantings) + sold_out.quantity)
+        # Состояние то же, что после продажи всего остатка в боте
+        self.assertEqual(
+            set(Planting.objects.filter(id__in=[p.id for p in plantings + [sold_out]])
+                .values_list('quantity', 'archived')),
+            {(0, True)},
+        )
+
+
+class PlantingsPageTests(TestCase):
+    """Страница посадок: условные GET по версиям данных и keyset-пагинация"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.farm = seed_farm()
+        seed_plantings(130, seed_cultures(), history_days=60, farm=cls.farm)
+        # Старые посадки без даты созревания видны только на ?all=1 и не помещаются на одну страницу
+        Planting.objects.filter(id__in=Planting.objects.values_list('id', flat=True)[:60]).update(harvest_date=None)
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.url = reverse('plants:current_plantings')
+
+    def test_unchanged_page_answers_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        # У другой страницы списка свой ETag
+        self.assertNotEqual(self.client.get(self.url, {'all': '1'})['ETag'], etag)
+
+        Planting.objects.filter(pk=Planting.objects.first().pk).update(quantity=1)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def walk(self, params):
+        ids, cursor = [], None
+        while True:
+            response = self.client.get(self.url, {**params, **({'after': cursor} if cursor else {})})
+            self.assertEqual(response.status_code, 200)
+            ids += [p.id for p in response.context['plantings']]
+            cursor = response.context['next_cursor']
+            if cursor is None:
+                return ids
+
+    def test_keyset_pages_cover_all_rows_once(self):
+        ids = self.walk({'all': '1'})
+        expected = list(
+            Planting.objects.order_by(F('harvest_date').asc(nulls_first=True), 'id').values_list('id', flat=True)
+        )
+        self.assertEqual(len(expected), 130)
+        self.assertEqual(ids, expected)
+
+        current = self.walk({})
+        self.assertEqual(current, list(
+            Planting.objects.filter(harvest_date__gte=timezone.now().date(), archived=False)
+            .order_by('harvest_date', 'id').values_list('id', flat=True)
+        ))
+
+    def test_bad_cursor_shows_first_page(self):
+        first = self.client.get(self.url, {'all': '1'}).context['plantings']
+        response = self.client.get(self.url, {'all': '1', 'after': 'вчера_5'})
+        self.assertEqual(list(response.context['plantings']), list(first))
+
+
+class TenancyTests(TestCase):
+    """Слой данных, каталог и админка внутри фермы не читают и не меняют чужие посадки и культуры"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shared = seed_cultures(2)
+        cls.farm_a, cls.farm_b = seed_farm("Ферма А"), seed_farm("Ферма Б")
+        cls.own_b = Culture.all_objects.create(name="Своя культура Б", grow_days=7, expire_days=3, farm=cls.farm_b)
+        seed_plantings(20, cls.shared, history_days=5, farm=cls.farm_a)
+        seed_plantings(20, cls.shared + [cls.own_b], history_days=5, farm=cls.farm_b)
+        cls.foreign = Planting.objects.filter(farm=cls.farm_b).first()
+
+    def setUp(self):
+        catalog.invalidate()
+        farms.invalidate()
+
+    def test_data_layer_sees_only_own_farm(self):
+        with tenancy.scope(self.farm_a.id):
+            self.assertEqual(set(Planting.objects.values_list('farm_id', flat=True)), {self.farm_a.id})
+            self.assertIsNone(repository.get_planting.__wrapped__(self.foreign.id))
+            self.assertEqual(repository.sell.__wrapped__(self.foreign.id, 1), (None, None))
+            self.assertFalse(repository.set_quantity.__wrapped__(self.foreign.id, 1))
+            self.assertIsNone(repository.delete_planting.__wrapped__(self.foreign.id))
+            self.assertIsNone(catalog.get_culture(self.own_b.id))
+            self.assertEqual({c.id for c in catalog.get_cultures()}, {c.id for c in self.shared})
+        quantity = self.foreign.quantity
+        self.foreign.refresh_from_db()
+        self.assertEqual(self.foreign.quantity, quantity)
+
+    def test_admin_staff_sees_own_rows_and_cannot_edit_shared(self):
+        user = get_user_model().objects.create_user('farmer', password='farmer', is_staff=True)
+        FarmMember.objects.create(farm=self.farm_a, user=user, role='admin')
+        request = RequestFactory().get('/')
+        request.user = user
+        self.assertFalse(admin.site._registry[Planting].get_queryset(request).exclude(farm=self.farm_a).exists())
+        culture_admin = admin.site._registry[Culture]
+        self.assertNotIn(self.own_b, culture_admin.get_queryset(request))
+        self.assertFalse(culture_admin.has_change_permission(request, self.shared[0]))
+        self.assertFalse(culture_admin.has_delete_permission(request, self.shared[0]))
+
+    def test_admin_staff_cannot_create_shared_culture(self):
+        user = get_user_model().objects.create_user('farmer', password='farmer', is_staff=True)
+        user.user_permissions.add(*Permission.objects.filter(codename__in=('add_culture', 'view_culture')))
+        FarmMember.objects.create(farm=self.farm_a, user=user, role='admin')
+        self.client.force_login(user)
+        add_url = reverse('admin:plants_culture_add')
+        form = {'name': "Новая культура", 'grow_days': 7, 'expire_days': 3, 'grams_per_tray': 0,
+                'press_weight': '0.5', 'germination_days': 3, 'light_days': 5}
+
+        # Без фермы форма не проходит: общая культура стала бы видна всем фермам
+        response = self.client.post(add_url, {**form, 'farm': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('farm', response.context['adminform'].form.errors)
+        self.assertFalse(Culture.all_objects.filter(name="Новая культура").exists())
+
+        response = self.client.post(add_url, {**form, 'farm': self.farm_a.id})
+        self.assertEqual(response.status_code, 302)
+        created = Culture.all_objects.get(name="Новая культура")
+        self.assertEqual(created.farm_id, self.farm_a.id)
+        with tenancy.scope(self.farm_b.id):
+            self.assertFalse(Culture.objects.filter(pk=created.pk).exists())
+
+    def test_first_chat_adopts_existing_farm(self):
+        # Установка без участников: первый чат получает ферму с данными, следующий — новую
+        first = farms.membership(101)
+        second = farms.membership(202, "Другая")
+        self.assertEqual((first.farm_id, first.role), (self.farm_a.id, 'admin'))
+        self.assertNotIn(second.farm_id, (self.farm_a.id, self.farm_b.id))
+
+
+class TenancyPoolTests(TransactionTestCase):
+    """Ферма передается в поток пула: соединение потока видит только зафиксированные данные"""
+
+    def test_scope_reaches_db_pool(self):
+        cultures = seed_cultures(2)
+        farm_a, farm_b = seed_farm("Ферма А"), seed_farm("Ферма Б")
+        seed_plantings(20, cultures, history_days=5, farm=farm_a)
+        seed_plantings(20, cultures, history_days=5, farm=farm_b)
+
+        async def current():
+            with tenancy.scope(farm_a.id):
+                return await repository.get_current_plantings()
+
+        try:
+            plantings = asyncio.run(current())
+        finally:
+            repository.shutdown()
+        self.assertTrue(plantings)
+        self.assertEqual({p.farm_id for p in plantings}, {farm_a.id})
+
+
+class PersistenceTests(TransactionTestCase):
+    """Сброс буфера пишет копии user_data и шагов диалогов, удаления доходят до базы, новый экземпляр читает то же"""
+
+    def tearDown(self):
+        repository.shutdown()
+
+    def test_round_trip(self):
+        async def scenario():
+            persistence = DjangoPersistence(update_interval=3600)
+            data = {'culture_id': 5, 'history': [1, 2]}
+            await persistence.update_user_data(1, data)
+            await persistence.update_user_data(2, {'culture_id': 6})
+            await persistence.update_conversation('new', (1, 1), 2)
+            await persistence.update_conversation('new', (2, 2), 3)
+            # В буфере копия: правка после передачи не попадает в эту пачку
+            data['history'].append(3)
+            await persistence.flush()
+            await persistence.drop_user_data(2)
+            await persistence.update_conversation('new', (2, 2), None)
+            await persistence.flush()
+
+            restarted = DjangoPersistence(update_interval=3600)
+            return await restarted.get_user_data(), await restarted.get_conversations('new')
+
+        user_data, conversations = asyncio.run(scenario())
+        self.assertEqual(user_data, {1: {'culture_id': 5, 'history': [1, 2]}})
+        self.assertEqual(conversations, {(1, 1): 2})
+        self.assertEqual(BotState.objects.count(), 2)
+
+
+# Импорт бота в чистом процессе: какие настройки и модули загружены к первому обновлению
+STARTUP_PROBE = '''
+import json, sys
+import telegram_bot
+from django.conf import settings
+print(json.dumps({
+    'settings': settings.SETTINGS_MODULE,
+    'admin': 'django.contrib.admin' in settings.INSTALLED_APPS,
+    'numpy': 'numpy' in sys.modules,
+}))
+'''
+
+
+# Запас к бюджетам времени: машины CI медленнее и заняты параллельными задачами
+CI_MARGIN = 3
+
+
+class StartupTests(TransactionTestCase):
+    """Бот грузит настройки без админки и numpy, укладывается в бюджет запуска и отвечает из прогретых кэшей"""
+
+    def tearDown(self):
+        repository.shutdown()
+
+    def test_polling_profile_is_slim(self):
+        env = {key: value for key, value in os.environ.items() if key not in ('DJANGO_SETTINGS_MODULE', 'BOT_MODE')}
+        env['TELEGRAM_BOT_TOKEN'] = STUB_TOKEN
+        output = subprocess.run(
+            [sys.executable, '-c', STARTUP_PROBE], cwd=settings.BASE_DIR, env=env,
+            capture_output=True, text=True, check=True,
+        ).stdout
+        loaded = json.loads(output.splitlines()[-1])
+        self.assertEqual(loaded, {'settings': 'zelen_pro.settings_bot', 'admin': False, 'numpy': False})
+
+    def test_first_update_within_budget(self):
+        farm = seed_farm()
+        seed_plantings(500, seed_cultures(), history_days=30, farm=farm)
+        FarmMember.objects.create(farm=farm, chat_id=benchmark_startup.CHAT_ID, role='admin')
+
+        run = benchmark_startup.probe('zelen_pro.settings_bot', str(settings.DATABASES['default']['NAME']))
+        self.assertFalse(run['numpy_loaded'])
+        self.assertLess(run['total_ms'], benchmark_startup.BUDGET_MS * CI_MARGIN)
+
+    def test_prewarm_fills_caches(self):
+        farm = seed_farm()
+        seed_cultures(3)
+        FarmMember.objects.create(farm=farm, chat_id=1, role='admin')
+        catalog.invalidate()
+        farms.invalidate()
+
+        application = build_stub_application()
+        import telegram_bot
+        asyncio.run(telegram_bot.prewarm(application))
+        # Первое обновление после перезапуска не ходит в базу за каталогом и фермой чата
+        with CaptureQueriesContext(connection) as queries:
+            member = farms.membership(1)
+            cultures = catalog.get_cultures()
+        self.assertEqual(member.farm_id, farm.id)
+        self.assertEqual(len(cultures), 3)
+        self.assertEqual(queries.captured_queries, [])
+
+
+class SearchTests(TestCase):
+    """Inline-поиск находит культуры и посадки только своей фермы, идет по индексу и дописывает кэш при наборе"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.farm, cls.other = seed_farm("Ферма"), seed_farm("Другая ферма")
+        cls.basil = Culture.objects.create(name="Базилик", grow_days=10, expire_days=5)
+        cls.chard = Culture.objects.create(name="Мангольд", grow_days=10, expire_days=5)
+        cls.foreign_basil = Culture.all_objects.create(name="Базилик лимонный", grow_days=10, expire_days=5,
+                                                       farm=cls.other)
+        today = timezone.now().date()
+        cls.planting = Planting.objects.create(farm=cls.farm, culture=cls.basil, quantity=5, plant_date=today)
+        cls.foreign = Planting.objects.create(farm=cls.other, culture=cls.basil, quantity=5, plant_date=today)
+
+    def setUp(self):
+        search.clear()
+        catalog.invalidate()
+
+    def test_prefix_query_uses_search_name_index(self):
+        with tenancy.scope(self.farm.id):
+            queryset = Culture.objects.filter(search_name__gte='баз', search_name__lt='баз' + search.PREFIX_END)
+            self.assertIn('culture_farm_search_name_idx', queryset.explain())
+
+    def test_prefix_search_within_farm(self):
+        with tenancy.scope(self.farm.id):
+            result, cached = search.search("БАЗ")
+        self.assertFalse(cached)
+        self.assertEqual(result.cultures, [self.basil])
+        self.assertEqual(result.plantings, [self.planting])
+
+    def test_typing_narrows_cached_result(self):
+        with tenancy.scope(self.farm.id):
+            search.search("ба")
+            narrowed, cached = search.search("базил")
+            fresh = search.find(normalize_name("базил"), timezone.now().date())
+        self.assertTrue(cached)
+        self.assertEqual((narrowed.cultures, narrowed.plantings), (fresh.cultures, fresh.plantings))
+
+    def test_planting_id_search_stays_in_farm(self):
+        with tenancy.scope(self.farm.id):
+            own, _ = search.search(f"#{self.planting.id}")
+            foreign, _ = search.search(str(self.foreign.id))
+        self.assertEqual(own.plantings, [self.planting])
+        self.assertEqual(foreign.plantings, [])
+
+    def test_catalog_change_invalidates_results(self):
+        with tenancy.scope(self.farm.id):
+            search.search("ман")
+            Culture.objects.create(name="Манго", grow_days=10, expire_days=5)
+            result, cached = search.search("ман")
+        self.assertFalse(cached)
+        self.assertEqual([c.name for c in result.cultures], ["Манго", "Мангольд"])
+
+
+# benchmark_search меряет на 100 000 посадок; тест берет десятую часть и такую же долю бюджета
+SEARCH_ROWS = 10_000
+SEARCH_BUDGET_MS = benchmark_search.BUDGET_MS * SEARCH_ROWS / 100_000 * CI_MARGIN
+
+
+class SearchLatencyTests(TestCase):
+    """p95 inline-поиска без кэша по всем началам названий укладывается в бюджет"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.farm = seed_farm()
+        seed_plantings(SEARCH_ROWS, benchmark_search.seed_catalog(), farm=cls.farm)
+
+    def setUp(self):
+        catalog.invalidate()
+
+    def test_cold_queries_within_budget(self):
+        with tenancy.scope(self.farm.id):
+            samples = benchmark_search.cold(benchmark_search.prefix_queries())
+        self.assertLess(percentile(samples, 0.95), SEARCH_BUDGET_MS)
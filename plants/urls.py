@@ -14,6 +14,8 @@ urlpatterns = [
 app_name = 'plants'
 urlpatterns = [
     path('current/', views.current_plantings, name='current_plantings'),
+    path('stats/', views.stats_report, name='stats_report'),
+    path('export/<slug:kind>.<slug:fmt>', views.export_data, name='export'),
 
     # УДАЛИТЕ ЭТУ СТРОКУ:
     # path('admin/', admin.site.urls),  ← Это должно быть только в zelen_pro/urls.py
@@ -0,0 +1,80 @@
+"""Версии таблиц (DataVersion) для ETag страниц и кэша сводки.
+
+Раньше версию увеличивали триггеры FOR EACH ROW: массовое обновление
+тысячи посадок давало тысячу лишних UPDATE счетчика. Теперь каждое
+соединение получает execute_wrapper, который после INSERT, UPDATE или
+DELETE в отслеживаемую таблицу увеличивает ее версию один раз на
+выражение (bulk_create и update() — тоже одно выражение). Внутри
+transaction.atomic версия растет в той же транзакции; вне ее — сразу
+после записи (оборачивать в atomic нельзя: INSERT ... RETURNING еще не
+прочитан, и COMMIT не пройдет).
+Запись в базу в обход Django (sqlite3 из консоли) версию не меняет.
+"""
+import re
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .models import Culture, DataVersion, Planting, WeeklyStats
+
+TRACKED_MODELS = [Planting, Culture, WeeklyStats]
+TRACKED_TABLES = {model._meta.db_table for model in TRACKED_MODELS}
+
+WRITE_RE = re.compile(r'^\s*(?:INSERT\s+(?:OR\s+\w+\s+)?INTO|UPDATE|DELETE\s+FROM)\s+"?(\w+)"?', re.IGNORECASE)
+
+
+def written_table(sql):
+    """Отслеживаемая таблица, в которую пишет выражение, или None"""
+    match = WRITE_RE.match(sql)
+    if match and match.group(1) in TRACKED_TABLES:
+        return match.group(1)
+    return None
+
+
+def bump(connection, table):
+    # Отдельный курсор: у курсора записи остаются lastrowid и строки RETURNING
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {DataVersion._meta.db_table} SET version = version + 1, "
+            f"changed_at = strftime('%%Y-%%m-%%d %%H:%%M:%%f', 'now') WHERE name = %s",
+            [table],
+        )
+
+
+def track_writes(execute, sql, params, many, context):
+    """execute_wrapper: увеличивает версию таблицы после записи в нее"""
+    table = written_table(sql)
+    if table is None:
+        return execute(sql, params, many, context)
+    result = execute(sql, params, many, context)
+    bump(context['connection'], table)
+    return result
+
+
+def attach(sender, connection, **kwargs):
+    """Подключает track_writes к новому соединению (один раз на объект соединения)"""
+    if track_writes not in connection.execute_wrappers:
+        connection.execute_wrappers.append(track_writes)
+
+
+def install():
+    """Отслеживает запись на всех соединениях, в том числе будущих"""
+    connection_created.connect(attach, dispatch_uid='data_versions')
+    for connection in connections.all(initialized_only=True):
+        attach(None, connection)
+
+
+def ensure_versions(connection):
+    """Создает строки DataVersion для отслеживаемых таблиц (после каждого migrate)"""
+    if connection.vendor != 'sqlite':
+        return
+    version_table = DataVersion._meta.db_table
+    if version_table not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        for table in sorted(TRACKED_TABLES):
+            cursor.execute(
+                f"INSERT OR IGNORE INTO {version_table} (name, version, changed_at) "
+                f"VALUES (%s, 0, strftime('%%Y-%%m-%%d %%H:%%M:%%f', 'now'))",
+                [table],
+            )
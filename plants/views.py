@@ -1,9 +1,187 @@
+import functools
+import hmac
+import os
+import time
+from datetime import date, datetime, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.db.models import F, Q
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import render, redirect
-from .models import Planting
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from . import export, farms, metrics, stats, tenancy
+from .models import Culture, DataVersion, Planting
+
+# Если задан, /metrics требует заголовок «Authorization: Bearer <токен>»
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+PAGE_SIZE = 50
+STATS_DEFAULT_WEEKS = 13
+STATS_MAX_WEEKS = 520
+
 
 def home(request):
     return redirect('plants:current_plantings')
 
+
+def metrics_view(request):
+    """Метрики в формате Prometheus: этого процесса и выгруженные ботом"""
+    if METRICS_TOKEN and not hmac.compare_digest(
+        request.headers.get('Authorization', ''), f"Bearer {METRICS_TOKEN}"
+    ):
+        raise PermissionDenied
+    body = metrics.render()
+    # В режиме webhook бот работает в этом же процессе и файл не нужен
+    if os.getenv('BOT_MODE') != 'webhook':
+        body += metrics.exported()
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def farm_scoped(view):
+    """Страница видит только данные фермы пользователя; суперпользователь без фермы — все фермы"""
+    @login_required(login_url='admin:login')
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        farm_id = farms.farm_for_user(request.user)
+        if farm_id is None and not request.user.is_superuser:
+            raise PermissionDenied
+        with tenancy.scope(farm_id):
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+def data_versions(request):
+    """Версии таблиц посадок и культур (один запрос на запрос страницы)"""
+    if not hasattr(request, '_data_versions'):
+        tables = [Planting._meta.db_table, Culture._meta.db_table]
+        request._data_versions = list(DataVersion.objects.filter(name__in=tables).order_by('name'))
+    return request._data_versions
+
+
+def plantings_etag(request, *args, **kwargs):
+    versions = data_versions(request)
+    if not versions:
+        return None
+    # Версии таблиц общие для всех ферм, поэтому ферма входит в ETag; список
+    # активных посадок меняется и в полночь без записи в базу, поэтому и дата
+    parts = [
+        str(tenancy.current_farm_id()),
+        timezone.now().date().isoformat(),
+        request.GET.get('all', ''),
+        request.GET.get('after', ''),
+        *(str(v.version) for v in versions),
+    ]
+    return '-'.join(parts)
+
+
+def plantings_last_modified(request, *args, **kwargs):
+    versions = data_versions(request)
+    changed_at = max((v.changed_at for v in versions), default=None)
+    if changed_at is None:
+        return None
+    # С началом дня (той же даты, что фильтр страницы) список меняется, даже если посадки не трогали
+    start_of_day = datetime.combine(timezone.now().date(), datetime.min.time(), tzinfo=dt_timezone.utc)
+    return max(changed_at, start_of_day)
+
+
+# Дата созревания в курсоре у посадок без нее (в сортировке они идут первыми)
+NO_DATE = 'none'
+
+
+def parse_cursor(value):
+    """Курсор вида 2025-02-10_15 или none_15 -> (дата созревания или None, id) или None"""
+    try:
+        day, planting_id = value.split('_')
+        return (None if day == NO_DATE else date.fromisoformat(day)), int(planting_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def make_cursor(planting):
+    day = planting.harvest_date.isoformat() if planting.harvest_date else NO_DATE
+    return f"{day}_{planting.id}"
+
+
+@farm_scoped
+@condition(etag_func=plantings_etag, last_modified_func=plantings_last_modified)
 def current_plantings(request):
-    plantings = Planting.objects.all().order_by('harvest_date')
-    return render(request, 'plants/current_plantings.html', {'plantings': plantings})
\ No newline at end of file
+    show_all = request.GET.get('all') == '1'
+    plantings = Planting.objects.select_related('culture').order_by(F('harvest_date').asc(nulls_first=True), 'id')
+    if not show_all:
+        plantings = plantings.filter(harvest_date__gte=timezone.now().date(), archived=False)
+
+    # Keyset-пагинация: следующая страница начинается после последней пары (дата, id)
+    cursor = parse_cursor(request.GET.get('after'))
+    if cursor:
+        harvest_date, planting_id = cursor
+        if harvest_date is None:
+            after = Q(harvest_date__isnull=True, id__gt=planting_id) | Q(harvest_date__isnull=False)
+        else:
+            after = Q(harvest_date__gt=harvest_date) | Q(harvest_date=harvest_date, id__gt=planting_id)
+        plantings = plantings.filter(after)
+
+    page = list(plantings[:PAGE_SIZE + 1])
+    next_cursor = None
+    if len(page) > PAGE_SIZE:
+        page = page[:PAGE_SIZE]
+        next_cursor = make_cursor(page[-1])
+
+    return render(request, 'plants/current_plantings.html', {
+        'plantings': page,
+        'show_all': show_all,
+        'is_first_page': cursor is None,
+        'next_cursor': next_cursor,
+    })
+
+
+@farm_scoped
+def stats_report(request):
+    """Посадки, урожай, продажи и списания по культурам и неделям из недельной сводки"""
+    try:
+        weeks = min(max(int(request.GET.get('weeks', STATS_DEFAULT_WEEKS)), 1), STATS_MAX_WEEKS)
+    except ValueError:
+        weeks = STATS_DEFAULT_WEEKS
+
+    started = time.perf_counter()
+    by_culture, by_week, cached = stats.cached_report(weeks)
+    return render(request, 'plants/stats.html', {
+        'weeks': weeks,
+        'by_culture': by_culture,
+        'by_week': by_week,
+        'cached': cached,
+        'elapsed_ms': (time.perf_counter() - started) * 1000,
+    })
+
+
+async def async_chunks(chunks):
+    """Куски выгрузки для ASGI: синхронный итератор Django собрал бы здесь целиком в память"""
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while (chunk := await next_chunk(chunks, None)) is not None:
+        yield chunk
+
+
+@farm_scoped
+def export_data(request, kind, fmt):
+    """Потоковая выгрузка посадок или журнала продаж фермы в CSV/XLSX.
+
+    Фильтры: ?from=ГГГГ-ММ-ДД&to=ГГГГ-ММ-ДД&culture=<id или название>&status=<статус посадки>
+    """
+    if kind not in export.SOURCES or fmt not in export.FORMATS:
+        raise Http404
+    try:
+        filters = export.parse_filters(request.GET)
+    except export.ExportError as e:
+        return HttpResponseBadRequest(str(e))
+
+    # Запрос к базе строится здесь, внутри фильтра фермы, а читается по мере отправки
+    chunks = export.chunks(kind, fmt, filters)
+    if isinstance(request, ASGIRequest):
+        chunks = async_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=export.CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{export.filename(kind, fmt, filters)}"'
+    return response
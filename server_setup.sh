@@ -47,7 +47,7 @@ WorkingDirectory=/home/botgrover/BotGrover
 Environment=TELEGRAM_BOT_TOKEN=${TELEGRAM_BOT_TOKEN}
 ExecStart=/home/botgrover/BotGrover/venv/bin/python telegram_bot.py
 Restart=always
-RestartSec=10
+RestartSec=3
 
 [Install]
 WantedBy=multi-user.target
@@ -1,6 +1,11 @@
+import asyncio
 import os
+import time
 import django
-from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import (
+    Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup,
+    InlineQueryResultArticle, InputTextMessageContent
+)
 from telegram.ext import (
     Application, 
     CommandHandler, 
@@ -8,21 +13,30 @@ from telegram.ext import (
     filters, 
     ConversationHandler, 
     ContextTypes,
-    CallbackQueryHandler
+    CallbackQueryHandler,
+    InlineQueryHandler,
+    TypeHandler
 )
-from asgiref.sync import sync_to_async
 from django.utils import timezone
-from datetime import datetime
 from dotenv import load_dotenv
 
 # Загрузка переменных окружения из .env файла
 load_dotenv()
 
-# Инициализация Django
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "zelen_pro.settings")
+# Инициализация Django: в режиме polling боту хватает ORM и plants,
+# в режиме webhook в том же процессе работает сайт
+os.environ.setdefault(
+    "DJANGO_SETTINGS_MODULE",
+    "zelen_pro.settings" if os.getenv('BOT_MODE') == 'webhook' else "zelen_pro.settings_bot"
+)
 django.setup()
 
-from plants.models import Planting, Culture
+from plants import export, metrics, repository, search, tenancy
+from telegram_dashboard import DASHBOARD_DAYS, STATE_KIND as DASHBOARD_STATE, Dashboard
+from telegram_notifications import HarvestNotifier
+import telegram_metrics
+from telegram_outbox import OutboundScheduler
+from telegram_persistence import DjangoPersistence
 
 # Состояния для диалога создания посадки
 CULTURE, QUANTITY = range(2)
@@ -30,45 +44,120 @@ CULTURE, QUANTITY = range(2)
 # Состояния для диалога изменения посадки
 EDIT_QUANTITY = 0
 
+# Ограничения Telegram и параметры постраничного вывода /current
+MESSAGE_LIMIT = 4096
+PAGE_HEADER_RESERVE = 100
+PAGE_MAX_CARDS = 15
+SELECTOR_ROW_SIZE = 5
+
+# Массовое создание посадок
+BULK_USAGE = (
+    "Отправьте /bulk и на следующих строках посадки:\n"
+    "культура количество [дата посадки]\n\n"
+    "Пример:\n"
+    "/bulk\n"
+    "1 10\n"
+    "Горох 5\n"
+    "3 8 2025-02-01\n\n"
+    "Или пришлите CSV-файл со столбцами культура,количество[,дата]"
+)
+BULK_MAX_FILE_SIZE = 1024 * 1024
+
+# Выгрузка; больше 50 МБ бот отправить документом не может
+EXPORT_USAGE = (
+    "Используйте: `/export [plantings|sales] [csv|xlsx] [from=ГГГГ-ММ-ДД] [to=ГГГГ-ММ-ДД] "
+    "[culture=культура] [status=статус]`\n"
+    "Пример: `/export sales xlsx from=2025-01-01 culture=Горох`"
+)
+EXPORT_MAX_FILE_SIZE = 50 * 1024 * 1024
+
+# Периоды /stats в неделях
+STATS_PERIODS = {
+    'неделя': 1, 'week': 1,
+    'месяц': 4, 'month': 4,
+    'квартал': 13, 'quarter': 13,
+    'год': 52, 'year': 52,
+}
+STATS_DEFAULT_WEEKS = 4
+
+# План производства: горизонт по умолчанию и сколько дней посевов показывать
+PLAN_DEFAULT_DAYS = 28
+PLAN_MAX_DAYS = 365
+PLAN_SCHEDULE_DAYS = 7
+PLAN_USAGE = (
+    "Используйте: `/plan [дней]` — по средним продажам за 4 недели\n"
+    "или с недельным спросом на следующих строках:\n"
+    "`/plan 28`\n"
+    "`Горох 10`\n"
+    "`3 6`"
+)
+
+# Названия шагов диалогов в метриках
+CONVERSATION_STATES = {
+    'new_planting': {CULTURE: 'culture', QUANTITY: 'quantity'},
+    'edit_planting': {EDIT_QUANTITY: 'edit_quantity'},
+}
+
+# Как часто бот в режиме polling выгружает метрики в METRICS_FILE (в секундах)
+METRICS_EXPORT_INTERVAL = int(os.getenv('METRICS_EXPORT_INTERVAL', '15'))
+
+# Интервал пересчета статусов посадок (в секундах)
+STATUS_UPDATE_INTERVAL = int(os.getenv('STATUS_UPDATE_INTERVAL', '3600'))
+
+# Как часто бот обновляет статистику планировщика SQLite (PRAGMA optimize), в секундах
+SQLITE_OPTIMIZE_INTERVAL = int(os.getenv('SQLITE_OPTIMIZE_INTERVAL', '3600'))
+
+# Режим получения обновлений: polling или webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8000'))
+
+# Интервал полной пересборки очереди уведомлений (в секундах); изменения
+# из бота попадают в нее сразу, правки из админки — при пересборке
+NOTIFICATIONS_RESYNC_INTERVAL = int(os.getenv('NOTIFICATIONS_RESYNC_INTERVAL', '86400'))
+
+# Уведомления о сроках; создается в build_application
+notifier = None
+# Закрепленные сводки ферм; создается в build_application
+dashboard = None
+
 # Получение токена из переменных окружения
 TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 
 if not TOKEN:
     raise ValueError("Не найден токен бота. Где он?. Убедитесь, что в файле .env указана переменная TELEGRAM_BOT_TOKEN")
 
-@sync_to_async
-def get_available_cultures():
+async def get_available_cultures():
     """Получает список доступных культур"""
-    return list(Culture.objects.all().order_by('name'))
+    return await repository.get_cultures()
 
-@sync_to_async
-def get_culture_details(culture_id: int):
+async def get_culture_details(culture_id: int):
     """Получает детальную информацию о культуре"""
-    try:
-        culture = Culture.objects.get(id=culture_id)
-        return True, (
-            f"*{culture.name}*\n"
-            f"├ Срок созревания: {culture.grow_days} дней\n"
-            f"├ Срок годности: {culture.expire_days} дней\n"
-            f"├ Грамм на лоток: {culture.grams_per_tray} г\n"
-            f"├ Замачивание: {'Да' if culture.soaking_required else 'Нет'}\n"
-            f"├ Прижим: {culture.press_weight} кг\n"
-            f"├ Дней на прорастание: {culture.germination_days}\n"
-            f"└ Дней на свету: {culture.light_days}"
-        )
-    except Culture.DoesNotExist:
+    culture = await repository.get_culture(culture_id)
+    if culture is None:
         return False, "❌ Культура не найдена"
+    return True, (
+        f"*{culture.name}*\n"
+        f"├ Срок созревания: {culture.grow_days} дней\n"
+        f"├ Срок годности: {culture.expire_days} дней\n"
+        f"├ Грамм на лоток: {culture.grams_per_tray} г\n"
+        f"├ Замачивание: {'Да' if culture.soaking_required else 'Нет'}\n"
+        f"├ Прижим: {culture.press_weight} кг\n"
+        f"├ Дней на прорастание: {culture.germination_days}\n"
+        f"└ Дней на свету: {culture.light_days}"
+    )
 
-@sync_to_async
-def create_planting(culture_id: int, quantity: int):
+async def create_planting(culture_id: int, quantity: int):
     """Создает новую посадку"""
     try:
-        culture = Culture.objects.get(id=culture_id)
-        planting = Planting.objects.create(
-            culture=culture,
-            quantity=quantity,
-            plant_date=timezone.now().date()  # Используем только дату, без времени
-        )
+        culture = await repository.get_culture(culture_id)
+        if culture is None:
+            return False, "❌ Культура не найдена"
+        planting = await repository.create_planting(culture, quantity)
+        if notifier:
+            notifier.track(planting)
+        if dashboard:
+            dashboard.schedule(tenancy.current_farm_id())
         return True, (
             f"✅ Создана новая посадка:\n"
             f"Культура: {culture.name}\n"
@@ -80,51 +169,73 @@ def create_planting(culture_id: int, quantity: int):
     except Exception as e:
         return False, f"❌ Ошибка при создании посадки: {str(e)}"
 
-@sync_to_async
-def get_current_plantings():
+async def get_current_plantings():
     """Получает текущие активные посадки"""
-    today = timezone.now().date()  # Используем только дату, без времени
-    return list(
-        Planting.objects.filter(harvest_date__gte=today)
-        .order_by("harvest_date")
-        .select_related("culture")
-    )
+    return await repository.get_current_plantings()
 
-@sync_to_async
-def delete_planting(planting_id: int):
-    """Удаляет посадку"""
+async def delete_planting(planting_id: int, chat_id: int):
+    """Удаляет посадку; работникам фермы удаление недоступно"""
     try:
-        planting = Planting.objects.get(id=planting_id)
-        culture_name = planting.culture.name
-        planting.delete()
+        member = await repository.get_membership(chat_id)
+        if member.role == 'worker':
+            return False, "❌ Удалять посадки может только админ или менеджер фермы"
+        culture_name = await repository.delete_planting(planting_id)
+        if culture_name is None:
+            return False, "❌ Посадка не найдена"
+        if notifier:
+            notifier.forget(planting_id)
+        if dashboard:
+            dashboard.schedule(tenancy.current_farm_id())
         return True, f"✅ Посадка {planting_id} ({culture_name}) удалена"
-    except Planting.DoesNotExist:
-        return False, "❌ Посадка не найдена"
     except Exception as e:
         return False, f"❌ Ошибка при удалении: {str(e)}"
 
-@sync_to_async
-def edit_planting_quantity(planting_id: int, new_quantity: int):
+async def edit_planting_quantity(planting_id: int, new_quantity: int, old_quantity: int):
     """Изменяет количество растений в посадке"""
     try:
-        planting = Planting.objects.get(id=planting_id)
-        old_quantity = planting.quantity
-        planting.quantity = new_quantity
-        planting.save()
+        if not await repository.set_quantity(planting_id, new_quantity):
+            return False, "❌ Посадка не найдена"
+        if notifier:
+            notifier.update_quantity(planting_id, new_quantity)
+        if dashboard:
+            dashboard.schedule(tenancy.current_farm_id())
         return True, f"✅ Количество растений изменено с {old_quantity} на {new_quantity}"
-    except Planting.DoesNotExist:
-        return False, "❌ Посадка не найдена"
     except Exception as e:
         return False, f"❌ Ошибка при изменении: {str(e)}"
 
-@sync_to_async
-def get_planting_info(planting_id: int):
-    """Получает информацию о посадке"""
+async def create_bulk_plantings(rows, errors):
+    """Создает посадки пачкой и возвращает одно итоговое сообщение"""
+    if errors:
+        return False, "❌ Посадки не созданы, исправьте строки:\n" + "\n".join(errors[:20])
+    if not rows:
+        return False, BULK_USAGE
+
     try:
-        planting = Planting.objects.select_related('culture').get(id=planting_id)
-        return True, planting
-    except Planting.DoesNotExist:
-        return False, None
+        plantings = await repository.create_plantings(rows)
+    except Exception as e:
+        return False, f"❌ Ошибка при создании посадок: {str(e)}"
+
+    if notifier:
+        for planting in plantings:
+            notifier.track(planting)
+    if dashboard:
+        dashboard.schedule(tenancy.current_farm_id())
+
+    by_culture = {}
+    for p in plantings:
+        by_culture[p.culture.name] = by_culture.get(p.culture.name, 0) + p.quantity
+    lines = [f"├ {name}: {quantity} шт." for name, quantity in sorted(by_culture.items())]
+    lines[-1] = "└" + lines[-1][1:]
+    return True, (
+        f"✅ Создано посадок: {len(plantings)}\n"
+        + "\n".join(lines)
+        + f"\nБлижайшее созревание: {min(p.harvest_date for p in plantings)}"
+    )
+
+async def get_planting_info(planting_id: int):
+    """Получает информацию о посадке"""
+    planting = await repository.get_planting(planting_id)
+    return planting is not None, planting
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
@@ -134,103 +245,147 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/start - начать работу\n"
         "/current - текущие посадки\n"
         "/new - создать новую посадку\n"
+        "/bulk - создать несколько посадок\n"
         "/edit [ID] - изменить количество\n"
         "/delete [ID] - удалить посадку\n"
         "/sell [ID] [кол-во] - продать растения\n"
+        "/sales [дней] - итоги продаж\n"
+        "/stats [период] - статистика по неделям\n"
+        "/plan [дней] - план посевов\n"
+        "/export - выгрузка в CSV/XLSX\n"
+        "/farm - ферма и участники\n"
+        "/join [код] - присоединиться к ферме\n"
+        "/notify - уведомления о сроках\n"
+        "/dashboard - закрепленная сводка фермы\n"
+        "@бот [культура] - поиск посадок в любом чате\n"
         "/help - справка",
         parse_mode="Markdown"
     )
 
+def format_planting_card(p, today):
+    """Формирует карточку посадки для списка"""
+    days_left = max((p.harvest_date - today).days, 0)
+    sale_deadline = p.sale_deadline.strftime("%Y-%m-%d") if p.sale_deadline else "не указано"
+    culture = p.culture
+
+    return (
+        f"▫️ *ID {p.id}: {culture.name}*\n"
+        f"├ Посажено: `{p.plant_date}`\n"
+        f"├ Количество: {p.quantity} шт.\n"
+        f"├ Грамм на лоток: {culture.grams_per_tray} г\n"
+        f"├ Замачивание: {'Да' if culture.soaking_required else 'Нет'}\n"
+        f"├ Прижим: {culture.press_weight} кг\n"
+        f"├ Созреет: `{p.harvest_date}` (*осталось {days_left} дн.*)\n"
+        f"├ Продать до: `{sale_deadline}`\n"
+        f"└ Статус: _{p.get_status_display()}_"
+    )
+
+def paginate_plantings(plantings, today):
+    """Раскладывает карточки посадок по страницам с учетом лимита длины сообщения"""
+    limit = MESSAGE_LIMIT - PAGE_HEADER_RESERVE
+    pages = []
+    page = []
+    length = 0
+
+    for p in plantings:
+        card = format_planting_card(p, today)
+        size = len(card) + 2  # карточки разделены пустой строкой
+        if page and (length + size > limit or len(page) >= PAGE_MAX_CARDS):
+            pages.append(page)
+            page = []
+            length = 0
+        page.append((p, card))
+        length += size
+
+    if page:
+        pages.append(page)
+    return pages
+
+def render_plantings_page(plantings, page_number):
+    """Собирает текст и клавиатуру одной страницы списка посадок"""
+    today = timezone.now().date()
+    pages = paginate_plantings(plantings, today)
+    page_number = min(max(page_number, 0), len(pages) - 1)
+    page = pages[page_number]
+
+    text = (
+        f"🌿 *Текущие посадки* (всего: {len(plantings)}, "
+        f"стр. {page_number + 1}/{len(pages)})\n\n"
+        + "\n\n".join(card for _, card in page)
+    )
+
+    # Компактный выбор посадки: по несколько кнопок с ID в ряду
+    keyboard = []
+    row = []
+    for p, _ in page:
+        row.append(InlineKeyboardButton(f"ID {p.id}", callback_data=f"select_{p.id}_{page_number}"))
+        if len(row) == SELECTOR_ROW_SIZE:
+            keyboard.append(row)
+            row = []
+    if row:
+        keyboard.append(row)
+
+    navigation = []
+    if page_number > 0:
+        navigation.append(InlineKeyboardButton("◀️ Назад", callback_data=f"page_{page_number - 1}"))
+    if page_number < len(pages) - 1:
+        navigation.append(InlineKeyboardButton("Вперед ▶️", callback_data=f"page_{page_number + 1}"))
+    if navigation:
+        keyboard.append(navigation)
+
+    keyboard.append([InlineKeyboardButton("➕ Добавить посадку", callback_data="new")])
+    return text, InlineKeyboardMarkup(keyboard)
+
+def empty_plantings_markup():
+    """Клавиатура для пустого списка посадок"""
+    keyboard = [[InlineKeyboardButton("➕ Добавить посадку", callback_data="new")]]
+    return InlineKeyboardMarkup(keyboard)
+
 async def current_plantings(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Показывает активные посадки"""
+    """Показывает активные посадки постранично в одном сообщении"""
     try:
         plantings = await get_current_plantings()
 
         if not plantings:
-            keyboard = [[InlineKeyboardButton("➕ Добавить посадку", callback_data="new")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
             await update.message.reply_text(
                 "🌾 Сейчас активных посадок нет.",
-                reply_markup=reply_markup
+                reply_markup=empty_plantings_markup()
             )
             return
 
-        today = timezone.now().date()
-        total = len(plantings)
-
-        # Добавляем кнопку создания новой посадки в начало сообщения
-        message = (
-            f"🌿 *Текущие посадки* (всего: {total})*\n\n"
-        )
-
-        # Отправляем каждую посадку отдельным сообщением с кнопками
-        for p in plantings:
-            days_left = max((p.harvest_date - today).days, 0)
-            sale_deadline = p.sale_deadline.strftime("%Y-%m-%d") if p.sale_deadline else "не указано"
-            culture = p.culture
-
-            planting_message = (
-                f"▫️ *ID {p.id}: {culture.name}*\n"
-                f"├ Посажено: `{p.plant_date}`\n"
-                f"├ Количество: {p.quantity} шт.\n"
-                f"├ Грамм на лоток: {culture.grams_per_tray} г\n"
-                f"├ Замачивание: {'Да' if culture.soaking_required else 'Нет'}\n"
-                f"├ Прижим: {culture.press_weight} кг\n"
-                f"├ Созреет: `{p.harvest_date}` (*осталось {days_left} дн.*)\n"
-                f"├ Продать до: `{sale_deadline}`\n"
-                f"└ Статус: _{p.get_status_display()}_"
-            )
-
-            # Создаем кнопки для каждой посадки
-            keyboard = [
-                [
-                    InlineKeyboardButton("✏️ Изменить", callback_data=f"edit_{p.id}"),
-                    InlineKeyboardButton("🗑 Удалить", callback_data=f"delete_{p.id}")
-                ],
-                [
-                    InlineKeyboardButton("💰 Продать", callback_data=f"sell_{p.id}")
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
-            await update.message.reply_text(
-                planting_message,
-                reply_markup=reply_markup,
-                parse_mode="Markdown"
-            )
-
-        # Добавляем кнопку создания новой посадки в конце списка
-        keyboard = [[InlineKeyboardButton("➕ Добавить посадку", callback_data="new")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        text, reply_markup = render_plantings_page(plantings, 0)
         await update.message.reply_text(
-            "Добавить новую посадку:",
-            reply_markup=reply_markup
+            text,
+            reply_markup=reply_markup,
+            parse_mode="Markdown"
         )
 
     except Exception as e:
         await update.message.reply_text("⚠️ Ошибка при получении данных!")
         print(f"Error: {e}")
 
-@sync_to_async
-def sell_plants(planting_id: int, amount: int):
+async def sell_plants(planting_id: int, amount: int):
     """Обновляет количество растений после продажи"""
     try:
-        planting = Planting.objects.get(id=planting_id)
+        remaining, available = await repository.sell(planting_id, amount)
 
-        if planting.quantity < amount:
-            return False, f"Недостаточно растений. Доступно: {planting.quantity}"
+        if remaining is None:
+            if available is None:
+                return False, "❌ Посадка не найдена"
+            return False, f"Недостаточно растений. Доступно: {available}"
 
-        planting.quantity -= amount
+        if notifier:
+            if remaining == 0:
+                notifier.forget(planting_id)
+            else:
+                notifier.update_quantity(planting_id, remaining)
+        if dashboard:
+            dashboard.schedule(tenancy.current_farm_id())
 
-        if planting.quantity == 0:
-            planting.delete()
-            return True, "Весь остаток продан. Посадка удалена."
-        else:
-            planting.save()
-            return True, f"✅ Продано {amount} шт. Осталось: {planting.quantity}"
+        if remaining == 0:
+            return True, "Весь остаток продан. Посадка перенесена в архив."
+        return True, f"✅ Продано {amount} шт. Осталось: {remaining}"
 
-    except Planting.DoesNotExist:
-        return False, "❌ Посадка не найдена"
     except Exception as e:
         return False, f"❌ Ошибка: {str(e)}"
 
@@ -262,6 +417,219 @@ async def sell(update: Update, context: ContextTypes.DEFAULT_TYPE):
     success, message = await sell_plants(planting_id, amount)
     await update.message.reply_text(message)
 
+async def bulk(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /bulk - создание нескольких посадок одним сообщением"""
+    text = update.message.text.partition('\n')[2]
+    rows, errors = await repository.parse_bulk_text(text)
+    success, message = await create_bulk_plantings(rows, errors)
+    await update.message.reply_text(message)
+
+async def bulk_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Создает посадки из присланного CSV-файла"""
+    document = update.message.document
+    if document.file_size and document.file_size > BULK_MAX_FILE_SIZE:
+        await update.message.reply_text("❌ Файл слишком большой")
+        return
+
+    file = await document.get_file()
+    content = bytes(await file.download_as_bytearray()).decode('utf-8-sig', errors='replace')
+    rows, errors = await repository.parse_bulk_csv(content)
+    success, message = await create_bulk_plantings(rows, errors)
+    await update.message.reply_text(message)
+
+async def sales(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /sales - итоги продаж за период"""
+    try:
+        days = int(context.args[0]) if context.args else 7
+        if days <= 0:
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text(
+            "❌ *Неверный формат*\n"
+            "Используйте: `/sales [дней]`\n"
+            "Пример: `/sales 30`",
+            parse_mode="Markdown"
+        )
+        return
+
+    by_culture, by_day = await repository.sales_summary(days)
+    if not by_culture:
+        await update.message.reply_text(f"💰 За последние {days} дн. продаж не было.")
+        return
+
+    total = sum(row['quantity'] for row in by_culture)
+    message = f"💰 *Продажи за {days} дн.*: {total} шт.\n\n*По культурам:*\n"
+    message += "\n".join(
+        f"▫️ {row['culture__name']}: {row['quantity']} шт. ({row['sales']} прод.)" for row in by_culture
+    )
+    message += "\n\n*По дням:*\n"
+    message += "\n".join(f"▫️ `{row['date']}`: {row['quantity']} шт." for row in by_day[-14:])
+    await update.message.reply_text(message, parse_mode="Markdown")
+
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /stats - посадки, урожай, продажи и списания по неделям"""
+    try:
+        weeks = STATS_DEFAULT_WEEKS
+        if context.args:
+            period = context.args[0].lower()
+            weeks = STATS_PERIODS.get(period) or int(period)
+        if weeks <= 0:
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text(
+            "❌ *Неверный формат*\n"
+            "Используйте: `/stats [неделя|месяц|квартал|год|недель]`\n"
+            "Пример: `/stats месяц` или `/stats 8`",
+            parse_mode="Markdown"
+        )
+        return
+
+    started = time.perf_counter()
+    by_culture, by_week, cached = await repository.weekly_report(weeks)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    footer = f"\n\n⏱ {elapsed_ms:.1f} мс{' (из кэша)' if cached else ''}"
+
+    if not by_culture:
+        await update.message.reply_text(f"📊 За последние {weeks} нед. данных нет.{footer}")
+        return
+
+    message = (
+        f"📊 *Статистика за {weeks} нед.*\n"
+        "посажено / созрело / продано / просрочено\n\n*По культурам:*\n"
+    )
+    message += "\n".join(
+        f"▫️ {row['culture__name']}: {row['planted']} / {row['harvested']} / {row['sold']} / {row['expired']}"
+        for row in by_culture[:30]
+    )
+    message += "\n\n*По неделям:*\n"
+    message += "\n".join(
+        f"▫️ `{row['week']}`: {row['planted']} / {row['harvested']} / {row['sold']} / {row['expired']}"
+        for row in by_week[-13:]
+    )
+    await update.message.reply_text(message + footer, parse_mode="Markdown")
+
+async def plan(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /plan - график посевов, загрузка стеллажей и расход семян"""
+    first_line, _, demand_text = update.message.text.partition('\n')
+    args = first_line.split()[1:]
+    try:
+        days = int(args[0]) if args else PLAN_DEFAULT_DAYS
+        if not 0 < days <= PLAN_MAX_DAYS:
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text(f"❌ *Неверный формат*\n{PLAN_USAGE}", parse_mode="Markdown")
+        return
+
+    demand = None
+    if demand_text.strip():
+        rows, errors = await repository.parse_bulk_text(demand_text)
+        if errors:
+            await update.message.reply_text("❌ Ошибки в спросе:\n" + "\n".join(errors[:20]))
+            return
+        demand = {}
+        for culture, quantity, _ in rows:
+            demand[culture] = demand.get(culture, 0) + quantity
+
+    production = await repository.production_plan(demand, days)
+    if not production.cultures:
+        await update.message.reply_text(
+            f"📅 Нет продаж за последние 4 недели, задайте спрос вручную.\n\n{PLAN_USAGE}",
+            parse_mode="Markdown"
+        )
+        return
+
+    peak_day, peak_trays = production.peak()
+    message = (
+        f"📅 *План на {days} дн.*\n"
+        f"Пик загрузки: {peak_trays} лотков ({peak_day.strftime('%d.%m')})\n\n"
+        f"*Посевы на {PLAN_SCHEDULE_DAYS} дн.:*\n"
+    )
+    for day, items in production.schedule(PLAN_SCHEDULE_DAYS):
+        line = ", ".join(f"{culture.name} {trays} л. ({grams} г)" for culture, trays, grams in items)
+        message += f"▫️ `{day.strftime('%d.%m')}`: {line}\n"
+
+    trays = production.sow.sum(axis=0)
+    grams = production.seed_grams.sum(axis=0)
+    message += "\n*Всего за период:*\n"
+    message += "\n".join(
+        f"▫️ {culture.name}: {int(trays[i])} лотков, {int(grams[i])} г семян"
+        for i, culture in enumerate(production.cultures)
+    )
+    if len(message) > MESSAGE_LIMIT:
+        # Режем по целой строке, чтобы не сломать разметку
+        message = message[:message.rfind("\n", 0, MESSAGE_LIMIT - 2)] + "\n…"
+    await update.message.reply_text(message, parse_mode="Markdown")
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /export - посадки или журнал продаж файлом CSV/XLSX"""
+    kind, fmt, params = 'plantings', 'csv', {}
+    for arg in context.args:
+        key, sep, value = arg.partition('=')
+        if sep:
+            params[key.lower()] = value
+        elif arg.lower() in export.SOURCES:
+            kind = arg.lower()
+        elif arg.lower() in export.FORMATS:
+            fmt = arg.lower()
+        else:
+            await update.message.reply_text(f"❌ *Неверный формат*\n{EXPORT_USAGE}", parse_mode="Markdown")
+            return
+
+    try:
+        file, name, _ = await repository.export_file(kind, fmt, params, max_size=EXPORT_MAX_FILE_SIZE)
+    except export.ExportError as e:
+        await update.message.reply_text(f"❌ {e}")
+        return
+
+    with file:
+        # PTB все равно читает документ в память целиком, поэтому размер ограничен при записи
+        await update.message.reply_document(document=file.read(), filename=name)
+
+def culture_card(culture):
+    """Карточка культуры для inline-результата"""
+    return (
+        f"🌱 *{culture.name}*\n"
+        f"├ Созревание: {culture.grow_days} дн.\n"
+        f"├ Срок продажи: {culture.expire_days} дн. после созревания\n"
+        f"├ Грамм на лоток: {culture.grams_per_tray} г\n"
+        f"├ Замачивание: {'Да' if culture.soaking_required else 'Нет'}\n"
+        f"└ Прижим: {culture.press_weight} кг"
+    )
+
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Inline-режим: «@бот базилик» — активные посадки и культуры с кнопками действий"""
+    result, _ = await repository.inline_search(update.inline_query.query)
+    today = timezone.now().date()
+
+    results = []
+    for p in result.plantings:
+        keyboard = [[
+            InlineKeyboardButton("💰 Продать", callback_data=f"sell_{p.id}"),
+            InlineKeyboardButton("🗑 Удалить", callback_data=f"delete_{p.id}"),
+        ]]
+        results.append(InlineQueryResultArticle(
+            id=f"p{p.id}",
+            title=f"ID {p.id}: {p.culture.name} — {p.quantity} шт.",
+            description=f"Созреет {p.harvest_date}, {p.get_status_display().lower()}",
+            input_message_content=InputTextMessageContent(format_planting_card(p, today), parse_mode="Markdown"),
+            reply_markup=InlineKeyboardMarkup(keyboard),
+        ))
+    for culture in result.cultures:
+        if len(results) >= search.MAX_RESULTS:
+            break
+        results.append(InlineQueryResultArticle(
+            id=f"c{culture.id}",
+            title=f"🌱 {culture.name}",
+            description=f"Созревание {culture.grow_days} дн., продать за {culture.expire_days} дн.",
+            input_message_content=InputTextMessageContent(culture_card(culture), parse_mode="Markdown"),
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🌿 Посадки", switch_inline_query_current_chat=culture.name)
+            ]]),
+        ))
+
+    # Результаты зависят от фермы пользователя, поэтому кэш Telegram личный
+    await update.inline_query.answer(results, cache_time=int(search.CACHE_TTL), is_personal=True)
+
 async def delete(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /delete"""
     if not context.args or len(context.args) != 1:
@@ -279,7 +647,7 @@ async def delete(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ ID должен быть числом!")
         return
 
-    success, message = await delete_planting(planting_id)
+    success, message = await delete_planting(planting_id, update.effective_chat.id)
     await update.message.reply_text(message, parse_mode="Markdown")
 
 async def edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -326,7 +694,8 @@ async def edit_quantity_chosen(update: Update, context: ContextTypes.DEFAULT_TYP
             return EDIT_QUANTITY
 
         planting_id = context.user_data['edit_planting_id']
-        success, message = await edit_planting_quantity(planting_id, new_quantity)
+        old_quantity = context.user_data['current_quantity']
+        success, message = await edit_planting_quantity(planting_id, new_quantity, old_quantity)
         await update.message.reply_text(message)
         return ConversationHandler.END
     except ValueError:
@@ -340,9 +709,19 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/start - начать работу\n"
         "/current - активные посадки\n"
         "/new - создать новую посадку\n"
+        "/bulk - создать несколько посадок\n"
         "/edit [ID] - изменить количество\n"
         "/delete [ID] - удалить посадку\n"
         "/sell [ID] [кол-во] - продать растения\n"
+        "/sales [дней] - итоги продаж\n"
+        "/stats [период] - статистика по неделям\n"
+        "/plan [дней] - план посевов\n"
+        "/export - выгрузка в CSV/XLSX\n"
+        "/farm - ферма и участники\n"
+        "/join [код] - присоединиться к ферме\n"
+        "/notify - уведомления о сроках\n"
+        "/dashboard - закрепленная сводка фермы\n"
+        "@бот [культура] - поиск посадок в любом чате\n"
         "/help - эта справка",
         parse_mode="Markdown"
     )
@@ -427,8 +806,47 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if query.data == "new":
         return await new_planting(update, context)
     
-    action, planting_id = query.data.split('_')
-    
+    action, planting_id, *extra = query.data.split('_')
+
+    if action == "page":
+        # Листание списка посадок в том же сообщении
+        plantings = await get_current_plantings()
+        if not plantings:
+            await query.edit_message_text(
+                "🌾 Сейчас активных посадок нет.",
+                reply_markup=empty_plantings_markup()
+            )
+            return
+        text, reply_markup = render_plantings_page(plantings, int(planting_id))
+        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode="Markdown")
+        return
+
+    if action == "select":
+        # Карточка выбранной посадки с кнопками действий
+        page_number = int(extra[0]) if extra else 0
+        success, planting = await get_planting_info(int(planting_id))
+        if not success:
+            await query.edit_message_text("❌ Посадка не найдена")
+            return
+        keyboard = [
+            [
+                InlineKeyboardButton("✏️ Изменить", callback_data=f"edit_{planting.id}"),
+                InlineKeyboardButton("🗑 Удалить", callback_data=f"delete_{planting.id}")
+            ],
+            [
+                InlineKeyboardButton("💰 Продать", callback_data=f"sell_{planting.id}")
+            ],
+            [
+                InlineKeyboardButton("⬅️ К списку", callback_data=f"page_{page_number}")
+            ]
+        ]
+        await query.edit_message_text(
+            format_planting_card(planting, timezone.now().date()),
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode="Markdown"
+        )
+        return
+
     if action == "edit":
         # Изменяем сообщение на форму редактирования
         success, planting = await get_planting_info(int(planting_id))
@@ -446,7 +864,9 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return EDIT_QUANTITY
     
     elif action == "delete":
-        success, message = await delete_planting(int(planting_id))
+        # У сообщения из inline-режима нет чата, ферма определяется по пользователю
+        chat = update.effective_chat or update.effective_user
+        success, message = await delete_planting(int(planting_id), chat.id)
         await query.edit_message_text(
             message,
             parse_mode="Markdown"
@@ -466,12 +886,126 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 parse_mode="Markdown"
             )
 
+async def update_statuses_job(context: ContextTypes.DEFAULT_TYPE):
+    """Периодически пересчитывает статусы посадок"""
+    try:
+        await repository.update_statuses()
+        if dashboard:
+            # Со сменой даты посадки созревают без изменений в боте
+            dashboard.refresh_all()
+    except Exception as e:
+        print(f"Error: {e}")
+
+async def optimize_database_job(context: ContextTypes.DEFAULT_TYPE):
+    """Периодически обновляет статистику, по которой SQLite выбирает индексы"""
+    try:
+        await repository.optimize_database()
+    except Exception as e:
+        print(f"Error: {e}")
+
+async def load_notifications_job(context: ContextTypes.DEFAULT_TYPE):
+    """Пересобирает очередь уведомлений по базе"""
+    try:
+        notifier.load(await repository.get_upcoming_plantings())
+    except Exception as e:
+        print(f"Error: {e}")
+
+async def notify(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /notify - включает или выключает уведомления"""
+    enabled = await repository.toggle_notifications(update.effective_chat.id)
+    if enabled:
+        await update.message.reply_text("🔔 Уведомления о созревании и сроках продажи включены")
+    else:
+        await update.message.reply_text("🔕 Уведомления выключены")
+
+async def dashboard_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /dashboard - включает или выключает закрепленную сводку фермы"""
+    chat_id = update.effective_chat.id
+    try:
+        if dashboard.enabled(chat_id):
+            await dashboard.disable(chat_id)
+            await update.message.reply_text("📌 Сводка откреплена и больше не обновляется")
+            return
+        if not await dashboard.enable(chat_id, tenancy.current_farm_id()):
+            await update.message.reply_text(
+                "📌 Сводка отправлена, но закрепить ее не удалось: дайте боту право закреплять сообщения"
+            )
+    except Exception as e:
+        await update.message.reply_text("⚠️ Ошибка при включении сводки!")
+        print(f"Error: {e}")
+
+async def bind_farm(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Привязывает обработку обновления к ферме чата.
+
+    Выполняется раньше всех обработчиков; если ферму определить не удалось,
+    запросы не увидят ничьих данных.
+    """
+    tenancy.activate(tenancy.NO_FARM)
+    chat, user = update.effective_chat, update.effective_user
+    if chat is not None:
+        member = await repository.get_membership(chat.id, f"Ферма {chat.effective_name}")
+    elif user is not None:
+        member = await repository.get_membership(user.id, f"Ферма {user.full_name}")
+    else:
+        return
+    tenancy.activate(member.farm_id)
+
+async def farm(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /farm - ферма чата, роль и код приглашения"""
+    member = await repository.get_membership(update.effective_chat.id)
+    members = await repository.count_members(member.farm_id)
+    message = (
+        f"🏡 *{member.farm.name}*\n"
+        f"Ваша роль: {member.get_role_display()}\n"
+        f"Участников: {members}"
+    )
+    if member.role == 'admin':
+        message += (
+            f"\n\nКод приглашения: `{member.farm.invite_code}`\n"
+            "Чтобы добавить чат в ферму, отправьте в нем `/join код`"
+        )
+    await update.message.reply_text(message, parse_mode="Markdown")
+
+async def join(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /join - переход в ферму по коду приглашения"""
+    if not context.args:
+        await update.message.reply_text(
+            "❌ *Неверный формат*\n"
+            "Используйте: `/join [код]`\n"
+            "Код приглашения показывает админу фермы команда /farm",
+            parse_mode="Markdown"
+        )
+        return
+
+    member = await repository.join_farm(update.effective_chat.id, context.args[0])
+    if member is None:
+        await update.message.reply_text("❌ Ферма с таким кодом не найдена")
+        return
+    await update.message.reply_text(
+        f"✅ Чат добавлен в ферму «{member.farm.name}» с ролью «{member.get_role_display()}»"
+    )
+
 async def get_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(f"Ваш Chat ID: {update.effective_chat.id}")
 
-def main():
-    """Запуск бота"""
-    application = Application.builder().token(TOKEN).build()
+async def prewarm(application):
+    """Загружает каталог культур, участников ферм и закрепленные сводки до первого обновления"""
+    _, _, dashboards = await asyncio.gather(
+        repository.warm_catalog(), repository.warm_members(), repository.load_bot_state(DASHBOARD_STATE)
+    )
+    dashboard.load(dashboards)
+
+def build_application(builder=None, rate_limiter=None, persistence=None):
+    """Собирает приложение бота со всеми обработчиками"""
+    global notifier, dashboard
+    builder = builder or Application.builder().token(TOKEN)
+    # Все исходящие запросы идут через планировщик с лимитами Telegram
+    builder = builder.rate_limiter(rate_limiter or OutboundScheduler())
+    # user_data и шаги диалогов переживают перезапуск бота
+    builder = builder.persistence(persistence or DjangoPersistence())
+    # Кэши прогреваются после подключения к Telegram, до приема обновлений
+    builder = builder.post_init(prewarm)
+    application = builder.application_class(telegram_metrics.InstrumentedApplication).build()
 
     # Создаем обработчик диалога создания посадки
     new_planting_handler = ConversationHandler(
@@ -483,7 +1017,9 @@ def main():
             CULTURE: [MessageHandler(filters.TEXT & ~filters.COMMAND, culture_chosen)],
             QUANTITY: [MessageHandler(filters.TEXT & ~filters.COMMAND, quantity_chosen)],
         },
-        fallbacks=[CommandHandler("cancel", cancel)]
+        fallbacks=[CommandHandler("cancel", cancel)],
+        name="new_planting",
+        persistent=True,
     )
 
     # Создаем обработчик диалога изменения количества
@@ -495,26 +1031,86 @@ def main():
         states={
             EDIT_QUANTITY: [MessageHandler(filters.TEXT & ~filters.COMMAND, edit_quantity_chosen)],
         },
-        fallbacks=[CommandHandler("cancel", cancel)]
+        fallbacks=[CommandHandler("cancel", cancel)],
+        name="edit_planting",
+        persistent=True,
     )
 
+    # Ферма чата определяется до всех остальных обработчиков
+    application.add_handler(TypeHandler(Update, bind_farm), group=-1)
+
     # Регистрация обработчиков
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("current", current_plantings))
     application.add_handler(CommandHandler("sell", sell))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("delete", delete))
+    application.add_handler(CommandHandler("notify", notify))
+    application.add_handler(CommandHandler("dashboard", dashboard_command))
+    application.add_handler(CommandHandler("bulk", bulk))
+    application.add_handler(CommandHandler("sales", sales))
+    application.add_handler(CommandHandler("stats", stats))
+    application.add_handler(CommandHandler("plan", plan))
+    application.add_handler(CommandHandler("export", export_command))
+    application.add_handler(CommandHandler("farm", farm))
+    application.add_handler(CommandHandler("join", join))
+    application.add_handler(MessageHandler(filters.Document.FileExtension("csv"), bulk_document))
     application.add_handler(new_planting_handler)
     application.add_handler(edit_handler)
     
-    # Добавляем обработчик для остальных кнопок (delete и sell)
+    # Добавляем обработчик для остальных кнопок (листание, выбор, delete и sell)
     application.add_handler(CallbackQueryHandler(button_handler))
+    application.add_handler(InlineQueryHandler(inline_query))
 
     # Добавляем обработчик команды get_id
     application.add_handler(CommandHandler('get_id', get_id))
 
+    # Время обработчиков, запросы к базе и шаги диалогов — в метриках
+    telegram_metrics.instrument(application, CONVERSATION_STATES)
+
+    # Периодический пересчет статусов посадок
+    application.job_queue.run_repeating(update_statuses_job, interval=STATUS_UPDATE_INTERVAL, first=0)
+    # Статистика планировщика SQLite по мере роста таблиц
+    application.job_queue.run_repeating(
+        optimize_database_job, interval=SQLITE_OPTIMIZE_INTERVAL, first=SQLITE_OPTIMIZE_INTERVAL
+    )
+
+    # Уведомления о созревании и окончании срока продажи
+    notifier = HarvestNotifier(
+        application.job_queue,
+        send=lambda chat_id, text: application.bot.send_message(chat_id, text),
+        get_chats=repository.get_notification_chats,
+    )
+    application.job_queue.run_repeating(load_notifications_job, interval=NOTIFICATIONS_RESYNC_INTERVAL, first=0)
+
+    # Закрепленные сводки ферм, которые правятся после изменений посадок
+    dashboard = Dashboard(
+        application.job_queue,
+        application.bot,
+        get_summary=lambda farm_id: repository.dashboard_summary(farm_id, DASHBOARD_DAYS),
+        save=repository.save_bot_state,
+    )
+
+    return application
+
+def main():
+    """Запуск бота"""
+    if BOT_MODE == 'webhook':
+        # Обновления принимает ASGI-приложение рядом с Django
+        import uvicorn
+        uvicorn.run("zelen_pro.asgi:application", host=WEBHOOK_HOST, port=WEBHOOK_PORT)
+        return
+
+    application = build_application()
+    if metrics.METRICS_FILE:
+        # Сайт работает в другом процессе и читает метрики бота из файла
+        application.job_queue.run_repeating(telegram_metrics.export_job, interval=METRICS_EXPORT_INTERVAL, first=0)
+
     # Запуск
-    application.run_polling()
+    try:
+        application.run_polling()
+    finally:
+        repository.shutdown()
 
 
 if __name__ == "__main__":
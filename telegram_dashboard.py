@@ -0,0 +1,164 @@
+"""Закрепленная сводка фермы в чате: текст по посадкам и правка на месте с паузой."""
+import os
+
+from django.db import DatabaseError
+from django.utils import timezone
+from telegram.error import BadRequest, Forbidden, TelegramError
+
+# Через сколько секунд после первого изменения посадок правится сводка;
+# изменения за это время попадают в одну правку
+DASHBOARD_DEBOUNCE = float(os.getenv('DASHBOARD_DEBOUNCE', '3'))
+# На сколько дней вперед сводка показывает сборы
+DASHBOARD_DAYS = int(os.getenv('DASHBOARD_DAYS', '7'))
+
+# Тип записей BotState: {id чата: {'farm', 'message', 'text'}}
+STATE_KIND = 'dashboard'
+
+STATUS_TITLES = {
+    'growing': "🌱 Растет",
+    'ready': "✅ Созрело",
+}
+
+
+def render(summary, today):
+    """Текст сводки по {'growing': (посадок, шт.), 'ready': ..., 'upcoming': [(дата, культура, шт.)]}.
+
+    Времени обновления в тексте нет: иначе он менялся бы при каждой
+    проверке и правка без изменений не пропускалась бы.
+    """
+    lines = ["📌 Сводка фермы", ""]
+    for status, title in STATUS_TITLES.items():
+        count, quantity = summary.get(status, (0, 0))
+        lines.append(f"{title}: {quantity} шт. (посадок: {count})")
+
+    lines.append("")
+    if not summary['upcoming']:
+        lines.append(f"🌾 Сборов в ближайшие {DASHBOARD_DAYS} дн. нет")
+    else:
+        lines.append("🌾 Ближайшие сборы:")
+        by_day = {}
+        for day, name, quantity in summary['upcoming']:
+            by_day.setdefault(day, []).append(f"{name} {quantity} шт.")
+        for day, items in by_day.items():
+            label = "сегодня" if day == today else day.strftime("%d.%m")
+            lines.append(f"▫️ {label}: {', '.join(items)}")
+    return "\n".join(lines)
+
+
+class Dashboard:
+    """Закрепленная сводка фермы, которая правится на месте.
+
+    Изменения посадок только отмечают ферму; первое изменение ставит в
+    JobQueue одно задание через delay секунд, и все изменения до его
+    срабатывания дают одну правку на чат. Окно отсчитывается от первого
+    изменения, а не от последнего, поэтому непрерывный поток продаж не
+    откладывает сводку бесконечно. Если текст не изменился, правки нет.
+    get_summary(farm_id) возвращает данные для render, save записывает
+    изменения {(тип, ключ): данные} в BotState.
+    """
+
+    def __init__(self, job_queue, bot, get_summary, save, delay=DASHBOARD_DEBOUNCE, clock=timezone.localdate):
+        self.job_queue = job_queue
+        self.bot = bot
+        self.get_summary = get_summary
+        self.save = save
+        self.delay = delay
+        self.clock = clock
+        self.chats = {}
+        self.pending = set()
+        self.job = None
+        self.edits = 0
+        self.skipped = 0
+
+    def load(self, records):
+        """Восстанавливает сводки чатов из BotState"""
+        self.chats = {int(chat_id): dict(data) for chat_id, data in records.items()}
+
+    def enabled(self, chat_id):
+        return chat_id in self.chats
+
+    async def render(self, farm_id):
+        return render(await self.get_summary(farm_id), self.clock())
+
+    async def enable(self, chat_id, farm_id):
+        """Отправляет сводку и закрепляет ее; возвращает False, если закрепить не дали права"""
+        text = await self.render(farm_id)
+        message = await self.bot.send_message(chat_id, text)
+        self.chats[chat_id] = {'farm': farm_id, 'message': message.message_id, 'text': text}
+        await self.save({(STATE_KIND, str(chat_id)): self.chats[chat_id]})
+        try:
+            await self.bot.pin_chat_message(chat_id, message.message_id, disable_notification=True)
+        except (BadRequest, Forbidden):
+            return False
+        return True
+
+    async def disable(self, chat_id):
+        """Перестает обновлять сводку чата и открепляет ее"""
+        data = self.chats.pop(chat_id, None)
+        if data is None:
+            return
+        await self.save({(STATE_KIND, str(chat_id)): None})
+        try:
+            await self.bot.unpin_chat_message(chat_id, data['message'])
+        except (BadRequest, Forbidden):
+            pass
+
+    def schedule(self, farm_id):
+        """Отмечает изменение посадок фермы; сводка обновится после паузы"""
+        if not any(data['farm'] == farm_id for data in self.chats.values()):
+            return
+        self.pending.add(farm_id)
+        if self.job is None:
+            self.job = self.job_queue.run_once(self.flush, self.delay)
+
+    def refresh_all(self):
+        """Проверяет сводки всех ферм: статусы и «сегодня» меняются со сменой даты"""
+        for farm_id in {data['farm'] for data in self.chats.values()}:
+            self.schedule(farm_id)
+
+    async def flush(self, context=None):
+        """Один раз собирает текст для каждой отмеченной фермы и правит только изменившиеся сводки"""
+        # Изменения во время правки поставят следующее задание
+        self.job = None
+        farms, self.pending = self.pending, set()
+        changes = {}
+        for farm_id in farms:
+            chats = [chat_id for chat_id, data in self.chats.items() if data['farm'] == farm_id]
+            if not chats:
+                continue
+            try:
+                text = await self.render(farm_id)
+            except DatabaseError as e:
+                # База занята или недоступна: сводка фермы обновится при следующем изменении
+                print(f"Error: dashboard farm {farm_id}: {e}")
+                continue
+            for chat_id in chats:
+                data = self.chats.get(chat_id)
+                if data is None:
+                    continue
+                if data['text'] == text:
+                    self.skipped += 1
+                    continue
+                try:
+                    await self.bot.edit_message_text(text, chat_id=chat_id, message_id=data['message'])
+                    self.edits += 1
+                except BadRequest as e:
+                    if 'not modified' not in e.message.lower():
+                        # Сводку удалили из чата — больше ее не обновляем
+                        print(f"Error: {e}")
+                        del self.chats[chat_id]
+                        changes[(STATE_KIND, str(chat_id))] = None
+                        continue
+                except Forbidden:
+                    # Бота удалили из чата
+                    del self.chats[chat_id]
+                    changes[(STATE_KIND, str(chat_id))] = None
+                    continue
+                except TelegramError as e:
+                    # Сеть или лимиты: старый текст остается, правка повторится при следующем изменении
+                    print(f"Error: {e}")
+                    continue
+                data['text'] = text
+                changes[(STATE_KIND, str(chat_id))] = data
+        if changes:
+            await self.save(changes)
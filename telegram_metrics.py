@@ -0,0 +1,78 @@
+import collections
+import functools
+
+from telegram.ext import Application, ConversationHandler
+
+from plants import metrics
+
+# Диалоги последнего собранного приложения и названия их шагов
+_conversations = []
+_state_names = {}
+
+
+class InstrumentedApplication(Application):
+    """Application, замеряющий каждое обновление целиком: время, запросы к базе, обработчики"""
+
+    async def process_update(self, update):
+        with metrics.track_update(getattr(update, 'update_id', None)):
+            await super().process_update(update)
+
+
+def timed(name, callback):
+    """Обертка обработчика с замером времени и подсчетом исключений"""
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        with metrics.track_handler(name):
+            return await callback(update, context)
+    return wrapper
+
+
+def leaf_handlers(handlers):
+    """Обработчики с callback, в том числе внутри диалогов"""
+    for handler in handlers:
+        if isinstance(handler, ConversationHandler):
+            yield from leaf_handlers(handler.entry_points)
+            for state_handlers in handler.states.values():
+                yield from leaf_handlers(state_handlers)
+            yield from leaf_handlers(handler.fallbacks)
+        else:
+            yield handler
+
+
+def instrument(application, state_names=None):
+    """Подключает метрики ко всем обработчикам приложения.
+
+    state_names — {имя диалога: {состояние: название шага}} для метки state.
+    """
+    metrics.install_query_counter()
+    handlers = [handler for group in application.handlers.values() for handler in group]
+    for handler in leaf_handlers(handlers):
+        handler.callback = timed(handler.callback.__name__, handler.callback)
+
+    _conversations[:] = [handler for handler in handlers if isinstance(handler, ConversationHandler)]
+    _state_names.clear()
+    _state_names.update(state_names or {})
+
+
+def conversation_states():
+    """Сколько чатов сейчас на каждом шаге каждого диалога"""
+    values = []
+    for handler in _conversations:
+        # Публичного доступа к состояниям диалогов в PTB нет
+        counts = collections.Counter(
+            _state_names.get(handler.name, {}).get(state, str(state)) if isinstance(state, int) else 'pending'
+            for state in list(handler._conversations.values())
+        )
+        values += [({'conversation': handler.name, 'state': state}, count) for state, count in counts.items()]
+    return 'bot_conversations', 'Незавершенные диалоги по шагам', 'gauge', values
+
+
+metrics.register_collector(conversation_states)
+
+
+async def export_job(context):
+    """Выгружает метрики процесса бота для страницы /metrics сайта"""
+    try:
+        metrics.export()
+    except OSError as e:
+        print(f"Error: {e}")
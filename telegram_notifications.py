@@ -0,0 +1,152 @@
+import heapq
+import itertools
+from datetime import datetime, time
+
+from django.utils import timezone
+
+# Время, в которое приходят уведомления о созревании и сроке продажи
+NOTIFY_TIME = time(9, 0)
+
+EVENT_TITLES = {
+    'harvest': "🌾 Созрели:",
+    'deadline': "⏰ Истек срок продажи:",
+}
+
+
+class HarvestNotifier:
+    """Уведомления о созревании и окончании срока продажи.
+
+    Держит min-кучу ближайших событий и ставит в JobQueue только одно
+    задание — на ближайшее из них. Изменения посадок обновляют кучу
+    инкрементально: устаревшие записи отбрасываются по номеру версии.
+    Номера версий общие для всех посадок и только растут, поэтому версию
+    посадки без будущих событий можно просто забыть.
+    get_chats возвращает подписанные чаты по фермам, и каждая ферма
+    получает сводку только о своих посадках.
+    """
+
+    def __init__(self, job_queue, send, get_chats, clock=timezone.now, notify_time=NOTIFY_TIME):
+        self.job_queue = job_queue
+        self.send = send
+        self.get_chats = get_chats
+        self.clock = clock
+        self.notify_time = notify_time
+        self.heap = []
+        self.plantings = {}
+        self.versions = {}
+        self.counter = itertools.count(1)
+        self.job = None
+        self.job_when = None
+
+    def event_time(self, day):
+        return timezone.make_aware(datetime.combine(day, self.notify_time))
+
+    def _push(self, planting):
+        version = next(self.counter)
+        now = self.clock()
+        events = [
+            (self.event_time(day), planting.id, kind, version)
+            for kind, day in (('harvest', planting.harvest_date), ('deadline', planting.sale_deadline))
+            if day is not None and self.event_time(day) > now
+        ]
+        if not events:
+            # Все события в прошлом: посадку больше не отслеживаем
+            self.plantings.pop(planting.id, None)
+            self.versions.pop(planting.id, None)
+            return
+        self.versions[planting.id] = version
+        self.plantings[planting.id] = {
+            'farm': planting.farm_id,
+            'name': planting.culture.name,
+            'quantity': planting.quantity,
+        }
+        for event in events:
+            heapq.heappush(self.heap, event)
+
+    def load(self, plantings):
+        """Полностью пересобирает кучу по списку посадок"""
+        self.heap = []
+        self.plantings = {}
+        self.versions = {}
+        for planting in plantings:
+            self._push(planting)
+        self.reschedule()
+
+    def track(self, planting):
+        """Добавляет или обновляет посадку после создания или изменения дат"""
+        self._push(planting)
+        self.reschedule()
+
+    def update_quantity(self, planting_id, quantity):
+        """Обновляет количество для текста уведомлений (время событий не меняется)"""
+        if planting_id in self.plantings:
+            self.plantings[planting_id]['quantity'] = quantity
+
+    def forget(self, planting_id):
+        """Убирает посадку (удалена или продана целиком)"""
+        # Записи в куче без версии считаются устаревшими
+        self.plantings.pop(planting_id, None)
+        self.versions.pop(planting_id, None)
+        self.reschedule()
+
+    def _is_stale(self, event):
+        _, planting_id, _, version = event
+        return self.versions.get(planting_id) != version
+
+    def _peek(self):
+        while self.heap and self._is_stale(self.heap[0]):
+            heapq.heappop(self.heap)
+        return self.heap[0] if self.heap else None
+
+    def reschedule(self):
+        """Ставит единственное задание на время ближайшего события"""
+        top = self._peek()
+        when = top[0] if top else None
+        if when == self.job_when:
+            return
+        if self.job is not None:
+            self.job.schedule_removal()
+        self.job = self.job_queue.run_once(self.wake, when) if when else None
+        self.job_when = when
+
+    def pop_due(self, now):
+        """Достает все наступившие события"""
+        due = []
+        while (top := self._peek()) and top[0] <= now:
+            heapq.heappop(self.heap)
+            due.append(top)
+        return due
+
+    def render(self, events):
+        """Собирает одну сводку по набору событий"""
+        lines = []
+        for kind, title in EVENT_TITLES.items():
+            items = [e for e in events if e[2] == kind]
+            if not items:
+                continue
+            lines.append(title)
+            for _, planting_id, _, _ in items:
+                info = self.plantings[planting_id]
+                lines.append(f"▫️ ID {planting_id}: {info['name']} — {info['quantity']} шт.")
+            lines.append("")
+        return "\n".join(lines).strip()
+
+    async def wake(self, context=None):
+        """Срабатывает в момент ближайшего события и рассылает сводку"""
+        self.job = None
+        self.job_when = None
+        events = self.pop_due(self.clock())
+        if events:
+            by_farm = {}
+            for event in events:
+                by_farm.setdefault(self.plantings[event[1]]['farm'], []).append(event)
+            texts = {farm_id: self.render(farm_events) for farm_id, farm_events in by_farm.items()}
+            for _, planting_id, kind, _ in events:
+                if kind == 'deadline':
+                    self.plantings.pop(planting_id, None)
+                    self.versions.pop(planting_id, None)
+            chats = await self.get_chats()
+            for farm_id, text in texts.items():
+                for chat_id in chats.get(farm_id, ()):
+                    await self.send(chat_id, text)
+        self.reschedule()
@@ -0,0 +1,258 @@
+import asyncio
+import statistics
+import time
+from collections import deque
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from plants import metrics
+
+# Лимиты Telegram Bot API: ~30 сообщений в секунду на бота,
+# ~1 в секунду в личный чат и ~20 в минуту в группу
+GLOBAL_RATE = 30
+PRIVATE_CHAT_RATE = 1
+GROUP_CHAT_RATE = 20 / 60
+BURST = 3
+MAX_RETRIES = 3
+
+EDIT_ENDPOINTS = {'editMessageText', 'editMessageReplyMarkup'}
+
+# Как часто из планировщика убираются корзины и блокировки неактивных чатов, секунды
+IDLE_SWEEP_INTERVAL = 60
+
+# Планировщик последнего собранного приложения; его очередь попадает в метрики
+_active = None
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше capacity подряд"""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def wait_time(self):
+        """Сколько ждать до появления токена"""
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def is_full(self):
+        """Корзина полна: новая корзина вела бы себя так же"""
+        return self.tokens + (self.clock() - self.updated) * self.rate >= self.capacity
+
+
+class OutboundScheduler(BaseRateLimiter):
+    """Планировщик исходящих запросов бота.
+
+    Подключается через Application.builder().rate_limiter(), поэтому через него
+    проходят все вызовы Bot API из обработчиков. Держит глобальный лимит и лимиты
+    на чат, выдерживает retry_after при ответе 429 и склеивает подряд идущие
+    правки одного сообщения в последнюю.
+    """
+
+    def __init__(self, global_rate=GLOBAL_RATE, private_rate=PRIVATE_CHAT_RATE, group_rate=GROUP_CHAT_RATE,
+                 burst=BURST, max_retries=MAX_RETRIES, clock=time.monotonic, sleep=asyncio.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.private_rate = private_rate
+        self.group_rate = group_rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(global_rate, burst, clock)
+        self.chat_buckets = {}
+        self.chat_locks = {}
+        # Сколько запросов сейчас ждут очереди в чате
+        self.chat_waiting = {}
+        self.swept_at = clock()
+        self.global_lock = asyncio.Lock()
+        self.paused_until = 0.0
+        self.pending_edits = {}
+
+        self.depth = 0
+        self.max_depth = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=1000)
+
+        global _active
+        _active = self
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            rate = self.group_rate if is_group else self.private_rate
+            bucket = self.chat_buckets[chat_id] = TokenBucket(rate, self.burst, self.clock)
+        return bucket
+
+    def evict_idle(self):
+        """Забывает чаты, где никто не ждет очереди и корзина снова полна.
+
+        Без этого корзины и блокировки копились бы для каждого чата, когда-либо
+        получавшего сообщение; удаление ничего не меняет в лимитах.
+        """
+        self.swept_at = self.clock()
+        for chat_id in list(self.chat_locks):
+            bucket = self.chat_buckets.get(chat_id)
+            if chat_id not in self.chat_waiting and (bucket is None or bucket.is_full()):
+                del self.chat_locks[chat_id]
+                self.chat_buckets.pop(chat_id, None)
+
+    async def wait_pause(self):
+        """Выдерживает паузу после ответа 429"""
+        while (pause := self.paused_until - self.clock()) > 0:
+            await self.sleep(pause)
+
+    async def wait_token(self, bucket):
+        # Вызывается под блокировкой, поэтому за время сна токен никто не заберет
+        wait = bucket.wait_time()
+        if wait > 0:
+            await self.sleep(wait)
+            bucket.wait_time()
+        bucket.take()
+
+    async def acquire(self, chat_id, superseded=None):
+        """Ждет свою очередь; False — запрос вытеснен более новой правкой того же сообщения.
+
+        Ожидающие выстраиваются на asyncio.Lock (FIFO), поэтому спит только
+        первый в очереди, а не все запросы разом.
+        """
+        if chat_id is None:
+            await self.wait_pause()
+            return True
+
+        if self.clock() - self.swept_at >= IDLE_SWEEP_INTERVAL:
+            self.evict_idle()
+        lock = self.chat_locks.get(chat_id)
+        if lock is None:
+            lock = self.chat_locks[chat_id] = asyncio.Lock()
+
+        self.chat_waiting[chat_id] = self.chat_waiting.get(chat_id, 0) + 1
+        try:
+            async with lock:
+                if superseded is not None and superseded.done():
+                    return False
+                await self.wait_token(self.chat_bucket(chat_id))
+                async with self.global_lock:
+                    await self.wait_pause()
+                    await self.wait_token(self.global_bucket)
+        finally:
+            self.chat_waiting[chat_id] -= 1
+            if not self.chat_waiting[chat_id]:
+                del self.chat_waiting[chat_id]
+        return True
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        # Ответы на callback/inline-запросы и служебные вызовы идут без лимитов, но с учетом 429
+        chat_id = data.get('chat_id')
+
+        started = self.clock()
+        self.depth += 1
+        self.max_depth = max(self.max_depth, self.depth)
+        try:
+            future = None
+            if endpoint in EDIT_ENDPOINTS and chat_id is not None and data.get('message_id') is not None:
+                edit_key = (endpoint, chat_id, data['message_id'])
+                previous = self.pending_edits.get(edit_key)
+                future = asyncio.get_running_loop().create_future()
+                self.pending_edits[edit_key] = future
+                if previous is not None:
+                    # Более ранняя правка еще ждет очереди — она получит результат этой
+                    previous.set_result(future)
+
+            for attempt in range(self.max_retries + 1):
+                if not await self.acquire(chat_id, future):
+                    self.coalesced += 1
+                    metrics.OUTBOX_COALESCED.inc()
+                    return await self.wait_latest(future)
+                if attempt == 0:
+                    metrics.OUTBOX_WAIT_SECONDS.observe(self.clock() - started)
+                if future is not None and self.pending_edits.get(edit_key) is future:
+                    del self.pending_edits[edit_key]
+
+                try:
+                    with metrics.track_telegram(endpoint):
+                        result = await callback(*args, **kwargs)
+                except RetryAfter as e:
+                    if attempt < self.max_retries:
+                        self.retries += 1
+                        metrics.OUTBOX_RETRY_AFTER.inc()
+                        metrics.OUTBOX_PAUSE_SECONDS.inc(e.retry_after)
+                        self.paused_until = max(self.paused_until, self.clock() + e.retry_after)
+                        continue
+                    self.errors += 1
+                    self.resolve(future, e)
+                    raise
+                except BaseException as e:
+                    self.errors += 1
+                    self.resolve(future, e)
+                    raise
+
+                self.sent += 1
+                self.resolve(future, result)
+                return result
+        finally:
+            self.depth -= 1
+            self.latencies.append(self.clock() - started)
+
+    @staticmethod
+    def resolve(future, result):
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    @staticmethod
+    async def wait_latest(future):
+        """Ждет результат последней правки из цепочки склеенных"""
+        result = await future
+        while isinstance(result, asyncio.Future):
+            result = await result
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    def stats(self):
+        """Метрики очереди: глубина, задержка, количество отправок и повторов"""
+        latencies = sorted(self.latencies)
+        return {
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'retries': self.retries,
+            'errors': self.errors,
+            'latency_p50': statistics.median(latencies) if latencies else 0.0,
+            'latency_p95': latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+        }
+
+
+def outbox_depth():
+    """Запросы, которые сейчас ждут очереди или отправляются"""
+    values = [({}, _active.depth)] if _active is not None else []
+    return 'bot_outbox_depth', 'Запросы в очереди исходящих', 'gauge', values
+
+
+def outbox_chats():
+    """Чаты, для которых планировщик держит корзины (растет только с активными чатами)"""
+    values = [({}, len(_active.chat_buckets))] if _active is not None else []
+    return 'bot_outbox_chats', 'Чаты с корзинами лимитов в планировщике', 'gauge', values
+
+
+metrics.register_collector(outbox_depth)
+metrics.register_collector(outbox_chats)
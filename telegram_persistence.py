@@ -0,0 +1,123 @@
+import asyncio
+import copy
+import json
+import os
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from plants import repository
+
+# Как часто Application сбрасывает изменения user_data и диалогов в базу (секунды)
+PERSISTENCE_INTERVAL = float(os.getenv('PERSISTENCE_INTERVAL', '30'))
+
+USER_DATA = 'user_data'
+CONVERSATION = 'conversation:{}'
+
+
+class DjangoPersistence(BasePersistence):
+    """Хранит user_data и состояния диалогов в таблице BotState.
+
+    Application раз в update_interval отдает все изменившиеся записи пачкой
+    вызовов update_*; здесь они только складываются в буфер, а в базу уходят
+    одной транзакцией. При остановке бота flush() дописывает остаток.
+    """
+
+    def __init__(self, update_interval=PERSISTENCE_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.pending = {}
+        self.writer = None
+
+        self.batches = 0
+        self.rows = 0
+        self.errors = 0
+
+    def buffer(self, kind, key, data):
+        """Запоминает изменение; запись в базу — одна на всю пачку.
+
+        В буфер идет копия: запись идет в потоке пула, а обработчики тем
+        временем меняют тот же user_data в цикле событий.
+        """
+        self.pending[(kind, key)] = copy.deepcopy(data)
+        if self.writer is None or self.writer.done():
+            self.writer = asyncio.create_task(self.write_pending())
+
+    async def write_pending(self):
+        # Даем Application отдать остальные изменения этой пачки
+        await asyncio.sleep(0)
+        while self.pending:
+            changes, self.pending = self.pending, {}
+            try:
+                await repository.save_bot_state(changes)
+            except Exception as e:
+                print(f"Error: {e}")
+                self.errors += 1
+                # Более свежие изменения из буфера важнее неудачной пачки
+                self.pending = {**changes, **self.pending}
+                return
+            self.batches += 1
+            self.rows += len(changes)
+
+    # user_data
+
+    async def get_user_data(self):
+        stored = await repository.load_bot_state(USER_DATA)
+        return {int(user_id): data for user_id, data in stored.items()}
+
+    async def update_user_data(self, user_id, data):
+        # Пустой словарь хранить незачем
+        self.buffer(USER_DATA, str(user_id), data or None)
+
+    async def drop_user_data(self, user_id):
+        self.buffer(USER_DATA, str(user_id), None)
+
+    async def refresh_user_data(self, user_id, user_data):
+        # Других процессов с этими данными нет — в памяти всегда актуальная версия
+        pass
+
+    # Диалоги
+
+    async def get_conversations(self, name):
+        stored = await repository.load_bot_state(CONVERSATION.format(name))
+        return {tuple(json.loads(key)): state for key, state in stored.items()}
+
+    async def update_conversation(self, name, key, new_state):
+        self.buffer(CONVERSATION.format(name), json.dumps(list(key)), new_state)
+
+    async def flush(self):
+        if self.writer is not None:
+            await self.writer
+        if self.pending:
+            self.writer = None
+            await self.write_pending()
+
+    # chat_data, bot_data и callback_data не хранятся
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
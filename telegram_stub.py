@@ -0,0 +1,115 @@
+"""Bot API внутри процесса для проверок и замеров бота без сети."""
+import asyncio
+import itertools
+import json
+import os
+import time
+
+from telegram.ext import Application
+from telegram.request import BaseRequest
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Зелень', 'username': 'zelen_test_bot'}
+STUB_TOKEN = '1:stub'
+
+# Лимиты Telegram в замерах не проверяются
+UNLIMITED = 10 ** 6
+
+
+class StubRequest(BaseRequest):
+    """Отвечает на запросы бота как Telegram и записывает их"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = []
+        self.message_ids = itertools.count(1)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data is not None else {}
+        self.calls.append((endpoint, params))
+        if self.latency:
+            # Задержка сети и серверов Telegram
+            await asyncio.sleep(self.latency)
+        return 200, json.dumps({'ok': True, 'result': self.result(endpoint, params)}).encode('utf-8')
+
+    def result(self, endpoint, params):
+        if endpoint == 'getMe':
+            return BOT_USER
+        if endpoint in ('sendMessage', 'editMessageText', 'sendDocument'):
+            return {
+                'message_id': params.get('message_id') or next(self.message_ids),
+                'date': int(time.time()),
+                'chat': {'id': params.get('chat_id', 0), 'type': 'private'},
+                'from': BOT_USER,
+                'text': params.get('text', ''),
+            }
+        return True
+
+
+def build_stub_application(request=None, **kwargs):
+    """Приложение бота со всеми обработчиками, отправляющее запросы в StubRequest"""
+    # Модуль бота требует токен при импорте; настоящий здесь не нужен
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', STUB_TOKEN)
+    import telegram_bot
+    from telegram_outbox import OutboundScheduler
+
+    builder = (
+        Application.builder().token(STUB_TOKEN)
+        .request(request or StubRequest()).get_updates_request(StubRequest())
+        .updater(None)
+    )
+    kwargs.setdefault('rate_limiter', OutboundScheduler(UNLIMITED, UNLIMITED, UNLIMITED, burst=UNLIMITED))
+    return telegram_bot.build_application(builder, **kwargs)
+
+
+def message_update(update_id, chat_id, text):
+    """Обновление с текстовым сообщением из личного чата"""
+    user = {'id': chat_id, 'is_bot': False, 'first_name': f"Пользователь {chat_id}"}
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': chat_id, 'type': 'private', 'first_name': user['first_name']},
+        'from': user,
+        'text': text,
+    }
+    if text.startswith('/'):
+        command = text.split()[0]
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+    return {'update_id': update_id, 'message': message}
+
+
+def inline_query_update(update_id, user_id, query):
+    """Обновление с inline-запросом «@бот query»"""
+    user = {'id': user_id, 'is_bot': False, 'first_name': f"Пользователь {user_id}"}
+    return {
+        'update_id': update_id,
+        'inline_query': {'id': str(update_id), 'from': user, 'query': query, 'offset': ''},
+    }
+
+
+def callback_update(update_id, chat_id, data, message_id=None):
+    """Обновление с нажатием inline-кнопки под сообщением бота"""
+    user = {'id': chat_id, 'is_bot': False, 'first_name': f"Пользователь {chat_id}"}
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': user,
+            'chat_instance': str(chat_id),
+            'data': data,
+            'message': {
+                'message_id': message_id or update_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private', 'first_name': user['first_name']},
+                'from': BOT_USER,
+                'text': '…',
+            },
+        },
+    }
@@ -1,5 +1,13 @@
 import os
 from django.core.asgi import get_asgi_application
+from dotenv import load_dotenv
+
+load_dotenv()
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'zelen_pro.settings')
-application = get_asgi_application()
\ No newline at end of file
+application = get_asgi_application()
+
+# В режиме webhook обновления Telegram принимаются рядом с Django
+if os.getenv('BOT_MODE') == 'webhook':
+    from zelen_pro.telegram_webhook import TelegramWebhook
+    application = TelegramWebhook(application)
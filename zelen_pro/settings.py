@@ -49,13 +49,39 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'zelen_pro.wsgi.application'
 
+# Профиль SQLite для нескольких процессов на одной базе (plants.sqlite):
+# синхронизация диска только при checkpoint и ожидание блокировки вместо
+# «database is locked». Режим WAL включает миграция 0013_sqlite_wal
+SQLITE_PRAGMAS = {
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'normal'),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    'temp_store': 'memory',
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # Бэкенд SQLite Django с прагмами профиля и BEGIN IMMEDIATE
+        'ENGINE': 'plants.sqlite',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Бот, сайт и cron держат соединение открытым между запросами;
+        # прагмы профиля из OPTIONS выставляются только при открытии
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+        # Тесты параллельных продаж пишут из нескольких потоков: in-memory база
+        # с общим кэшем вместо ожидания блокировки сразу дает ошибку
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        'OPTIONS': {
+            'pragmas': SQLITE_PRAGMAS,
+            # Все транзакции в проекте пишут, поэтому блокировка записи берется сразу
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Чаты, которые при переходе на фермы (миграция 0009) становятся админами
+# фермы с уже накопленными посадками, через запятую
+DEFAULT_FARM_CHAT_IDS = [int(chat_id) for chat_id in os.getenv('DEFAULT_FARM_CHAT_IDS', '').split(',') if chat_id.strip()]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
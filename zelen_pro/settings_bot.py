@@ -0,0 +1,19 @@
+"""Настройки процесса бота в режиме polling.
+
+Боту нужны только ORM и приложение plants: админка, сессии, сообщения,
+статика, шаблоны и middleware не загружаются, и бот быстрее
+поднимается после перезапуска. Сайт и режим webhook работают
+с полными настройками zelen_pro.settings.
+"""
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    # FarmMember.user ссылается на пользователя сайта
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'plants.apps.PlantsConfig',
+]
+
+MIDDLEWARE = []
+TEMPLATES = []
+AUTH_PASSWORD_VALIDATORS = []
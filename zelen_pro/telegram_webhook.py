@@ -0,0 +1,117 @@
+import hmac
+import json
+import os
+import re
+
+from telegram import Update
+
+WEBHOOK_PATH = '/' + os.getenv('WEBHOOK_PATH', 'telegram/webhook/').strip('/') + '/'
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # Публичный адрес, который регистрируется в Telegram
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+# Допустимый secret_token для setWebhook; значение из старого .env.example известно всем
+SECRET_RE = re.compile(r'^[A-Za-z0-9_-]{16,256}$')
+KNOWN_SECRETS = {'change_me'}
+
+
+class TelegramWebhook:
+    """ASGI-обертка: принимает обновления Telegram, остальное передает в Django"""
+
+    def __init__(self, app, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET):
+        if not secret or secret in KNOWN_SECRETS:
+            raise ValueError("Для режима webhook укажите свой WEBHOOK_SECRET в файле .env")
+        if not SECRET_RE.match(secret):
+            raise ValueError("WEBHOOK_SECRET: от 16 до 256 символов A-Z, a-z, 0-9, _ и -")
+        self.app = app
+        self.path = path
+        self.secret = secret
+        self.bot_app = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] == 'http' and scope['path'] == self.path:
+            return await self.handle_update(scope, receive, send)
+        return await self.app(scope, receive, send)
+
+    async def start_bot(self):
+        """Запускает приложение бота без собственного Updater"""
+        import telegram_bot
+        from telegram.ext import Application
+
+        if self.bot_app is not None:
+            return
+        bot_app = telegram_bot.build_application(
+            Application.builder().token(telegram_bot.TOKEN).updater(None)
+        )
+        await bot_app.initialize()
+        # post_init вызывают только run_polling/run_webhook, здесь — вручную
+        await telegram_bot.prewarm(bot_app)
+        await bot_app.start()
+        if WEBHOOK_URL:
+            await bot_app.bot.set_webhook(
+                url=WEBHOOK_URL.rstrip('/') + self.path,
+                secret_token=self.secret,
+                allowed_updates=Update.ALL_TYPES,
+            )
+        self.bot_app = bot_app
+
+    async def stop_bot(self):
+        """Останавливает приложение бота"""
+        from plants import repository
+
+        if self.bot_app is None:
+            return
+        await self.bot_app.stop()
+        await self.bot_app.shutdown()
+        self.bot_app = None
+        repository.shutdown()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.start_bot()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.stop_bot()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def handle_update(self, scope, receive, send):
+        """Проверяет секрет и ставит обновление в очередь; обработчики работают в фоне"""
+        if scope['method'] != 'POST':
+            return await self.respond(send, 405)
+
+        headers = dict(scope['headers'])
+        token = headers.get(b'x-telegram-bot-api-secret-token', b'').decode('latin-1')
+        if not hmac.compare_digest(token, self.secret):
+            return await self.respond(send, 403)
+
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return await self.respond(send, 400)
+
+        await self.start_bot()
+        await self.bot_app.update_queue.put(Update.de_json(data, self.bot_app.bot))
+        return await self.respond(send, 200)
+
+    @staticmethod
+    async def respond(send, status):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'text/plain')],
+        })
+        await send({'type': 'http.response.body', 'body': b''})
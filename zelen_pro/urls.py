@@ -1,9 +1,10 @@
 from django.contrib import admin
 from django.urls import include, path
-from plants.views import home  # Если используете домашнюю страницу
+from plants.views import home, metrics_view  # Если используете домашнюю страницу
 
 urlpatterns = [
     path('', home, name='home'),
     path('admin/', admin.site.urls),  # Админка только здесь!
     path('plants/', include('plants.urls')),
+    path('metrics', metrics_view, name='metrics'),  # Для Prometheus
 ]
\ No newline at end of file